@@ -0,0 +1,351 @@
+"""
+AI-IdeaFactory: Допуск запросов к OpenRouter
+Token bucket на чат и общий, ограничение одновременных генераций и честная
+очередь: чаты обслуживаются по кругу, поэтому активный пользователь ждет
+своей очереди, а не занимает все слоты
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Dict, Hashable, Optional
+
+from config import (
+    ADMISSION_MAX_CONCURRENT,
+    ADMISSION_CHAT_CONCURRENCY,
+    ADMISSION_CHAT_PER_MINUTE,
+    ADMISSION_CHAT_BURST,
+    ADMISSION_GLOBAL_PER_SECOND,
+    ADMISSION_GLOBAL_BURST,
+    ADMISSION_MAX_WAIT,
+)
+
+# Причины отказа
+REASON_CHAT_LIMIT = "chat_limit"
+REASON_BUSY = "busy"
+
+# Сколько корзин чатов держать, прежде чем удалять заполнившиеся
+_MAX_IDLE_BUCKETS = 10000
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен: лимит чата исчерпан или очередь не дождалась слота"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}, retry after {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def user_message(self) -> str:
+        """Текст отказа для пользователя"""
+        seconds = max(1, int(self.retry_after + 0.999))
+        if self.reason == REASON_CHAT_LIMIT:
+            return (
+                "⏳ <b>Слишком много запросов подряд.</b>\n"
+                f"Попробуйте снова через {seconds} сек."
+            )
+        return (
+            "⏳ <b>Сейчас очень много запросов.</b>\n"
+            f"Попробуйте снова через {seconds} сек."
+        )
+
+
+class TokenBucket:
+    """Корзина на capacity токенов, пополняется со скоростью rate токенов в секунду"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now: float) -> bool:
+        self.refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def put_back(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1.0)
+
+    def wait_time(self, now: float) -> float:
+        """Через сколько секунд появится токен"""
+        self.refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class AdmissionController:
+    """
+    Допуск генераций по чатам
+
+    admit() вызывается из обработчика до начала генерации и сразу отказывает
+    (AdmissionRejected), если корзина чата пуста. run()/iterate() оборачивают
+    вызов клиента: ждут свободный слот (не больше max_concurrent генераций,
+    не больше chat_concurrency на чат, общий лимит global_rate в секунду) в
+    очереди с обходом чатов по кругу. Не дождавшийся слота за max_wait
+    запрос получает отказ, токен чата возвращается.
+
+    Фоновые вызовы (background=True, спекулятивные посты) не тратят корзину
+    и лимит одновременных генераций чата, но занимают общий слот и общий
+    лимит в секунду. Они получают слот в последнюю очередь: когда ни один
+    ожидающий запрос пользователя не может его занять (очередь пуста или чаты
+    уже на своем лимите chat_concurrency), и не занимают последний свободный слот.
+    Отказа по max_wait у них нет - их отменяет сам владелец.
+
+    admit() потокобезопасен; run(), iterate() и очередь работают в одном
+    event loop (runtime у синхронных ботов).
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        chat_concurrency: int = ADMISSION_CHAT_CONCURRENCY,
+        chat_per_minute: float = ADMISSION_CHAT_PER_MINUTE,
+        chat_burst: int = ADMISSION_CHAT_BURST,
+        global_per_second: float = ADMISSION_GLOBAL_PER_SECOND,
+        global_burst: int = ADMISSION_GLOBAL_BURST,
+        max_wait: float = ADMISSION_MAX_WAIT
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.chat_concurrency = max(1, chat_concurrency)
+        self.chat_rate = chat_per_minute / 60.0
+        self.chat_burst = chat_burst
+        self.max_wait = max_wait
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._global = (
+            TokenBucket(global_per_second, global_burst, time.monotonic()) if global_per_second > 0 else None
+        )
+
+        # Состояние очереди (только из event loop)
+        self._waiting: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._active: Dict[Hashable, int] = {}
+        self._running = 0
+        self._background: deque = deque()
+        self._background_running = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        # Метрики
+        self.admitted = 0
+        self.rejected_chat_limit = 0
+        self.rejected_busy = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+        self.background_admitted = 0
+
+    def admit(self, chat_id: Hashable) -> None:
+        """Взять токен чата; AdmissionRejected сразу, если лимит исчерпан"""
+        if self.chat_rate <= 0:
+            self.admitted += 1
+            return
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+                self._prune(now)
+            else:
+                self._buckets.move_to_end(chat_id)
+            if not bucket.try_take(now):
+                self.rejected_chat_limit += 1
+                raise AdmissionRejected(REASON_CHAT_LIMIT, bucket.wait_time(now))
+            self.admitted += 1
+
+    async def run(self, chat_id: Hashable, coro: Awaitable, background: bool = False) -> Any:
+        """Выполнить корутину клиента, заняв слот"""
+        try:
+            await self.acquire(chat_id, background)
+        except BaseException:
+            coro.close()
+            raise
+        try:
+            return await coro
+        finally:
+            self.release(chat_id, background)
+
+    async def iterate(self, chat_id: Hashable, agen: AsyncIterator) -> AsyncIterator:
+        """Потоковый вызов клиента, занимающий слот до конца потока"""
+        try:
+            await self.acquire(chat_id)
+        except BaseException:
+            await agen.aclose()
+            raise
+        try:
+            async for item in agen:
+                yield item
+        finally:
+            self.release(chat_id)
+            await agen.aclose()
+
+    async def acquire(self, chat_id: Hashable, background: bool = False) -> None:
+        """Дождаться слота в честной очереди"""
+        if background:
+            await self._acquire_background()
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(chat_id, deque()).append(future)
+        self._dispatch()
+        if future.done():
+            return
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.max_wait if self.max_wait > 0 else None)
+        except asyncio.TimeoutError:
+            self._forget(chat_id, future)
+            self.rejected_busy += 1
+            self._refund(chat_id)
+            raise AdmissionRejected(REASON_BUSY, self.max_wait) from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот успели выдать - возвращаем его
+                self.release(chat_id)
+            else:
+                self._forget(chat_id, future)
+            raise
+        finally:
+            self.wait_seconds += time.monotonic() - started
+
+    def release(self, chat_id: Hashable, background: bool = False) -> None:
+        """Освободить слот и выдать его следующему в очереди"""
+        self._running -= 1
+        if background:
+            self._background_running -= 1
+            self._dispatch()
+            return
+        active = self._active.get(chat_id, 0) - 1
+        if active > 0:
+            self._active[chat_id] = active
+        else:
+            self._active.pop(chat_id, None)
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """Занятые слоты, очередь и отказы"""
+        return {
+            "running": self._running,
+            "max_concurrent": self.max_concurrent,
+            "waiting": sum(len(queue) for queue in list(self._waiting.values())),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "avg_wait_seconds": round(self.wait_seconds / self.queued, 3) if self.queued else 0.0,
+            "rejected_chat_limit": self.rejected_chat_limit,
+            "rejected_busy": self.rejected_busy,
+            "background_running": self._background_running,
+            "background_waiting": len(self._background),
+            "background_admitted": self.background_admitted,
+        }
+
+    async def _acquire_background(self) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._background.append(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(None, background=True)
+            else:
+                try:
+                    self._background.remove(future)
+                except ValueError:
+                    pass
+            raise
+
+    def _dispatch(self) -> None:
+        while self._waiting and self._running < self.max_concurrent:
+            chat_id = self._next_chat()
+            if chat_id is None:
+                break
+            now = time.monotonic()
+            if self._global is not None and not self._global.try_take(now):
+                self._schedule(self._global.wait_time(now))
+                return
+            queue = self._waiting.pop(chat_id)
+            future = queue.popleft()
+            if queue:
+                # Остальные запросы чата - в конец круга
+                self._waiting[chat_id] = queue
+            self._running += 1
+            self._active[chat_id] = self._active.get(chat_id, 0) + 1
+            future.set_result(None)
+        # Ни один ожидающий пользователь не может занять слот - отдаем его фоновым
+        self._dispatch_background()
+
+    def _dispatch_background(self) -> None:
+        # Последний свободный слот остается за пользователями
+        limit = self.max_concurrent - 1 if self.max_concurrent > 1 else 1
+        while self._background and self._running < limit:
+            future = self._background[0]
+            if future.done():
+                self._background.popleft()
+                continue
+            now = time.monotonic()
+            if self._global is not None and not self._global.try_take(now):
+                self._schedule(self._global.wait_time(now))
+                return
+            self._background.popleft()
+            self._running += 1
+            self._background_running += 1
+            self.background_admitted += 1
+            future.set_result(None)
+
+    def _next_chat(self) -> Optional[Hashable]:
+        """Первый по кругу чат с ожидающим запросом и свободным местом"""
+        for chat_id in list(self._waiting):
+            queue = self._waiting[chat_id]
+            while queue and queue[0].done():
+                queue.popleft()
+            if not queue:
+                del self._waiting[chat_id]
+            elif self._active.get(chat_id, 0) < self.chat_concurrency:
+                return chat_id
+        return None
+
+    def _schedule(self, delay: float) -> None:
+        if self._wakeup is not None:
+            return
+
+        def wakeup():
+            self._wakeup = None
+            self._dispatch()
+
+        self._wakeup = asyncio.get_running_loop().call_later(delay, wakeup)
+
+    def _forget(self, chat_id: Hashable, future: asyncio.Future) -> None:
+        queue = self._waiting.get(chat_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiting[chat_id]
+
+    def _refund(self, chat_id: Hashable) -> None:
+        with self._lock:
+            bucket = self._buckets.get(chat_id)
+            if bucket is not None:
+                bucket.put_back()
+
+    def _prune(self, now: float) -> None:
+        # Самые давние корзины заполнились - они ничем не отличаются от новых
+        while len(self._buckets) > _MAX_IDLE_BUCKETS:
+            chat_id, bucket = next(iter(self._buckets.items()))
+            if not bucket.is_full(now):
+                return
+            del self._buckets[chat_id]
@@ -5,11 +5,42 @@ AI-IdeaFactory: OpenRouter API Client
 
 import os
 import json
+import asyncio
 import logging
+import time
 import httpx
-from typing import List, Dict, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
-from prompts import SYSTEM_PROMPT, IDEAS_GENERATION_PROMPT, POST_GENERATION_PROMPT
+from prompts import CONTINUE_PROMPT, PROMPTS
+from cache import ResponseCache
+from json_stream import IdeaStreamParser, parse_ideas
+from models import Idea
+from normalize import InputMatcher, normalize_text
+from resilience import (
+    RETRYABLE_ERRORS,
+    CircuitBreaker,
+    CircuitOpenError,
+    HedgePolicy,
+    RetryPolicy,
+    parse_retry_after,
+)
+from router import TASK_IDEAS, TASK_POSTS, ModelRouter
+from token_budget import MaxTokensEstimator
+from config import (
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_TIMEOUT,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+    HTTP_WARMUP_CONNECTIONS,
+    HEDGE_ENABLED,
+    MODEL,
+    SIMILARITY_ENABLED,
+)
 
 load_dotenv()
 
@@ -17,28 +48,238 @@ logger = logging.getLogger(__name__)
 
 OPENAI_KEY = os.getenv("OPENAI_KEY")
 OPENAI_URL = "https://openrouter.ai/api/v1/chat/completions"
-MODEL = "openai/gpt-4o-mini"
+WARMUP_URL = "https://openrouter.ai/api/v1/models"
+
+# Счетчик токенов операции, открытой usage_scope() (наследуется задачами, созданными внутри)
+_usage_scope: ContextVar[Optional[Dict[str, int]]] = ContextVar("usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope() -> Iterator[Dict[str, int]]:
+    """
+    Учитывать токены вызовов клиента внутри блока
+
+    Запрос, объединенный с уже идущим, учитывается у того, кто его начал;
+    ответ из кэша токенов не тратит.
+    """
+    scope = {"prompt_tokens": 0, "completion_tokens": 0}
+    token = _usage_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _usage_scope.reset(token)
+
+
+def _http2_available() -> bool:
+    """Проверить, установлен ли пакет h2 для HTTP/2"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _InFlight:
+    """Общий запрос к OpenRouter и число ожидающих его вызовов"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
 
 
 class OpenRouterClient:
-    """Клиент для работы с OpenRouter API (OpenAI GPT-4o-mini)"""
+    """
+    Клиент для работы с OpenRouter API (OpenAI GPT-4o-mini)
 
-    def __init__(self, api_key: str = OPENAI_KEY):
+    Владеет одним долгоживущим httpx.AsyncClient с пулом keep-alive соединений.
+    Пул создается лениво в текущем event loop и закрывается через aclose()
+    (или при выходе из async with).
+    """
+
+    def __init__(
+        self,
+        api_key: str = OPENAI_KEY,
+        timeout: float = HTTP_TIMEOUT,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        http2: bool = HTTP2_ENABLED,
+        cache: Optional[ResponseCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        router: Optional[ModelRouter] = None,
+        hedge: Optional[HedgePolicy] = None,
+        max_tokens_estimator: Optional[MaxTokensEstimator] = None,
+        matcher: Optional[InputMatcher] = None
+    ):
         self.api_key = api_key
+        self.cache = cache
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.router = router if router is not None else ModelRouter()
+        # Hedging запросов идей (выключен, если HEDGE_ENABLED не задан)
+        self.hedge = hedge if hedge is not None else (HedgePolicy() if HEDGE_ENABLED else None)
+        # max_tokens по наблюдаемой длине ответов
+        self.max_tokens_estimator = max_tokens_estimator if max_tokens_estimator is not None else MaxTokensEstimator()
+        # Похожие niche/goal/format ("фотография", "фотографи") находят уже закэшированный ответ
+        self.matcher = matcher if matcher is not None else (InputMatcher() if SIMILARITY_ENABLED else None)
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "HTTP-Referer": "https://github.com/Jeff555max/AI-IdeaFactory",
             "X-Title": "AI-IdeaFactory-Bot",
             "Content-Type": "application/json"
         }
+        self.timeout = httpx.Timeout(
+            timeout,
+            connect=HTTP_CONNECT_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        if http2 and not _http2_available():
+            logger.warning("HTTP/2 запрошен, но пакет h2 не установлен - используется HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Одинаковые одновременные запросы объединяются в один вызов API
+        self._inflight: Dict[str, _InFlight] = {}
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+        self.stale_served = 0
+        # Токены по задачам, включая попавшие в кэш промптов провайдера
+        self.token_usage: Dict[str, Dict[str, int]] = {}
+        # Прерванные запросы (ответ больше никому не нужен) и оценка сэкономленных токенов
+        self.cancelled_usage: Dict[str, Dict[str, int]] = {}
+
+    async def __aenter__(self) -> "OpenRouterClient":
+        self._get_client()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Получить общий HTTP-клиент, создав его при первом обращении
+
+        Соединения пула привязаны к event loop, поэтому при смене loop
+        пул пересоздается.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            if self._client is not None and not self._client.is_closed:
+                logger.warning("Event loop изменился - пул соединений OpenRouter пересоздается")
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def warmup(self, connections: int = HTTP_WARMUP_CONNECTIONS) -> bool:
+        """
+        Заранее открывает соединения с OpenRouter (DNS, TCP, TLS)
+
+        Args:
+            connections: Сколько соединений прогреть параллельно
+
+        Returns:
+            True, если хотя бы одно соединение установлено
+        """
+        client = self._get_client()
+        results = await asyncio.gather(
+            *(client.head(WARMUP_URL) for _ in range(max(1, connections))),
+            return_exceptions=True
+        )
+        warmed = sum(1 for r in results if not isinstance(r, Exception))
+        if warmed:
+            logger.info(f"Пул соединений OpenRouter прогрет: {warmed} соединений")
+        else:
+            logger.warning(f"Не удалось прогреть соединения OpenRouter: {results[0]}")
+        return warmed > 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики клиента для мониторинга"""
+        return {
+            "upstream_requests": self.upstream_requests,
+            "coalesced_requests": self.coalesced_requests,
+            "inflight": len(self._inflight),
+            "retry": self.retry_policy.stats(),
+            "breaker": self.breaker.stats(),
+            "router": self.router.stats(),
+            "hedge": self.hedge.stats() if self.hedge is not None else None,
+            "stale_served": self.stale_served,
+            "tokens": self.token_usage,
+            "cancelled": self.cancelled_usage,
+            "max_tokens": self.max_tokens_estimator.stats(),
+            "input_matcher": self.matcher.stats() if self.matcher is not None else None,
+        }
+
+    async def _single_flight(self, key: str, task: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполнить запрос один раз для всех одновременных вызовов с тем же ключом
+
+        Каждый вызывающий ждет общий результат (или исключение). Отмена одного
+        ожидающего не прерывает запрос для остальных; запрос отменяется, только
+        когда его больше никто не ждет.
+        """
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = _InFlight(asyncio.ensure_future(factory()))
+            self._inflight[key] = entry
+            self.upstream_requests += 1
+
+            def forget(task, key=key):
+                current = self._inflight.get(key)
+                if current is not None and current.task is task:
+                    del self._inflight[key]
+
+            entry.task.add_done_callback(forget)
+        else:
+            self.coalesced_requests += 1
+            logger.info("Identical request already in flight, waiting for shared result")
+
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.task)
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0 and not entry.task.done():
+                # Результат больше никому не нужен
+                entry.task.cancel()
+                self._record_cancel(task)
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+
+    async def aclose(self) -> None:
+        """Закрыть пул соединений"""
+        if self._client is not None and not self._client.is_closed:
+            if self._client_loop is asyncio.get_running_loop():
+                await self._client.aclose()
+            else:
+                # Соединения принадлежат другому (уже завершенному) loop
+                logger.debug("Пул соединений OpenRouter отброшен без закрытия: чужой event loop")
+        self._client = None
+        self._client_loop = None
 
     async def generate_ideas(
         self,
         niche: str,
         goal: str,
         content_format: str,
-        temperature: float = 0.7
-    ) -> Optional[List[Dict]]:
+        temperature: float = 0.7,
+        use_cache: bool = True,
+        refresh: bool = False
+    ) -> Optional[List[Idea]]:
         """
         Генерирует 5 идей контента
         
@@ -47,52 +288,288 @@ class OpenRouterClient:
             goal: Цель контента
             content_format: Формат контента
             temperature: Параметр творчества модели
+            use_cache: Использовать кэш ответов (если он подключен)
+            refresh: Не читать кэш, а перезаписать его свежим ответом
             
         Returns:
             Список идей или None при ошибке
         """
-        prompt = IDEAS_GENERATION_PROMPT.format(
-            context="",
+        inputs = self._key_inputs(niche, goal, content_format)
+        key = self._ideas_key(*inputs, temperature)
+        use_cache = use_cache and self.cache is not None
+        if use_cache and not refresh:
+            cached = await self._lookup_ideas(inputs, temperature)
+            if cached:
+                logger.info("Ideas served from cache")
+                return cached
+
+        async def fetch():
+            if self.hedge is not None:
+                ideas = await self._hedged_request_ideas(niche, goal, content_format, temperature)
+            else:
+                ideas = await self._request_ideas(niche, goal, content_format, temperature)
+            if use_cache and ideas:
+                await self._cache_ideas(key, inputs, ideas)
+            return ideas
+
+        ideas = await self._single_flight(f"ideas:{key}", TASK_IDEAS, fetch)
+        if not ideas and use_cache:
+            # Деградированный режим: API недоступен - отдаем устаревшие идеи, если есть
+            ideas = await self._stale_ideas(key)
+        return ideas
+
+    async def stream_ideas(
+        self,
+        niche: str,
+        goal: str,
+        content_format: str,
+        temperature: float = 0.7,
+        use_cache: bool = True,
+        refresh: bool = False
+    ) -> AsyncIterator[Idea]:
+        """
+        Генерирует идеи потоком, отдавая каждую сразу после ее завершения
+
+        Args:
+            niche: Ниша контента
+            goal: Цель контента
+            content_format: Формат контента
+            temperature: Параметр творчества модели
+            use_cache: Использовать кэш ответов (если он подключен)
+            refresh: Не читать кэш, а перезаписать его свежим ответом
+
+        Yields:
+            Идеи (Idea). Если ответ оборвался или хвост
+            испорчен, уже полученные идеи остаются у вызывающего.
+        """
+        inputs = self._key_inputs(niche, goal, content_format)
+        key = self._ideas_key(*inputs, temperature)
+        use_cache = use_cache and self.cache is not None
+        if use_cache and not refresh:
+            cached = await self._lookup_ideas(inputs, temperature)
+            if cached:
+                logger.info("Ideas served from cache")
+                for idea in cached:
+                    yield idea
+                return
+
+        parser = IdeaStreamParser()
+        completed = False
+        try:
+            async for delta in self._stream_with_continuation(
+                self._ideas_payload(niche, goal, content_format, temperature),
+                TASK_IDEAS
+            ):
+                for idea in parser.feed(delta):
+                    yield idea
+            completed = True
+        except httpx.RequestError as e:
+            logger.error(f"API request error: {e}")
+        except json.JSONDecodeError as e:
+            logger.error(f"Stream parse error: {e}")
+
+        # Оборванный ответ (массив не закрыт) в кэш не попадает
+        if completed and parser.finished and parser.ideas and use_cache:
+            await self._cache_ideas(key, inputs, parser.ideas)
+        elif not parser.ideas and use_cache:
+            for idea in await self._stale_ideas(key) or []:
+                yield idea
+
+    async def _cache_get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        """
+        Чтение кэша в пуле потоков: промах уровня памяти идет в SQLite и не должен блокировать loop
+
+        Промах не считается: поиск идет по нескольким ключам (точный, похожий
+        запрос, устаревшая запись), и промах учитывает вызывающий (record_miss),
+        когда не нашлось ничего
+        """
+        return await asyncio.to_thread(self.cache.get, key, allow_stale, False)
+
+    async def _cache_set(self, key: str, value: Any) -> None:
+        """Запись кэша (SQLite) в пуле потоков"""
+        await asyncio.to_thread(self.cache.set, key, value)
+
+    async def _cached_ideas(self, key: str, allow_stale: bool = False) -> Optional[List[Idea]]:
+        """Идеи из кэша, заново проверенные по схеме (записи могли остаться от старых версий)"""
+        cached = await self._cache_get(key, allow_stale=allow_stale)
+        if not isinstance(cached, list):
+            return None
+        return [idea for idea in map(Idea.from_obj, cached) if idea is not None]
+
+    async def _stale_ideas(self, key: str) -> Optional[List[Idea]]:
+        """Устаревшие идеи из кэша для деградированного режима"""
+        ideas = await self._cached_ideas(key, allow_stale=True)
+        if ideas:
+            self.stale_served += 1
+            logger.warning(f"OpenRouter unavailable (breaker {self.breaker.state}), serving stale ideas")
+        return ideas
+
+    async def _stale_post(self, key: str) -> Optional[str]:
+        """Устаревший пост из кэша для деградированного режима"""
+        post = await self._cache_get(key, allow_stale=True)
+        if not isinstance(post, str) or not post:
+            return None
+        self.stale_served += 1
+        logger.warning(f"OpenRouter unavailable (breaker {self.breaker.state}), serving stale post")
+        return post
+
+    async def _cache_ideas(self, key: str, inputs: Tuple[str, str, str], ideas: List[Idea]) -> None:
+        await self._cache_set(key, [idea.to_dict() for idea in ideas])
+        if self.matcher is not None:
+            self.matcher.add(inputs)
+
+    async def _cache_post(self, key: str, inputs: Tuple[str, str, str], post: str) -> None:
+        await self._cache_set(key, post)
+        if self.matcher is not None:
+            self.matcher.add(inputs)
+
+    async def _lookup_ideas(self, inputs: Tuple[str, str, str], temperature: float) -> Optional[List[Idea]]:
+        """Идеи из кэша по ключу запроса, иначе - по ключу похожего запроса, уже лежащему в кэше"""
+        cached = await self._cached_ideas(self._ideas_key(*inputs, temperature))
+        if cached:
+            if self.matcher is not None:
+                self.matcher.add(inputs)
+            return cached
+        similar = self.matcher.redirect(inputs) if self.matcher is not None else None
+        if similar is not None:
+            logger.info(f"Looking up cached ideas of a similar request {similar}")
+            cached = await self._cached_ideas(self._ideas_key(*similar, temperature))
+        if not cached:
+            self.cache.record_miss()
+        return cached
+
+    async def _lookup_post(
+        self,
+        inputs: Tuple[str, str, str],
+        idea_title: str,
+        idea_description: str,
+        temperature: float
+    ) -> Optional[str]:
+        """Пост из кэша по ключу запроса или похожего запроса"""
+        cached = await self._cache_get(self._post_key(*inputs, idea_title, idea_description, temperature))
+        if cached is not None:
+            return cached
+        similar = self.matcher.redirect(inputs) if self.matcher is not None else None
+        if similar is not None:
+            cached = await self._cache_get(self._post_key(*similar, idea_title, idea_description, temperature))
+        if cached is None:
+            self.cache.record_miss()
+        return cached
+
+    @staticmethod
+    def _key_inputs(niche: str, goal: str, content_format: str) -> Tuple[str, str, str]:
+        """
+        niche/goal/format для ключей кэша и объединения запросов
+
+        Нормализованная форма ввода (регистр, пунктуация, синонимы) - ключ
+        зависит только от самого ввода; промпт строится из исходного текста.
+        """
+        return normalize_text(niche), normalize_text(goal), normalize_text(content_format)
+
+    def _ideas_key(self, niche: str, goal: str, content_format: str, temperature: float) -> str:
+        """
+        Ключ кэша и объединения запросов для идей
+
+        В ключе - основная модель MODEL, а не выбранная роутером: кандидаты задачи
+        взаимозаменяемы, поэтому ответ любого из них отдается из кэша и после
+        смены модели роутером (то же для _post_key)
+        """
+        return ResponseCache.make_key(
+            PROMPTS[TASK_IDEAS].fingerprint,
+            MODEL,
+            temperature,
             niche=niche,
             goal=goal,
             content_format=content_format
         )
 
-        try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                response = await client.post(
-                    OPENAI_URL,
-                    headers=self.headers,
-                    json={
-                        "model": MODEL,
-                        "messages": [
-                            {"role": "system", "content": SYSTEM_PROMPT},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": temperature,
-                        "max_tokens": 2000
-                    }
-                )
-
-                if response.status_code != 200:
-                    logger.error(f"API Error: {response.status_code} - {response.text}")
-                    return None
+    def _ideas_payload(self, niche: str, goal: str, content_format: str, temperature: float) -> Dict:
+        """Тело запроса на генерацию идей"""
+        return {
+            "messages": PROMPTS[TASK_IDEAS].messages(
+                niche=niche,
+                goal=goal,
+                content_format=content_format
+            ),
+            "temperature": temperature,
+            "max_tokens": self.max_tokens_estimator.limit(TASK_IDEAS)
+        }
 
-                result = response.json()
-                content = result['choices'][0]['message']['content']
+    async def _hedged_request_ideas(
+        self,
+        niche: str,
+        goal: str,
+        content_format: str,
+        temperature: float
+    ) -> Optional[List[Idea]]:
+        """
+        Запрос идей с hedging
 
-                # Парсим JSON из ответа
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0]
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0]
+        Если первый запрос не ответил за порог hedge.threshold() (p90 недавних
+        задержек) и бюджет дублей позволяет, отправляется второй такой же.
+        Побеждает первый успешный ответ, оставшийся запрос отменяется.
+        """
+        hedge = self.hedge
+        hedge.start()
+        threshold = hedge.threshold()
+        # Задержку видит пользователь: от начала запроса, а не от запуска победившей копии
+        started = time.monotonic()
+        launched = []
 
-                ideas = json.loads(content.strip())
-                return ideas
+        def launch() -> asyncio.Task:
+            task = asyncio.ensure_future(self._request_ideas(niche, goal, content_format, temperature))
+            launched.append(task)
+            return task
 
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parse error: {e}")
+        primary = launch()
+        pending = {primary}
+        try:
+            if threshold is not None:
+                done, _ = await asyncio.wait(pending, timeout=threshold)
+                if not done and hedge.try_hedge():
+                    logger.info(f"Ideas request slower than {threshold:.2f}s, sending hedged request")
+                    pending.add(launch())
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    ideas = task.result()
+                    if ideas:
+                        hedge.observe(time.monotonic() - started)
+                        if task is not primary:
+                            hedge.hedge_wins += 1
+                        return ideas
             return None
+        finally:
+            for task in launched:
+                if not task.done():
+                    task.cancel()
+
+    async def _request_ideas(
+        self,
+        niche: str,
+        goal: str,
+        content_format: str,
+        temperature: float
+    ) -> Optional[List[Idea]]:
+        """Запрос идей у OpenRouter без кэша"""
+        try:
+            # JSON при продолжении легко склеить неверно - обрезанный ответ повторяется целиком
+            content = await self._complete(
+                self._ideas_payload(niche, goal, content_format, temperature),
+                TASK_IDEAS,
+                continuable=False
+            )
+            if content is None:
+                return None
+
+            # Парсим JSON из ответа и проверяем каждую идею по схеме:
+            # корректные идеи сохраняются даже при оборванном хвосте
+            ideas = parse_ideas(content)
+            if not ideas:
+                logger.error(f"No valid ideas in response: {content[:200]}")
+                return None
+            return ideas
+
         except httpx.RequestError as e:
             logger.error(f"API request error: {e}")
             return None
@@ -107,7 +584,9 @@ class OpenRouterClient:
         content_format: str,
         idea_title: str,
         idea_description: str,
-        temperature: float = 0.8
+        temperature: float = 0.8,
+        use_cache: bool = True,
+        refresh: bool = False
     ) -> Optional[str]:
         """
         Генерирует готовый пост на основе идеи
@@ -119,39 +598,451 @@ class OpenRouterClient:
             idea_title: Название идеи
             idea_description: Описание идеи
             temperature: Параметр творчества модели
+            use_cache: Использовать кэш ответов (если он подключен)
+            refresh: Не читать кэш, а перезаписать его свежим ответом
             
         Returns:
             Текст поста или None при ошибке
         """
-        prompt = POST_GENERATION_PROMPT.format(
-            context="",
-            idea_title=idea_title,
-            idea_description=idea_description
-        )
+        inputs = self._key_inputs(niche, goal, content_format)
+        key = self._post_key(*inputs, idea_title, idea_description, temperature)
+        use_cache = use_cache and self.cache is not None
+        if use_cache and not refresh:
+            cached = await self._lookup_post(inputs, idea_title, idea_description, temperature)
+            if cached is not None:
+                logger.info("Post served from cache")
+                return cached
+
+        async def fetch():
+            post = await self._request_post(
+                niche, goal, content_format, idea_title, idea_description, temperature
+            )
+            if use_cache and post:
+                await self._cache_post(key, inputs, post)
+            return post
+
+        post = await self._single_flight(f"post:{key}", TASK_POSTS, fetch)
+        if not post and use_cache:
+            post = await self._stale_post(key)
+        return post
+
+    async def stream_post(
+        self,
+        niche: str,
+        goal: str,
+        content_format: str,
+        idea_title: str,
+        idea_description: str,
+        temperature: float = 0.8,
+        use_cache: bool = True,
+        refresh: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Генерирует пост потоком (SSE, stream: true), отдавая фрагменты текста
+
+        Args:
+            niche: Ниша контента
+            goal: Цель контента
+            content_format: Формат контента
+            idea_title: Название идеи
+            idea_description: Описание идеи
+            temperature: Параметр творчества модели
+            use_cache: Использовать кэш ответов (если он подключен)
+            refresh: Не читать кэш, а перезаписать его свежим ответом
 
+        Yields:
+            Фрагменты текста поста по мере генерации. При ошибке поток
+            просто заканчивается - вызывающий код проверяет, что текст получен.
+        """
+        inputs = self._key_inputs(niche, goal, content_format)
+        key = self._post_key(*inputs, idea_title, idea_description, temperature)
+        use_cache = use_cache and self.cache is not None
+        if use_cache and not refresh:
+            cached = await self._lookup_post(inputs, idea_title, idea_description, temperature)
+            if cached is not None:
+                logger.info("Post served from cache")
+                yield cached
+                return
+
+        parts = []
+        completed = False
         try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                response = await client.post(
-                    OPENAI_URL,
-                    headers=self.headers,
-                    json={
-                        "model": MODEL,
-                        "messages": [
-                            {"role": "system", "content": SYSTEM_PROMPT},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": temperature,
-                        "max_tokens": 3000
-                    }
+            async for delta in self._stream_with_continuation(
+                self._post_payload(niche, goal, content_format, idea_title, idea_description, temperature),
+                TASK_POSTS
+            ):
+                parts.append(delta)
+                yield delta
+            completed = True
+        except httpx.RequestError as e:
+            logger.error(f"API request error: {e}")
+        except json.JSONDecodeError as e:
+            logger.error(f"Stream parse error: {e}")
+
+        if completed and parts and use_cache:
+            await self._cache_post(key, inputs, "".join(parts))
+        elif not parts and use_cache:
+            stale = await self._stale_post(key)
+            if stale:
+                yield stale
+
+    async def _send(self, payload: Dict, task: str, stream: bool = False) -> Tuple[httpx.Response, str]:
+        """
+        POST в OpenRouter с повторами временных ошибок по retry_policy
+
+        Повторяются 429, 5xx и ошибки соединения/таймауты. Таймаут каждой
+        попытки ограничен временем, оставшимся до общего дедлайна запроса.
+        Каждая попытка проходит через circuit breaker: пока он открыт,
+        запрос не отправляется. Модель для каждой попытки выбирает router
+        (задача task), исход попытки сообщается ему же.
+
+        Returns:
+            Последний ответ (успешный или с неповторяемой/последней ошибкой)
+            и модель, которой он получен. При stream=True тело не прочитано -
+            ответ закрывает вызывающий, он же сообщает router итог потока.
+
+        Raises:
+            CircuitOpenError, если breaker открыт;
+            httpx.RequestError, если последняя попытка завершилась ошибкой транспорта
+        """
+        policy = self.retry_policy
+        breaker = self.breaker
+        client = self._get_client()
+        policy.requests += 1
+        deadline = time.monotonic() + policy.deadline
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError("OpenRouter circuit breaker is open")
+            attempt += 1
+            policy.attempts += 1
+            model = self.router.choose(task)
+            started = time.monotonic()
+            request = client.build_request(
+                "POST",
+                OPENAI_URL,
+                json={**payload, "model": model},
+                timeout=self._attempt_timeout(deadline - started)
+            )
+            try:
+                response = await client.send(request, stream=stream)
+            except RETRYABLE_ERRORS as e:
+                breaker.record(False, time.monotonic() - started)
+                self.router.record(task, model, time.monotonic() - started, False)
+                policy.failed_attempt_seconds += time.monotonic() - started
+                delay = policy.next_delay(attempt, deadline - time.monotonic())
+                if delay is None:
+                    policy.gave_up += 1
+                    raise
+                logger.warning(f"OpenRouter attempt {attempt} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            except httpx.HTTPError:
+                breaker.record(False, time.monotonic() - started)
+                self.router.record(task, model, time.monotonic() - started, False)
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+            else:
+                latency = time.monotonic() - started
+                breaker.record(response.status_code < 500, latency)
+                if response.status_code == 200 and not stream:
+                    usage = self._usage(response)
+                    self.router.record(task, model, latency, True, usage)
+                    self._record_usage(task, usage)
+                elif policy.retryable_status(response.status_code):
+                    self.router.record(task, model, latency, False)
+                if not policy.retryable_status(response.status_code):
+                    if attempt > 1 and response.status_code == 200:
+                        policy.recovered += 1
+                    return response, model
+                policy.failed_attempt_seconds += time.monotonic() - started
+                delay = policy.next_delay(
+                    attempt,
+                    deadline - time.monotonic(),
+                    parse_retry_after(response.headers.get("Retry-After"))
                 )
+                if delay is None:
+                    policy.gave_up += 1
+                    return response, model
+                await response.aclose()
+                logger.warning(f"OpenRouter returned {response.status_code} on attempt {attempt}, retrying in {delay:.2f}s")
+            policy.retries += 1
+            policy.retry_wait_seconds += delay
+            await asyncio.sleep(delay)
+
+    def _attempt_timeout(self, remaining: float) -> httpx.Timeout:
+        """Таймауты попытки, урезанные до оставшегося времени"""
+        remaining = max(0.1, remaining)
+        return httpx.Timeout(
+            min(self.timeout.read, remaining),
+            connect=min(self.timeout.connect, remaining),
+            write=min(self.timeout.write, remaining),
+            pool=min(self.timeout.pool, remaining)
+        )
+
+    @staticmethod
+    def _usage(response: httpx.Response) -> Optional[Dict]:
+        """Поле usage из JSON-ответа (None, если его нет или тело не JSON)"""
+        try:
+            return response.json().get("usage")
+        except (ValueError, AttributeError):
+            return None
+
+    def _record_usage(self, task: str, usage: Optional[Dict]) -> None:
+        """Учесть токены вызова; cached_tokens - часть промпта из кэша провайдера"""
+        totals = self.token_usage.setdefault(task, {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        })
+        totals["calls"] += 1
+        if not usage:
+            return
+        totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        totals["completion_tokens"] += usage.get("completion_tokens") or 0
+        scope = _usage_scope.get()
+        if scope is not None:
+            scope["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            scope["completion_tokens"] += usage.get("completion_tokens") or 0
+        details = usage.get("prompt_tokens_details") or {}
+        totals["cached_tokens"] += details.get("cached_tokens") or 0
+
+    def _record_cancel(self, task: str, received_tokens: int = 0) -> None:
+        """
+        Учесть прерванный запрос
+
+        Сэкономлено примерно столько, сколько в типичном (медианном) ответе
+        задачи, за вычетом уже полученного; без наблюдений - не оценивается.
+        """
+        totals = self.cancelled_usage.setdefault(task, {"requests": 0, "tokens_saved": 0})
+        totals["requests"] += 1
+        typical = self.max_tokens_estimator.typical(task)
+        if typical:
+            totals["tokens_saved"] += max(0, typical - received_tokens)
+
+    async def _complete(self, payload: Dict, task: str, continuable: bool) -> Optional[str]:
+        """
+        Запрос без потока с дозапросом ответа, обрезанного по max_tokens
+
+        При finish_reason == "length" ответ continuable-задачи продолжается
+        с места обрыва (до max_tokens_estimator.max_continuations раз), остальные
+        повторяются с потолком max_tokens, если лимит был ниже него. Иначе
+        отдается обрезанный ответ.
+
+        Returns:
+            Текст ответа или None, если API вернул ошибку
+        """
+        estimator = self.max_tokens_estimator
+        ceiling = estimator.ceiling(task)
+        request = payload
+        content = ""
+        completion_tokens = 0
+        continuations = 0
+        while True:
+            response, _ = await self._send(request, task)
+            if response.status_code != 200:
+                logger.error(f"API Error: {response.status_code} - {response.text}")
+                return None
+
+            result = response.json()
+            choice = result['choices'][0]
+            content += choice['message']['content'] or ""
+            completion_tokens += (result.get("usage") or {}).get("completion_tokens") or 0
+            if choice.get("finish_reason") != "length":
+                break
+
+            estimator.count(task, "truncated")
+            if continuable and continuations < estimator.max_continuations:
+                continuations += 1
+                estimator.count(task, "continued")
+                logger.info(f"{task} response hit max_tokens={request['max_tokens']}, requesting continuation")
+                request = self._continuation_payload(payload, content, ceiling)
+            elif not continuable and request["max_tokens"] < ceiling:
+                estimator.count(task, "retried")
+                logger.info(f"{task} response hit max_tokens={request['max_tokens']}, retrying with {ceiling}")
+                request = {**payload, "max_tokens": ceiling}
+                content = ""
+                completion_tokens = 0
+            else:
+                estimator.count(task, "accepted_truncated")
+                logger.warning(f"{task} response truncated at max_tokens={request['max_tokens']}")
+                break
+        estimator.observe(task, completion_tokens)
+        return content
+
+    @staticmethod
+    def _continuation_payload(payload: Dict, partial: str, max_tokens: int) -> Dict:
+        """Тело запроса продолжения: исходные сообщения, полученная часть и просьба продолжить"""
+        return {
+            **payload,
+            "messages": payload["messages"] + [
+                {"role": "assistant", "content": partial},
+                {"role": "user", "content": CONTINUE_PROMPT},
+            ],
+            "max_tokens": max_tokens
+        }
+
+    async def _stream_with_continuation(self, payload: Dict, task: str) -> AsyncIterator[str]:
+        """
+        Поток фрагментов, который при обрыве по max_tokens продолжается новым потоком
+
+        Уже отданный текст не отменить, поэтому вместо повтора - только
+        продолжение (до max_tokens_estimator.max_continuations раз).
+        """
+        estimator = self.max_tokens_estimator
+        request = payload
+        parts = []
+        completion_tokens = 0
+        continuations = 0
+        while True:
+            outcome: Dict[str, Any] = {}
+            async for delta in self._stream_completion(request, task, outcome):
+                parts.append(delta)
+                yield delta
+            completion_tokens += (outcome.get("usage") or {}).get("completion_tokens") or 0
+            if outcome.get("finish_reason") != "length":
+                break
+            estimator.count(task, "truncated")
+            if continuations >= estimator.max_continuations:
+                estimator.count(task, "accepted_truncated")
+                logger.warning(f"{task} stream truncated at max_tokens={request['max_tokens']}")
+                break
+            continuations += 1
+            estimator.count(task, "continued")
+            logger.info(f"{task} stream hit max_tokens={request['max_tokens']}, streaming continuation")
+            request = self._continuation_payload(payload, "".join(parts), estimator.ceiling(task))
+        if outcome.get("completed"):
+            estimator.observe(task, completion_tokens)
+
+    async def _stream_completion(
+        self,
+        payload: Dict,
+        task: str,
+        outcome: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Отправить запрос с stream: true и отдавать фрагменты content из SSE
+
+        Повторяется только установка потока: после первого полученного
+        фрагмента ошибка пробрасывается вызывающему. В outcome (если передан)
+        записываются finish_reason, usage и completed - поток дочитан до конца.
+        """
+        if outcome is None:
+            outcome = {}
+        started = time.monotonic()
+        try:
+            response, model = await self._send(
+                {**payload, "stream": True, "stream_options": {"include_usage": True}},
+                task,
+                stream=True
+            )
+        except asyncio.CancelledError:
+            self._record_cancel(task)
+            raise
+        usage = None
+        success = False
+        # Фрагментов SSE получено (примерно по токену в каждом)
+        received = 0
+        try:
+            if response.status_code != 200:
+                body = await response.aread()
+                logger.error(f"API Error: {response.status_code} - {body.decode('utf-8', 'replace')}")
+                return
+
+            async for line in response.aiter_lines():
+                # Пустые строки разделяют события, строки с ":" - keep-alive комментарии
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise httpx.RequestError(f"Stream error: {chunk['error']}")
+                # Последний фрагмент потока несет usage (stream_options.include_usage)
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or [{}]
+                outcome["finish_reason"] = choices[0].get("finish_reason") or outcome.get("finish_reason")
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    received += 1
+                    yield delta
+            success = True
+            outcome["usage"] = usage
+            outcome["completed"] = True
+        except (httpx.HTTPError, json.JSONDecodeError):
+            self.router.record(task, model, time.monotonic() - started, False)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # Поток бросили (отмена генерации) - соединение закрывается ниже
+            self._record_cancel(task, received)
+            raise
+        finally:
+            await response.aclose()
+            if success:
+                self.router.record(task, model, time.monotonic() - started, True, usage)
+                self._record_usage(task, usage)
+
+    def _post_key(
+        self,
+        niche: str,
+        goal: str,
+        content_format: str,
+        idea_title: str,
+        idea_description: str,
+        temperature: float
+    ) -> str:
+        """Ключ кэша и объединения запросов для поста"""
+        return ResponseCache.make_key(
+            PROMPTS[TASK_POSTS].fingerprint,
+            MODEL,
+            temperature,
+            niche=niche,
+            goal=goal,
+            content_format=content_format,
+            idea_title=idea_title,
+            idea_description=idea_description
+        )
 
-                if response.status_code != 200:
-                    logger.error(f"API Error: {response.status_code} - {response.text}")
-                    return None
+    def _post_payload(
+        self,
+        niche: str,
+        goal: str,
+        content_format: str,
+        idea_title: str,
+        idea_description: str,
+        temperature: float
+    ) -> Dict:
+        """Тело запроса на генерацию поста"""
+        return {
+            "messages": PROMPTS[TASK_POSTS].messages(
+                niche=niche,
+                goal=goal,
+                content_format=content_format,
+                idea_title=idea_title,
+                idea_description=idea_description
+            ),
+            "temperature": temperature,
+            "max_tokens": self.max_tokens_estimator.limit(TASK_POSTS)
+        }
 
-                result = response.json()
-                post = result['choices'][0]['message']['content']
-                return post
+    async def _request_post(
+        self,
+        niche: str,
+        goal: str,
+        content_format: str,
+        idea_title: str,
+        idea_description: str,
+        temperature: float
+    ) -> Optional[str]:
+        """Запрос поста у OpenRouter без кэша"""
+        try:
+            return await self._complete(
+                self._post_payload(niche, goal, content_format, idea_title, idea_description, temperature),
+                TASK_POSTS,
+                continuable=True
+            )
 
         except httpx.RequestError as e:
             logger.error(f"API request error: {e}")
@@ -0,0 +1,291 @@
+"""
+AI-IdeaFactory: Пакетная генерация идей и постов
+Читает строки niche/goal/format из JSONL или CSV потоком, генерирует идеи
+(и, с --posts, пост для каждой идеи) с ограничением параллельности и частоты
+запросов и пишет результаты в JSONL по мере готовности
+
+Выходной файл служит и контрольной точкой: с --resume строки, для которых
+там уже есть успешная запись, пропускаются, а новые записи дописываются.
+
+Запуск:
+    python batch.py rows.jsonl -o results.jsonl [--posts] [--resume]
+    python batch.py rows.csv -o results.jsonl --concurrency 16 --rate 10
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from ai_client import OpenRouterClient
+from cache import ResponseCache
+from config import BATCH_CONCURRENCY, BATCH_RATE_LIMIT, CACHE_ENABLED
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger("batch")
+
+# Как часто писать прогресс в лог, строк
+PROGRESS_EVERY = 50
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Строки входного файла по одной: (номер строки с 1, словарь полей)
+
+    Формат определяется по расширению: .csv - CSV с заголовком, иначе JSONL.
+    Нечитаемая строка JSONL отдается как (номер, None).
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for number, row in enumerate(csv.DictReader(f), 1):
+                yield number, row
+            return
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+
+
+def completed_rows(path: str) -> Set[int]:
+    """Номера строк, для которых в выходном файле уже есть успешная запись"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Недописанная последняя строка прерванного запуска
+                continue
+            if isinstance(record, dict) and "error" not in record and "row" in record:
+                done.add(record["row"])
+    return done
+
+
+def _torn_tail(path: str) -> bool:
+    """Оканчивается ли файл недописанной строкой (без перевода строки)"""
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return False
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def row_fields(row: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """niche, goal, format строки (format можно назвать content_format)"""
+    niche = str(row.get("niche") or "").strip()
+    goal = str(row.get("goal") or "").strip()
+    content_format = str(row.get("format") or row.get("content_format") or "").strip()
+    if not (niche and goal and content_format):
+        return None
+    return niche, goal, content_format
+
+
+class Throttle:
+    """Не больше concurrency одновременных запросов и не чаще rate запросов в секунду"""
+
+    def __init__(self, concurrency: int, rate: float):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> None:
+        await self._semaphore.acquire()
+        if not self._interval:
+            return
+        try:
+            async with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self._interval
+            if start > now:
+                await asyncio.sleep(start - now)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._semaphore.release()
+
+
+class BatchRunner:
+    """Очередь строк, пул воркеров и запись результатов"""
+
+    def __init__(
+        self,
+        client: OpenRouterClient,
+        output,
+        posts: bool = False,
+        concurrency: int = BATCH_CONCURRENCY,
+        rate: float = BATCH_RATE_LIMIT
+    ):
+        self.client = client
+        self.output = output
+        self.posts = posts
+        self.concurrency = max(1, concurrency)
+        self.throttle = Throttle(self.concurrency, rate)
+
+        # Метрики
+        self.rows_done = 0
+        self.rows_failed = 0
+        self.rows_skipped = 0
+        self.ideas = 0
+        self.posts_done = 0
+        self.posts_failed = 0
+
+    async def run(self, rows: Iterator[Tuple[int, Optional[Dict[str, Any]]]], skip: Set[int]) -> None:
+        # Очередь ограничена: в памяти не больше нескольких строк на воркер
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            for number, row in rows:
+                if number in skip:
+                    self.rows_skipped += 1
+                    continue
+                await queue.put((number, row))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            number, row = item
+            try:
+                record = await self._process(number, row)
+            except Exception as e:
+                logger.error(f"Row {number} failed: {e}")
+                record = {"row": number, "error": str(e) or type(e).__name__}
+            # Одна строка - одна запись write(): прерванный запуск оставляет целые записи
+            self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.output.flush()
+            if "error" in record:
+                self.rows_failed += 1
+            else:
+                self.rows_done += 1
+            if (self.rows_done + self.rows_failed) % PROGRESS_EVERY == 0:
+                logger.info(f"Processed {self.rows_done + self.rows_failed} rows ({self.rows_failed} failed)")
+
+    async def _process(self, number: int, row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        fields = row_fields(row) if row is not None else None
+        if fields is None:
+            return {"row": number, "error": "row must have niche, goal and format"}
+        niche, goal, content_format = fields
+        record: Dict[str, Any] = {"row": number}
+        if row.get("id") is not None:
+            record["id"] = row["id"]
+        record.update(niche=niche, goal=goal, format=content_format)
+
+        started = time.monotonic()
+        async with self.throttle:
+            ideas = await self.client.generate_ideas(niche, goal, content_format)
+        if not ideas:
+            record["error"] = "ideas generation failed"
+            return record
+        self.ideas += len(ideas)
+
+        items = [idea.to_dict() for idea in ideas]
+        if self.posts:
+            posts = await asyncio.gather(*(
+                self._post(niche, goal, content_format, idea.title, idea.description) for idea in ideas
+            ))
+            for item, post in zip(items, posts):
+                item["post"] = post
+        record["ideas"] = items
+        record["seconds"] = round(time.monotonic() - started, 2)
+        return record
+
+    async def _post(self, niche: str, goal: str, content_format: str, title: str, description: str) -> Optional[str]:
+        async with self.throttle:
+            post = await self.client.generate_post(niche, goal, content_format, title, description)
+        if post:
+            self.posts_done += 1
+        else:
+            self.posts_failed += 1
+        return post
+
+
+def report(runner: BatchRunner, client: OpenRouterClient, elapsed: float) -> None:
+    """Итоги запуска: строки, пропускная способность и токены в секунду"""
+    tokens = client.stats()["tokens"]
+    prompt_tokens = sum(task["prompt_tokens"] for task in tokens.values())
+    completion_tokens = sum(task["completion_tokens"] for task in tokens.values())
+    processed = runner.rows_done + runner.rows_failed
+    elapsed = max(elapsed, 1e-9)
+    logger.info(
+        f"Batch finished in {elapsed:.1f}s: {runner.rows_done} rows ok, {runner.rows_failed} failed, "
+        f"{runner.rows_skipped} skipped (resume); {runner.ideas} ideas, "
+        f"{runner.posts_done} posts ({runner.posts_failed} failed)"
+    )
+    logger.info(
+        f"Throughput: {processed / elapsed:.2f} rows/s, {client.upstream_requests / elapsed:.2f} requests/s, "
+        f"{completion_tokens / elapsed:.1f} completion tokens/s, "
+        f"{(prompt_tokens + completion_tokens) / elapsed:.1f} total tokens/s "
+        f"({prompt_tokens} prompt + {completion_tokens} completion)"
+    )
+
+
+async def run_batch(args: argparse.Namespace) -> None:
+    skip = completed_rows(args.output) if args.resume else set()
+    if skip:
+        logger.info(f"Resuming: {len(skip)} rows already done in {args.output}")
+    response_cache = ResponseCache() if CACHE_ENABLED and not args.no_cache else None
+    started = time.monotonic()
+    try:
+        async with OpenRouterClient(cache=response_cache) as client:
+            with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+                if args.resume and _torn_tail(args.output):
+                    # Прерванная запись не должна склеиться со следующей
+                    output.write("\n")
+                runner = BatchRunner(client, output, args.posts, args.concurrency, args.rate)
+                try:
+                    await runner.run(read_rows(args.input), skip)
+                finally:
+                    report(runner, client, time.monotonic() - started)
+    finally:
+        if response_cache is not None:
+            response_cache.close()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пакетная генерация идей и постов из JSONL/CSV")
+    parser.add_argument("input", help="Входной файл: JSONL или CSV с полями niche, goal, format")
+    parser.add_argument("-o", "--output", required=True, help="Выходной JSONL (он же контрольная точка)")
+    parser.add_argument("--posts", action="store_true", help="Генерировать пост для каждой идеи")
+    parser.add_argument("--resume", action="store_true", help="Пропустить строки, уже успешные в output")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Одновременных запросов")
+    parser.add_argument("--rate", type=float, default=BATCH_RATE_LIMIT, help="Запросов в секунду (0 - без лимита)")
+    parser.add_argument("--no-cache", action="store_true", help="Не использовать кэш ответов")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Точка входа CLI"""
+    args = parse_args(argv)
+    try:
+        asyncio.run(run_batch(args))
+    except KeyboardInterrupt:
+        logger.info("🛑 Прервано: запустите с --resume, чтобы продолжить")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+AI-IdeaFactory: Бенчмарк входных токенов на вызов
+Сравнивает прежний общий промпт из 4 агентов с промптами по задачам:
+входные токены на вызов и длину общего префикса двух разных запросов
+(именно он может попасть в кэш промптов провайдера)
+
+Токены считаются через tiktoken (o200k_base, как у gpt-4o), если он
+установлен, иначе - приблизительно (слова и знаки препинания).
+
+Запуск: python bench_prompts.py
+"""
+
+import json
+import re
+from typing import Callable, Dict, List, Tuple
+
+from prompts import PROMPTS
+
+# Прежняя раскладка: один системный промпт на все задачи
+LEGACY_SYSTEM_PROMPT = """Ты - AI-система для генерации контента, состоящая из 4 агентов. ДЕЙСТВУЙ ПОШАГОВО:
+
+1. АНАЛИЗАТОР - анализирует задачу:
+   - Определяет нишу, цель, формат
+   - Выявляет ключевые требования к контенту
+   - Формулирует критерии успеха
+
+2. ГЕНЕРАТОР - создает 10 идей в формате:
+   [{"title": "Название", "description": "Описание"}]
+
+3. КРИТИК - проверяет и улучшает:
+   - Соответствие цели и аудитории
+   - Уникальность и вовлекаемость
+   - Практическую ценность
+   - Выбирает 5 лучших идей
+
+4. ПОСТГЕНЕРАТОР - создает готовый пост:
+   - Заголовок + хук
+   - Структурированный текст
+   - Эмодзи и CTA
+   - Оптимизация под платформу
+
+ПИШИ КОНКРЕТНО, БЕЗ "ВОДЫ". Используй markdown для структуры."""
+
+LEGACY_IDEAS_PROMPT = """{context}
+
+НИША: {niche}
+ЦЕЛЬ: {goal}
+ФОРМАТ: {content_format}
+
+Сгенерируй 3-5 идей. Ответ только JSON:
+[{{"title": "...", "description": "..."}}]
+"""
+
+LEGACY_POST_PROMPT = """{context}
+
+ИДЕЯ: {idea_title}
+ОПИСАНИЕ: {idea_description}
+
+Создай готовый пост (макс. 300 слов) с:
+- Привлекающим заголовком
+- Структурой (абзацы, списки)
+- Эмодзи
+- Четким CTA
+"""
+
+REQUESTS = [
+    {"niche": "фитнес для мам", "goal": "привлечь аудиторию", "content_format": "рилс",
+     "idea_title": "5 упражнений с ребенком", "idea_description": "Короткая тренировка дома"},
+    {"niche": "кофейня", "goal": "продать", "content_format": "пост в соцсетях",
+     "idea_title": "Секрет идеального капучино", "idea_description": "Бариста делится лайфхаками"},
+]
+
+
+def token_counter() -> Tuple[Callable[[str], int], str]:
+    try:
+        import tiktoken
+    except ImportError:
+        return (lambda text: len(re.findall(r"\w+|[^\w\s]", text))), "приблизительно"
+    encoding = tiktoken.get_encoding("o200k_base")
+    return (lambda text: len(encoding.encode(text))), "tiktoken o200k_base"
+
+
+def legacy_messages(task: str, inputs: Dict[str, str]) -> List[Dict[str, str]]:
+    if task == "ideas":
+        prompt = LEGACY_IDEAS_PROMPT.format(context="", **inputs)
+    else:
+        prompt = LEGACY_POST_PROMPT.format(
+            context="", idea_title=inputs["idea_title"], idea_description=inputs["idea_description"]
+        )
+    return [{"role": "system", "content": LEGACY_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def current_messages(task: str, inputs: Dict[str, str]) -> List[Dict[str, str]]:
+    spec = PROMPTS[task]
+    fields = re.findall(r"{(\w+)}", spec.template)
+    return spec.messages(**{name: inputs[name] for name in fields})
+
+
+def common_prefix(a: str, b: str) -> str:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return a[:length]
+
+
+def report(title: str, build, count) -> None:
+    print(title)
+    for task in ("ideas", "posts"):
+        texts = [json.dumps(build(task, inputs), ensure_ascii=False) for inputs in REQUESTS]
+        tokens = sum(count(text) for text in texts) / len(texts)
+        prefix = count(common_prefix(*texts))
+        print(f"  {task:6} входных токенов на вызов: {tokens:6.0f}, общий префикс: {prefix:5} ({prefix / tokens:.0%})")
+
+
+def main():
+    count, method = token_counter()
+    print(f"Подсчет токенов: {method}")
+    report("До (общий промпт 4 агентов):", legacy_messages, count)
+    report("После (промпты по задачам):", current_messages, count)
+
+
+if __name__ == "__main__":
+    main()
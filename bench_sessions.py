@@ -0,0 +1,89 @@
+"""
+AI-IdeaFactory: Бенчмарк памяти сессий
+Сравнивает расход памяти на 100k синтетических сессий: словари с сырыми
+идеями из JSON (как раньше) и записи Session/Idea со __slots__ и интернированием
+
+Запуск: python bench_sessions.py [число_сессий]
+"""
+
+import gc
+import random
+import sys
+import tracemalloc
+
+from models import Idea, Session
+
+NICHES = ["фитнес", "кофейня", "IT-курсы", "путешествия", "психология", "маркетинг"]
+GOALS = ["привлечь аудиторию", "обучить", "продать", "развлечь"]
+FORMATS = ["пост в соцсетях", "статья", "видео", "рилс", "карусель"]
+
+
+def fresh(text: str) -> str:
+    """Новая копия строки, как у текста, пришедшего в отдельном сообщении Telegram"""
+    return "".join(list(text))
+
+
+def synthetic_ideas(rnd: random.Random):
+    """5 идей в виде сырых объектов ответа модели"""
+    return [
+        {
+            "title": f"Идея {rnd.randrange(10 ** 6)}: как {rnd.choice(GOALS)}",
+            "description": f"Описание {rnd.randrange(10 ** 6)} " + "подробности " * 8,
+        }
+        for _ in range(5)
+    ]
+
+
+def build_dicts(count: int, rnd: random.Random):
+    """Прежнее представление: словарь сессии со списком словарей идей"""
+    return [
+        {
+            "state": 4,
+            "niche": fresh(rnd.choice(NICHES)),
+            "goal": fresh(rnd.choice(GOALS)),
+            "format": fresh(rnd.choice(FORMATS)),
+            "ideas": synthetic_ideas(rnd),
+        }
+        for _ in range(count)
+    ]
+
+
+def build_records(count: int, rnd: random.Random):
+    """Новое представление: Session и Idea со __slots__"""
+    return [
+        Session(
+            state=4,
+            niche=fresh(rnd.choice(NICHES)),
+            goal=fresh(rnd.choice(GOALS)),
+            content_format=fresh(rnd.choice(FORMATS)),
+            ideas=[Idea.from_obj(obj) for obj in synthetic_ideas(rnd)],
+        )
+        for _ in range(count)
+    ]
+
+
+def measure(builder, count: int) -> int:
+    """Байт на сессию по данным tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = builder(count, random.Random(42))
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del sessions
+    return used // count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    before = measure(build_dicts, count)
+    after = measure(build_records, count)
+    print(f"Сессий: {count}")
+    print(f"dict (до):         {before} байт/сессия, {before * count / 2 ** 20:.1f} МБ всего")
+    print(f"Session (после):   {after} байт/сессия, {after * count / 2 ** 20:.1f} МБ всего")
+    print(f"Экономия: {100 * (before - after) / before:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+AI-IdeaFactory: Бенчмарк индекса похожих строк
+Заполняет SimilarityIndex синтетическими нишами и измеряет задержку
+nearest() для точных запросов, запросов с опечаткой и новых строк,
+а также долю найденных опечаток
+
+Запуск: python bench_similarity.py [число_строк]   (по умолчанию 1000000)
+"""
+
+import random
+import resource
+import sys
+import time
+
+from normalize import SimilarityIndex, jaccard, shingles
+
+SYLLABLES = (
+    "ба бо ве ви га го да ду же за зо ка ко ку ла ли ло лу ма ми мо на не ни но па по ра ре ри ро "
+    "са се си со та те ти то фа фи ха ца ча ша ю я ин ар ер ос ум ан ок ил"
+).split()
+
+
+def make_vocabulary(rng: random.Random, size: int) -> list:
+    """Псевдослова из 2-4 слогов: словарь большой, а строки не похожи друг на друга"""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_text(rng: random.Random, vocabulary: list) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 3)))
+
+
+def typo(rng: random.Random, text: str) -> str:
+    """Одна опечатка: пропуск, удвоение или замена буквы"""
+    position = rng.randrange(len(text))
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:position] + text[position + 1:]
+    if kind == 1:
+        return text[:position] + text[position] + text[position:]
+    return text[:position] + rng.choice("аеиоу") + text[position + 1:]
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(index: SimilarityIndex, queries) -> tuple:
+    latencies = []
+    found = 0
+    # Опечатки, которые в принципе можно найти: сходство с оригиналом >= порога
+    reachable = 0
+    for query, expected in queries:
+        started = time.perf_counter()
+        match = index.nearest(query)
+        latencies.append(time.perf_counter() - started)
+        found += match is not None and match[0] == expected
+        reachable += expected is not None and jaccard(shingles(query), shingles(expected)) >= index.threshold
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    return p50, p99, found / len(queries), reachable / len(queries)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng, 60_000)
+    index = SimilarityIndex(capacity=size)
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    texts = []
+    while len(index) < size:
+        text = make_text(rng, vocabulary)
+        if text not in index:
+            index.add(text)
+            # Равномерная выборка по всему индексу (reservoir sampling)
+            if len(texts) < 10_000:
+                texts.append(text)
+            elif rng.randrange(len(index)) < 10_000:
+                texts[rng.randrange(10_000)] = text
+    print(f"Строк в индексе: {len(index)}, заполнение {time.perf_counter() - started:.1f} с, "
+          f"память ~{rss_mb() - rss_before:.0f} МБ")
+
+    sample = rng.sample(texts, 2000)
+    exact = [(text, text) for text in sample]
+    typos = [(typo(rng, text), text) for text in sample]
+    new = [(f"совсем новая ниша {make_text(rng, vocabulary)}", None) for _ in range(2000)]
+    for title, queries in (("точное совпадение", exact), ("с опечаткой", typos), ("новая строка", new)):
+        p50, p99, found, reachable = measure(index, queries)
+        line = f"{title:18} p50 {p50:6.1f} мкс, p99 {p99:6.1f} мкс"
+        if title != "новая строка":
+            line += f", найдено {found:.1%} (сходство >= порога у {reachable:.1%})"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
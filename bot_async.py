@@ -0,0 +1,110 @@
+"""
+AI-IdeaFactory: Telegram Bot для генерации контент-идей
+Асинхронная версия на AsyncTeleBot: обработчики ждут OpenRouterClient напрямую,
+не занимая потоки, поэтому один процесс держит тысячи генераций одновременно
+"""
+
+import os
+import asyncio
+import logging
+from dotenv import load_dotenv
+from telebot.async_telebot import AsyncTeleBot
+
+from admission import AdmissionController
+from ai_client import OpenRouterClient
+from cache import ResponseCache
+from catalog import IdeaCatalog, RequestLog
+from config import (
+    ADMISSION_ENABLED,
+    CACHE_ENABLED,
+    CATALOG_PATH,
+    REQUEST_LOG_PATH,
+    SPECULATIVE_ENABLED,
+)
+from handlers import BotHandlers
+from sessions import create_session_store
+from speculation import SpeculativePosts
+
+# Конфигурация логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Загрузка переменных окружения
+load_dotenv()
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+
+# Создание бота
+bot = AsyncTeleBot(TELEGRAM_TOKEN)
+
+# Клиент для работы с AI (с кэшем ответов, если он включен)
+response_cache = ResponseCache() if CACHE_ENABLED else None
+ai_client = OpenRouterClient(cache=response_cache)
+
+# Лимиты генераций на чат и общий, честная очередь к OpenRouter
+admission = AdmissionController() if ADMISSION_ENABLED else None
+
+# Фоновая генерация постов для показанных идей (включается SPECULATIVE_ENABLED),
+# в admission с низшим приоритетом
+speculator = SpeculativePosts(ai_client, admission) if SPECULATIVE_ENABLED else None
+
+# Готовые идеи для популярных запросов (python catalog.py) и журнал запросов для их сборки
+idea_catalog = IdeaCatalog() if CATALOG_PATH else None
+request_log = RequestLog() if REQUEST_LOG_PATH else None
+
+# Хранилище сессий пользователей (LRU + истечение по простою)
+sessions = create_session_store()
+
+# Обработчики диалога, общие для всех версий бота
+handlers = BotHandlers(
+    bot,
+    ai_client,
+    sessions,
+    admission=admission,
+    speculator=speculator,
+    idea_catalog=idea_catalog,
+    request_log=request_log
+)
+handlers.dispatcher.install(bot)
+
+
+async def run_bot():
+    """Запуск асинхронного бота с жизненным циклом пула соединений"""
+    async with ai_client:
+        # Прогреваем пул соединений с OpenRouter и запускаем очистку сессий
+        await ai_client.warmup()
+        sessions.start()
+        
+        logger.info("🤖 Асинхронный бот запущен и готов к работе!")
+        logger.info("Нажмите Ctrl+C для остановки")
+        
+        try:
+            await bot.infinity_polling(timeout=10, request_timeout=20)
+        finally:
+            await handlers.cancel_all()
+            await bot.close_session()
+            sessions.close()
+            if response_cache is not None:
+                response_cache.close()
+            if request_log is not None:
+                request_log.close()
+
+
+def main():
+    """Главная функция"""
+    if not TELEGRAM_TOKEN:
+        logger.error("❌ TELEGRAM_TOKEN не установлен в .env файле")
+        return
+    
+    try:
+        asyncio.run(run_bot())
+    except KeyboardInterrupt:
+        logger.info("🛑 Бот остановлен пользователем")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при запуске бота: {e}")
+
+
+if __name__ == "__main__":
+    main()
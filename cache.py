@@ -0,0 +1,216 @@
+"""
+AI-IdeaFactory: Двухуровневый кэш ответов модели
+In-memory LRU поверх SQLite: повторные запросы с теми же параметрами
+не обращаются к OpenRouter и переживают перезапуск бота
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import CACHE_PATH, CACHE_MEMORY_SIZE, CACHE_MAX_ENTRIES, CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Как часто (в записях) проверять размер SQLite-хранилища
+_EVICTION_CHECK_EVERY = 100
+
+
+def normalize_input(value: str) -> str:
+    """Нормализовать пользовательский ввод для ключа кэша"""
+    return " ".join(str(value).casefold().split())
+
+
+class ResponseCache:
+    """
+    Кэш ответов: LRU в памяти + SQLite на диске
+
+    Записи старше ttl секунд считаются устаревшими на обоих уровнях.
+    Память ограничена memory_size записями, диск - max_entries записями
+    (вытесняются давно не читавшиеся).
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        memory_size: int = CACHE_MEMORY_SIZE,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl: float = CACHE_TTL
+    ):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.commit()
+
+        # Метрики
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    @staticmethod
+    def make_key(template: str, model: str, temperature: float, **inputs: str) -> str:
+        """
+        Построить ключ кэша
+
+        Args:
+            template: Текст шаблона промпта (включая системный промпт)
+            model: Идентификатор модели
+            temperature: Температура генерации
+            **inputs: Пользовательские параметры (нормализуются)
+        """
+        payload = json.dumps(
+            {
+                "template": hashlib.sha256(template.encode("utf-8")).hexdigest(),
+                "model": model,
+                "temperature": round(float(temperature), 3),
+                "inputs": {name: normalize_input(value) for name, value in sorted(inputs.items())},
+            },
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, allow_stale: bool = False, count_miss: bool = True) -> Optional[Any]:
+        """
+        Получить значение по ключу или None при промахе
+
+        Args:
+            key: Ключ кэша
+            allow_stale: Вернуть и устаревшую (старше ttl), но еще не удаленную
+                запись - для работы в деградированном режиме, когда API недоступен
+            count_miss: Учесть промах в метриках; False - вызывающий ищет еще по
+                другим ключам и сам вызовет record_miss(), если не найдет ничего
+        """
+        now = time.time()
+        ttl = float("inf") if allow_stale else self.ttl
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= ttl:
+                    self._memory.move_to_end(key)
+                    self._count_hit(now - created_at, memory=True)
+                    return value
+                del self._memory[key]
+
+            try:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= ttl:
+                    self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Cache read error: {e}")
+                row = None
+
+            if row is None or now - row[1] > ttl:
+                if count_miss:
+                    self.misses += 1
+                return None
+
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            self._count_hit(now - row[1], memory=False)
+            return value
+
+    def record_miss(self) -> None:
+        """Учесть промах поиска, прошедшего по нескольким ключам"""
+        with self._lock:
+            self.misses += 1
+
+    def set(self, key: str, value: Any) -> None:
+        """Сохранить JSON-сериализуемое значение на обоих уровнях"""
+        now = time.time()
+        serialized = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, value, now)
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, serialized, now, now)
+                )
+                self._writes += 1
+                if self._writes % _EVICTION_CHECK_EVERY == 0:
+                    self._evict_disk(now)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Cache write error: {e}")
+                return
+            self.stores += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и размеры уровней"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "stale_hits": self.stale_hits,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        """Закрыть соединение с SQLite"""
+        with self._lock:
+            self._db.close()
+
+    def _count_hit(self, age: float, memory: bool) -> None:
+        if age > self.ttl:
+            self.stale_hits += 1
+        elif memory:
+            self.memory_hits += 1
+        else:
+            self.disk_hits += 1
+
+    def _remember(self, key: str, value: Any, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float) -> None:
+        """Удалить устаревшие записи и лишние сверх max_entries"""
+        expired = self._db.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = 0
+        if count > self.max_entries:
+            overflow = self._db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+        if expired or overflow:
+            self.evictions += expired + overflow
+            logger.info(f"Кэш ответов: удалено {expired} устаревших и {overflow} лишних записей")
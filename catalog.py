@@ -0,0 +1,331 @@
+"""
+AI-IdeaFactory: Каталог готовых идей для популярных запросов
+Журнал запросов niche/goal/format, офлайн-сборка каталога (самые частые
+комбинации из журнала, по несколько наборов идей на каждую) в сжатый файл
+и быстрый поиск по нему в handle_format с чередованием наборов
+
+Сборка (например, раз в сутки по cron):
+    python catalog.py [--log requests_log.jsonl] [--out catalog.json.gz] [--top 200] [--variants 3]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    CATALOG_PATH,
+    CATALOG_RELOAD_INTERVAL,
+    CATALOG_MAX_AGE,
+    CATALOG_TOP_N,
+    CATALOG_VARIANTS,
+    CATALOG_MIN_COUNT,
+    CATALOG_LOG_DAYS,
+    BATCH_CONCURRENCY,
+    BATCH_RATE_LIMIT,
+    REQUEST_LOG_PATH,
+    SIMILARITY_ENABLED,
+)
+from models import Idea
+from normalize import InputMatcher, normalize_text
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION = 1
+
+CatalogKey = Tuple[str, str, str]
+# niche, goal, format в том виде, как их ввел пользователь
+RawRequest = Tuple[str, str, str]
+
+
+def catalog_key(niche: str, goal: str, content_format: str) -> CatalogKey:
+    """Нормализованная комбинация: регистр, пунктуация и синонимы не различаются"""
+    return tuple(normalize_text(value) for value in (niche, goal, content_format))
+
+
+class RequestLog:
+    """Журнал запросов идей (JSONL, одна строка на запрос) для сборки каталога"""
+
+    def __init__(self, path: str = REQUEST_LOG_PATH):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def record(self, niche: str, goal: str, content_format: str) -> None:
+        """Дописать запрос в журнал; ошибки записи не мешают ответу пользователю"""
+        line = json.dumps(
+            {"ts": int(time.time()), "niche": niche, "goal": goal, "format": content_format},
+            ensure_ascii=False
+        ) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._file.write(line)
+            except OSError as e:
+                logger.warning(f"Request log write failed: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def top_requests(
+    path: str,
+    top_n: int = CATALOG_TOP_N,
+    min_count: int = CATALOG_MIN_COUNT,
+    since: float = 0.0
+) -> List[Tuple[CatalogKey, RawRequest, int]]:
+    """
+    Самые частые комбинации журнала
+
+    Журнал читается построчно; в памяти только счетчики комбинаций и их
+    написаний. Для каждой комбинации возвращается самое частое написание -
+    по нему генерируются идеи (нормализованный ключ для промпта не годится).
+    Учитываются записи не старше since (unix time).
+    """
+    counts: Counter = Counter()
+    spellings: Dict[CatalogKey, Counter] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get("ts", 0) < since:
+                    continue
+                raw = (record["niche"].strip(), record["goal"].strip(), record["format"].strip())
+                key = catalog_key(*raw)
+            except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                continue
+            counts[key] += 1
+            spellings.setdefault(key, Counter())[raw] += 1
+    return [
+        (key, spellings[key].most_common(1)[0][0], count)
+        for key, count in counts.most_common(top_n) if count >= min_count
+    ]
+
+
+def write_catalog(path: str, entries: Dict[CatalogKey, List[List[Idea]]]) -> None:
+    """
+    Записать каталог атомарно (временный файл + replace)
+
+    Формат: gzip JSON {"version", "built_at", "entries": [[niche, goal, format,
+    [[[title, description], ...], ...]], ...]} - списки вместо словарей.
+    """
+    document = {
+        "version": CATALOG_VERSION,
+        "built_at": int(time.time()),
+        "entries": [
+            [*key, [[[idea.title, idea.description] for idea in variant] for variant in variants]]
+            for key, variants in entries.items()
+        ],
+    }
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+class IdeaCatalog:
+    """
+    Готовые наборы идей по нормализованной комбинации niche/goal/format
+
+    Файл перечитывается, если изменился (проверка не чаще reload_interval
+    секунд). Каталог старше max_age секунд не используется (0 - без
+    ограничения): пока его не пересоберут, идеи генерируются вживую.
+    Наборы одной комбинации выдаются по очереди. Если точной комбинации
+    нет, каждое поле заменяется ближайшим по сходству значением каталога.
+    """
+
+    def __init__(
+        self,
+        path: str = CATALOG_PATH,
+        reload_interval: float = CATALOG_RELOAD_INTERVAL,
+        max_age: float = CATALOG_MAX_AGE
+    ):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.max_age = max_age
+        self._entries: Dict[CatalogKey, List[List[Idea]]] = {}
+        self._matcher: Optional[InputMatcher] = None
+        self._rotation: Dict[CatalogKey, int] = {}
+        self._built_at = 0.0
+        self._mtime: Optional[float] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.lookups = 0
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.expired = 0
+        self.reloads = 0
+
+    def lookup(self, niche: str, goal: str, content_format: str) -> Optional[List[Idea]]:
+        """Очередной набор идей для комбинации или None (промах - генерировать вживую)"""
+        key = catalog_key(niche, goal, content_format)
+        with self._lock:
+            self._maybe_reload()
+            self.lookups += 1
+            variants = self._entries.get(key)
+            if variants is None and self._matcher is not None:
+                similar = self._matcher.redirect(key)
+                if similar is not None:
+                    key = similar
+                    variants = self._entries.get(key)
+                    self.fuzzy_hits += 1
+            if not variants:
+                return None
+            if self.max_age and time.time() - self._built_at > self.max_age:
+                self.expired += 1
+                return None
+            index = self._rotation.get(key, 0)
+            self._rotation[key] = (index + 1) % len(variants)
+            self.hits += 1
+            return list(variants[index])
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер и возраст каталога, доля попаданий"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "variants": sum(len(variants) for variants in self._entries.values()),
+                "age_seconds": int(time.time() - self._built_at) if self._built_at else None,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "reloads": self.reloads,
+            }
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._load()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Failed to load idea catalog {self.path}: {e}")
+            return
+        self._mtime = mtime
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            document = json.load(f)
+        if document.get("version") != CATALOG_VERSION:
+            raise ValueError(f"unsupported catalog version {document.get('version')}")
+        entries = {}
+        for niche, goal, content_format, raw_variants in document["entries"]:
+            variants = []
+            for raw_ideas in raw_variants:
+                ideas = [Idea.from_obj({"title": title, "description": description})
+                         for title, description in raw_ideas]
+                ideas = [idea for idea in ideas if idea is not None]
+                if ideas:
+                    variants.append(ideas)
+            if variants:
+                entries[catalog_key(niche, goal, content_format)] = variants
+        self._entries = entries
+        if SIMILARITY_ENABLED:
+            self._matcher = InputMatcher()
+            for key in entries:
+                self._matcher.add(key)
+        self._rotation = {}
+        self._built_at = float(document.get("built_at") or 0)
+        self.reloads += 1
+        logger.info(f"Idea catalog loaded: {len(entries)} combinations from {self.path}")
+
+
+async def build_catalog(
+    combinations: List[Tuple[CatalogKey, RawRequest]],
+    variants: int = CATALOG_VARIANTS,
+    concurrency: int = BATCH_CONCURRENCY,
+    rate: float = BATCH_RATE_LIMIT
+) -> Dict[CatalogKey, List[List[Idea]]]:
+    """Сгенерировать до variants разных наборов идей для каждой комбинации (промпт - из написания пользователя)"""
+    from ai_client import OpenRouterClient
+    from batch import Throttle
+
+    throttle = Throttle(concurrency, rate)
+    entries: Dict[CatalogKey, List[List[Idea]]] = {}
+
+    async def generate(client: OpenRouterClient, key: CatalogKey, raw: RawRequest) -> None:
+        # Наборы одной комбинации запрашиваются по очереди: одновременные
+        # одинаковые запросы клиент объединил бы в один
+        sets = []
+        for _ in range(variants):
+            async with throttle:
+                ideas = await client.generate_ideas(*raw, temperature=0.9, use_cache=False)
+            if ideas and all(ideas != existing for existing in sets):
+                sets.append(ideas)
+        if sets:
+            entries[key] = sets
+        else:
+            logger.warning(f"No ideas generated for {key}")
+
+    async with OpenRouterClient() as client:
+        await asyncio.gather(*(generate(client, key, raw) for key, raw in combinations))
+    return entries
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сборка каталога готовых идей из журнала запросов")
+    parser.add_argument("--log", default=REQUEST_LOG_PATH, help="Журнал запросов (REQUEST_LOG_PATH)")
+    parser.add_argument("--out", default=CATALOG_PATH, help="Файл каталога (CATALOG_PATH)")
+    parser.add_argument("--top", type=int, default=CATALOG_TOP_N, help="Сколько популярных комбинаций")
+    parser.add_argument("--variants", type=int, default=CATALOG_VARIANTS, help="Наборов идей на комбинацию")
+    parser.add_argument("--min-count", type=int, default=CATALOG_MIN_COUNT, help="Минимум запросов комбинации")
+    parser.add_argument("--days", type=float, default=CATALOG_LOG_DAYS, help="Учитывать журнал за N дней (0 - весь)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Одновременных запросов")
+    parser.add_argument("--rate", type=float, default=BATCH_RATE_LIMIT, help="Запросов в секунду (0 - без лимита)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Точка входа сборки каталога"""
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    args = parse_args(argv)
+    if not args.log or not args.out:
+        logger.error("❌ Укажите журнал запросов и файл каталога (--log/--out или REQUEST_LOG_PATH/CATALOG_PATH)")
+        return
+
+    since = time.time() - args.days * 24 * 3600 if args.days else 0.0
+    combinations = top_requests(args.log, args.top, args.min_count, since)
+    if not combinations:
+        logger.warning("В журнале нет достаточно частых комбинаций - каталог не изменен")
+        return
+    total = sum(count for _, _, count in combinations)
+    logger.info(f"Building catalog for {len(combinations)} combinations covering {total} logged requests")
+
+    started = time.monotonic()
+    entries = asyncio.run(build_catalog(
+        [(key, raw) for key, raw, _ in combinations], args.variants, args.concurrency, args.rate
+    ))
+    write_catalog(args.out, entries)
+    logger.info(
+        f"Catalog written to {args.out}: {len(entries)} combinations, "
+        f"{sum(len(v) for v in entries.values())} idea sets, "
+        f"{os.path.getsize(args.out)} bytes in {time.monotonic() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+AI-IdeaFactory: Конфигурация проекта
+Параметры генерации, HTTP-клиента и режимов работы бота из переменных окружения
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    """Прочитать целое число из окружения"""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Прочитать число с плавающей точкой из окружения"""
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Прочитать флаг из окружения (1/true/yes/on)"""
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# HTTP-клиент OpenRouter: общий пул соединений с keep-alive
+HTTP_TIMEOUT = _env_float("HTTP_TIMEOUT", 60.0)
+HTTP_CONNECT_TIMEOUT = _env_float("HTTP_CONNECT_TIMEOUT", 10.0)
+HTTP_POOL_TIMEOUT = _env_float("HTTP_POOL_TIMEOUT", 60.0)
+HTTP_MAX_CONNECTIONS = _env_int("HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = _env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+HTTP_KEEPALIVE_EXPIRY = _env_float("HTTP_KEEPALIVE_EXPIRY", 60.0)
+HTTP2_ENABLED = _env_bool("HTTP2_ENABLED", False)
+HTTP_WARMUP_CONNECTIONS = _env_int("HTTP_WARMUP_CONNECTIONS", 2)
+
+# Режим polling-бота: sync (TeleBot + потоки) или async (AsyncTeleBot)
+BOT_MODE = os.getenv("BOT_MODE", "sync").strip().lower()
+
+# Синхронный бот: число потоков telebot, ожидающих ответа AI
+BOT_WORKER_THREADS = _env_int("BOT_WORKER_THREADS", 8)
+
+# Webhook: фоновая очередь обработки обновлений
+WEBHOOK_WORKERS = _env_int("WEBHOOK_WORKERS", 8)
+WEBHOOK_QUEUE_SIZE = _env_int("WEBHOOK_QUEUE_SIZE", 1000)
+WEBHOOK_ENQUEUE_TIMEOUT = _env_float("WEBHOOK_ENQUEUE_TIMEOUT", 0.05)
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+WEBHOOK_DEDUP_SIZE = _env_int("WEBHOOK_DEDUP_SIZE", 10000)
+WEBHOOK_DEDUP_TTL = _env_float("WEBHOOK_DEDUP_TTL", 600.0)
+
+# Кэш ответов модели (LRU в памяти + SQLite)
+CACHE_ENABLED = _env_bool("CACHE_ENABLED", True)
+CACHE_PATH = os.getenv("CACHE_PATH", "cache.sqlite3")
+CACHE_MEMORY_SIZE = _env_int("CACHE_MEMORY_SIZE", 1000)
+CACHE_MAX_ENTRIES = _env_int("CACHE_MAX_ENTRIES", 100000)
+CACHE_TTL = _env_float("CACHE_TTL", 7 * 24 * 3600)
+
+# Потоковая генерация постов с обновлением сообщения в Telegram
+STREAM_POSTS = _env_bool("STREAM_POSTS", True)
+STREAM_EDIT_INTERVAL = _env_float("STREAM_EDIT_INTERVAL", 1.0)
+STREAM_IDEAS = _env_bool("STREAM_IDEAS", True)
+
+# Спекулятивная генерация постов для показанных идей (opt-in)
+SPECULATIVE_ENABLED = _env_bool("SPECULATIVE_ENABLED", False)
+SPECULATIVE_TOP_K = _env_int("SPECULATIVE_TOP_K", 2)
+SPECULATIVE_TOKEN_BUDGET = _env_int("SPECULATIVE_TOKEN_BUDGET", 200000)
+SPECULATIVE_BUDGET_WINDOW = _env_float("SPECULATIVE_BUDGET_WINDOW", 3600.0)
+SPECULATIVE_POST_TOKENS = _env_int("SPECULATIVE_POST_TOKENS", 800)
+
+# Сессии пользователей: максимум сессий в памяти и время жизни без активности
+SESSION_CAPACITY = _env_int("SESSION_CAPACITY", 100000)
+SESSION_IDLE_TTL = _env_float("SESSION_IDLE_TTL", 24 * 3600)
+SESSION_SWEEP_INTERVAL = _env_float("SESSION_SWEEP_INTERVAL", 300.0)
+
+# Постоянное хранилище сессий: memory (по умолчанию) или sqlite
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_FLUSH_INTERVAL = _env_float("SESSION_FLUSH_INTERVAL", 1.0)
+
+# Повторы запросов к OpenRouter при 429, 5xx и таймаутах
+RETRY_MAX_ATTEMPTS = _env_int("RETRY_MAX_ATTEMPTS", 4)
+RETRY_BASE_DELAY = _env_float("RETRY_BASE_DELAY", 0.5)
+RETRY_MAX_DELAY = _env_float("RETRY_MAX_DELAY", 8.0)
+RETRY_DEADLINE = _env_float("RETRY_DEADLINE", 90.0)
+
+# Circuit breaker для OpenRouter: скользящее окно ошибок и медленных ответов
+BREAKER_WINDOW = _env_float("BREAKER_WINDOW", 60.0)
+BREAKER_MIN_REQUESTS = _env_int("BREAKER_MIN_REQUESTS", 5)
+BREAKER_ERROR_RATE = _env_float("BREAKER_ERROR_RATE", 0.5)
+BREAKER_SLOW_CALL = _env_float("BREAKER_SLOW_CALL", 30.0)
+BREAKER_SLOW_RATE = _env_float("BREAKER_SLOW_RATE", 0.8)
+BREAKER_OPEN_SECONDS = _env_float("BREAKER_OPEN_SECONDS", 30.0)
+BREAKER_HALF_OPEN_PROBES = _env_int("BREAKER_HALF_OPEN_PROBES", 1)
+
+# Основная модель: кандидат по умолчанию и запасной выбор роутера
+MODEL = "openai/gpt-4o-mini"
+
+# Выбор модели: кандидаты по задачам (через запятую), цены и политика роутера
+MODEL_CANDIDATES_IDEAS = os.getenv("MODEL_CANDIDATES_IDEAS", MODEL)
+MODEL_CANDIDATES_POSTS = os.getenv("MODEL_CANDIDATES_POSTS", MODEL)
+# Цены в долларах за 1M входных/выходных токенов: "model=0.15/0.60,model2=..."
+MODEL_PRICES = os.getenv("MODEL_PRICES", "openai/gpt-4o-mini=0.15/0.60")
+ROUTER_COST_CEILING_IDEAS = _env_float("ROUTER_COST_CEILING_IDEAS", 0.005)
+ROUTER_COST_CEILING_POSTS = _env_float("ROUTER_COST_CEILING_POSTS", 0.01)
+ROUTER_EXPLORE_RATE = _env_float("ROUTER_EXPLORE_RATE", 0.05)
+ROUTER_EWMA_ALPHA = _env_float("ROUTER_EWMA_ALPHA", 0.2)
+ROUTER_MIN_SAMPLES = _env_int("ROUTER_MIN_SAMPLES", 5)
+ROUTER_MAX_ERROR_RATE = _env_float("ROUTER_MAX_ERROR_RATE", 0.5)
+
+# Hedging генерации идей: дубль запроса, если ответа нет дольше p90
+HEDGE_ENABLED = _env_bool("HEDGE_ENABLED", False)
+HEDGE_PERCENTILE = _env_float("HEDGE_PERCENTILE", 0.9)
+HEDGE_MAX_FRACTION = _env_float("HEDGE_MAX_FRACTION", 0.1)
+HEDGE_MIN_DELAY = _env_float("HEDGE_MIN_DELAY", 1.0)
+HEDGE_MIN_SAMPLES = _env_int("HEDGE_MIN_SAMPLES", 20)
+
+# Лимит max_tokens по задачам: потолок (и значение до накопления статистики),
+# затем перцентиль наблюдаемых completion_tokens плюс запас
+MAX_TOKENS_IDEAS = _env_int("MAX_TOKENS_IDEAS", 2000)
+MAX_TOKENS_POSTS = _env_int("MAX_TOKENS_POSTS", 3000)
+TOKEN_BUDGET_PERCENTILE = _env_float("TOKEN_BUDGET_PERCENTILE", 0.99)
+TOKEN_BUDGET_MARGIN = _env_float("TOKEN_BUDGET_MARGIN", 0.25)
+TOKEN_BUDGET_MIN_TOKENS = _env_int("TOKEN_BUDGET_MIN_TOKENS", 256)
+TOKEN_BUDGET_MIN_SAMPLES = _env_int("TOKEN_BUDGET_MIN_SAMPLES", 20)
+TOKEN_BUDGET_MAX_CONTINUATIONS = _env_int("TOKEN_BUDGET_MAX_CONTINUATIONS", 1)
+
+# Пакетная генерация (batch.py): параллельные запросы и лимит запросов в секунду (0 - без лимита)
+BATCH_CONCURRENCY = _env_int("BATCH_CONCURRENCY", 8)
+BATCH_RATE_LIMIT = _env_float("BATCH_RATE_LIMIT", 5.0)
+
+# Каталог готовых идей для популярных запросов (собирается python catalog.py)
+# и журнал запросов, из которого он собирается; пустой путь - выключено
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH", "")
+CATALOG_PATH = os.getenv("CATALOG_PATH", "")
+CATALOG_RELOAD_INTERVAL = _env_float("CATALOG_RELOAD_INTERVAL", 60.0)
+CATALOG_MAX_AGE = _env_float("CATALOG_MAX_AGE", 7 * 24 * 3600)
+CATALOG_TOP_N = _env_int("CATALOG_TOP_N", 200)
+CATALOG_VARIANTS = _env_int("CATALOG_VARIANTS", 3)
+CATALOG_MIN_COUNT = _env_int("CATALOG_MIN_COUNT", 3)
+CATALOG_LOG_DAYS = _env_float("CATALOG_LOG_DAYS", 30.0)
+
+# Нечеткое сопоставление ввода (niche/goal/format) для ключей кэша и каталога:
+# нормализация + индекс похожих строк (MinHash/LSH по триграммам символов)
+SIMILARITY_ENABLED = _env_bool("SIMILARITY_ENABLED", True)
+SIMILARITY_THRESHOLD = _env_float("SIMILARITY_THRESHOLD", 0.7)
+SIMILARITY_INDEX_CAPACITY = _env_int("SIMILARITY_INDEX_CAPACITY", 20000)
+# JSON {"каноническая форма": ["вариант", ...]} в дополнение к встроенным синонимам
+SYNONYMS_PATH = os.getenv("SYNONYMS_PATH", "")
+
+# Допуск генераций из ботов (включается явно): одновременные запросы к OpenRouter
+# (по умолчанию - размер пула соединений), лимиты чата (запросов в минуту, запас)
+# и общий (запросов в секунду, 0 - без лимита)
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED", False)
+ADMISSION_MAX_CONCURRENT = _env_int("ADMISSION_MAX_CONCURRENT", HTTP_MAX_CONNECTIONS)
+ADMISSION_CHAT_CONCURRENCY = _env_int("ADMISSION_CHAT_CONCURRENCY", 2)
+ADMISSION_CHAT_PER_MINUTE = _env_float("ADMISSION_CHAT_PER_MINUTE", 6.0)
+ADMISSION_CHAT_BURST = _env_int("ADMISSION_CHAT_BURST", 5)
+ADMISSION_GLOBAL_PER_SECOND = _env_float("ADMISSION_GLOBAL_PER_SECOND", 5.0)
+ADMISSION_GLOBAL_BURST = _env_int("ADMISSION_GLOBAL_BURST", 20)
+# Сколько секунд запрос может ждать слот в очереди, потом - отказ
+ADMISSION_MAX_WAIT = _env_float("ADMISSION_MAX_WAIT", 20.0)
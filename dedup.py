@@ -0,0 +1,89 @@
+"""
+AI-IdeaFactory: Защита от повторной обработки
+Индекс недавно обработанных update_id и блокировка параллельных генераций в одном чате
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Hashable, Set
+
+
+class RecentIds:
+    """
+    Ограниченный по размеру и времени индекс недавно виденных идентификаторов
+
+    Кольцевой буфер (deque) хранит порядок поступления, словарь - быструю проверку.
+    Запись живет не дольше ttl секунд и вытесняется, когда буфер заполнен.
+    """
+
+    def __init__(self, capacity: int = 10000, ttl: float = 600.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._order: deque = deque()
+        self._seen: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def seen(self, item_id: Hashable) -> bool:
+        """
+        Отметить идентификатор как виденный
+
+        Returns:
+            True, если идентификатор уже встречался (дубликат)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            if item_id in self._seen:
+                self.duplicates += 1
+                return True
+            self._seen[item_id] = now
+            self._order.append((now, item_id))
+            return False
+
+    def forget(self, item_id: Hashable) -> None:
+        """Убрать идентификатор, чтобы повторная доставка была обработана"""
+        with self._lock:
+            self._seen.pop(item_id, None)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _evict(self, now: float) -> None:
+        while self._order and (
+            len(self._order) >= self.capacity or now - self._order[0][0] > self.ttl
+        ):
+            ts, item_id = self._order.popleft()
+            # Запись могла быть удалена и добавлена заново - сравниваем время
+            if self._seen.get(item_id) == ts:
+                del self._seen[item_id]
+
+
+class InFlightGuard:
+    """Не более одной операции на ключ (например, генерация поста в чате)"""
+
+    def __init__(self):
+        self._active: Set[Hashable] = set()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def try_acquire(self, key: Hashable) -> bool:
+        """Занять ключ; False, если операция для него уже выполняется"""
+        with self._lock:
+            if key in self._active:
+                self.rejected += 1
+                return False
+            self._active.add(key)
+            return True
+
+    def release(self, key: Hashable) -> None:
+        """Освободить ключ"""
+        with self._lock:
+            self._active.discard(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._active
+
+    def __len__(self) -> int:
+        return len(self._active)
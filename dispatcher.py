@@ -0,0 +1,154 @@
+"""
+AI-IdeaFactory: Таблица маршрутизации обновлений
+Вместо цепочки lambda-фильтров, которые telebot проверяет по очереди для каждого
+сообщения, обработчик находится одним поиском в словаре: по команде, точному
+тексту reply кнопки, состоянию диалога или префиксу callback_data
+"""
+
+import inspect
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Any], Any]
+
+
+class Dispatcher:
+    """
+    Маршрутизатор сообщений и callback-запросов
+
+    Порядок для текстового сообщения: команда (/start) -> точный текст кнопки ->
+    состояние пользователя -> обработчик по умолчанию. Для callback: точное
+    значение callback_data -> префикс до первого "_" включительно (idea_3 -> idea_).
+
+    prepare(user_id) - корутина, которую async бот дожидается перед поиском
+    обработчика (например, чтение сессии с диска вне event loop).
+    """
+
+    def __init__(
+        self,
+        get_state: Callable[[Hashable], Optional[int]],
+        prepare: Optional[Callable[[Hashable], Awaitable]] = None
+    ):
+        self.get_state = get_state
+        self.prepare = prepare
+        self._commands: Dict[str, Handler] = {}
+        self._buttons: Dict[str, Handler] = {}
+        self._states: Dict[int, Handler] = {}
+        self._callbacks: Dict[str, Handler] = {}
+        self._callback_prefixes: Dict[str, Handler] = {}
+        self._default: Optional[Handler] = None
+
+    def command(self, *names: str) -> Callable[[Handler], Handler]:
+        """Обработчик команд (без "/")"""
+        return self._register(self._commands, names)
+
+    def button(self, *texts: str) -> Callable[[Handler], Handler]:
+        """Обработчик reply кнопок по точному тексту"""
+        return self._register(self._buttons, texts)
+
+    def state(self, *states: int) -> Callable[[Handler], Handler]:
+        """Обработчик текста в заданном состоянии диалога"""
+        return self._register(self._states, states)
+
+    def callback(self, *values: str) -> Callable[[Handler], Handler]:
+        """Обработчик callback-запросов по точному callback_data"""
+        return self._register(self._callbacks, values)
+
+    def callback_prefix(self, *prefixes: str) -> Callable[[Handler], Handler]:
+        """Обработчик callback-запросов по префиксу, заканчивающемуся на "_" (например, "idea_")"""
+        for prefix in prefixes:
+            if not prefix.endswith("_"):
+                raise ValueError(f"Callback prefix must end with '_': {prefix!r}")
+        return self._register(self._callback_prefixes, prefixes)
+
+    def default(self, handler: Handler) -> Handler:
+        """Обработчик сообщений, не попавших ни в одну таблицу"""
+        self._default = handler
+        return handler
+
+    def resolve_message(self, message: Any) -> Optional[Handler]:
+        """Найти обработчик текстового сообщения"""
+        text = message.text or ""
+        if text.startswith("/"):
+            # "/start@BotName arg" -> "start"
+            name = text[1:].split(maxsplit=1)[0].split("@", 1)[0] if len(text) > 1 else ""
+            handler = self._commands.get(name)
+            if handler is not None:
+                return handler
+        handler = self._buttons.get(text.strip())
+        if handler is not None:
+            return handler
+        handler = self._states.get(self.get_state(message.chat.id))
+        return handler if handler is not None else self._default
+
+    def resolve_callback(self, call: Any) -> Optional[Handler]:
+        """Найти обработчик callback-запроса"""
+        data = call.data or ""
+        handler = self._callbacks.get(data)
+        if handler is None:
+            separator = data.find("_")
+            if separator != -1:
+                handler = self._callback_prefixes.get(data[:separator + 1])
+        return handler
+
+    def dispatch_message(self, message: Any) -> Any:
+        handler = self.resolve_message(message)
+        return handler(message) if handler is not None else None
+
+    def dispatch_callback(self, call: Any) -> Any:
+        handler = self.resolve_callback(call)
+        if handler is None:
+            logger.warning(f"No handler for callback data: {call.data}")
+            return None
+        return handler(call)
+
+    def install(self, bot, run: Optional[Callable[[Awaitable], Any]] = None) -> None:
+        """
+        Зарегистрировать в боте по одному обработчику сообщений и callback-запросов
+
+        Для AsyncTeleBot регистрируются корутины, которые дожидаются
+        результата async обработчиков. Синхронный бот выполняет корутины
+        обработчиков через run (например, AsyncRuntime.run).
+        """
+        if inspect.iscoroutinefunction(bot.process_new_updates):
+            async def on_message(message):
+                if self.prepare is not None:
+                    await self.prepare(message.chat.id)
+                result = self.dispatch_message(message)
+                if inspect.isawaitable(result):
+                    await result
+
+            async def on_callback(call):
+                if self.prepare is not None:
+                    await self.prepare(call.from_user.id)
+                result = self.dispatch_callback(call)
+                if inspect.isawaitable(result):
+                    await result
+        elif run is not None:
+            def on_message(message):
+                result = self.dispatch_message(message)
+                if inspect.isawaitable(result):
+                    run(result)
+
+            def on_callback(call):
+                result = self.dispatch_callback(call)
+                if inspect.isawaitable(result):
+                    run(result)
+        else:
+            on_message = self.dispatch_message
+            on_callback = self.dispatch_callback
+
+        bot.register_message_handler(on_message, func=lambda message: True)
+        bot.register_callback_query_handler(on_callback, func=lambda call: True)
+
+    @staticmethod
+    def _register(table: Dict, keys) -> Callable[[Handler], Handler]:
+        def decorator(handler: Handler) -> Handler:
+            for key in keys:
+                if key in table:
+                    raise ValueError(f"Duplicate route {key!r} for {handler.__name__}")
+                table[key] = handler
+            return handler
+        return decorator
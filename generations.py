@@ -0,0 +1,158 @@
+"""
+AI-IdeaFactory: Текущие генерации чатов
+Каждая генерация идей или поста выполняется как отменяемая задача чата:
+новая генерация отменяет прежнюю того же вида, /cancel и новый раунд - все
+генерации чата, а результат отмененной генерации пользователю не отдается
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class GenerationCancelled(Exception):
+    """Генерация отменена: пользователь отменил диалог или запустил новую"""
+
+
+class _Generation:
+    """Задача генерации и признак ее отмены"""
+
+    __slots__ = ("kind", "task", "cancelled")
+
+    def __init__(self, kind: str, task: asyncio.Task):
+        self.kind = kind
+        self.task = task
+        self.cancelled = False
+
+
+class ChatGenerations:
+    """
+    Не больше одной генерации каждого вида ("ideas", "post") на чат
+
+    Новая генерация заменяет только генерацию того же вида: выбор идеи,
+    пока остальные идеи еще приходят потоком, не обрывает их генерацию.
+
+    run() и iterate() запускают вызов клиента отдельной задачей; отмена
+    задачи прерывает и HTTP-запрос к OpenRouter. Если генерацию отменили,
+    вызывающий получает GenerationCancelled вместо результата, даже если
+    ответ успел прийти.
+
+    Все методы вызываются внутри event loop клиента (напрямую в async боте
+    или через AsyncRuntime в синхронных версиях).
+    """
+
+    def __init__(self):
+        self._current: Dict[Hashable, Dict[str, _Generation]] = {}
+
+        # Метрики
+        self.started = 0
+        self.completed = 0
+        self.superseded = 0
+        self.cancelled = 0
+
+    async def run(self, chat_id: Hashable, kind: str, coro: Awaitable) -> Any:
+        """Выполнить корутину как текущую генерацию чата"""
+        generation = self._start(chat_id, kind, coro)
+        try:
+            result = await generation.task
+        except asyncio.CancelledError:
+            if generation.cancelled:
+                raise GenerationCancelled(kind) from None
+            raise
+        finally:
+            self._finish(chat_id, generation)
+        if generation.cancelled:
+            raise GenerationCancelled(kind)
+        return result
+
+    async def iterate(self, chat_id: Hashable, kind: str, agen: AsyncIterator) -> AsyncIterator:
+        """Потоковая генерация чата: элементы отмененной генерации не отдаются"""
+        items: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put_nowait(item)
+            finally:
+                items.put_nowait(_END)
+                await agen.aclose()
+
+        generation = self._start(chat_id, kind, pump())
+        try:
+            while True:
+                item = await items.get()
+                if item is _END or generation.cancelled:
+                    break
+                yield item
+            try:
+                await generation.task
+            except asyncio.CancelledError:
+                if generation.cancelled:
+                    raise GenerationCancelled(kind) from None
+                raise
+            if generation.cancelled:
+                raise GenerationCancelled(kind)
+        finally:
+            # Перебор прекратили раньше (или отменили) - поток больше не нужен
+            generation.task.cancel()
+            self._finish(chat_id, generation)
+
+    async def cancel(self, chat_id: Hashable) -> bool:
+        """Отменить все текущие генерации чата; False, если их не было"""
+        current = self._current.pop(chat_id, None)
+        if not current:
+            return False
+        for generation in current.values():
+            self._cancel(generation)
+            self.cancelled += 1
+            logger.info(f"Cancelled {generation.kind} generation for chat {chat_id}")
+        return True
+
+    async def cancel_all(self) -> None:
+        """Отменить все генерации (остановка бота)"""
+        for chat_id in list(self._current):
+            await self.cancel(chat_id)
+
+    def kinds(self, chat_id: Hashable) -> List[str]:
+        """Что сейчас генерируется для чата"""
+        return list(self._current.get(chat_id, {}))
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики генераций"""
+        return {
+            "active": sum(len(current) for current in self._current.values()),
+            "started": self.started,
+            "completed": self.completed,
+            "superseded": self.superseded,
+            "cancelled": self.cancelled,
+        }
+
+    def _start(self, chat_id: Hashable, kind: str, coro: Awaitable) -> _Generation:
+        current = self._current.setdefault(chat_id, {})
+        previous = current.get(kind)
+        if previous is not None:
+            self._cancel(previous)
+            self.superseded += 1
+            logger.info(f"New {kind} generation for chat {chat_id} supersedes the previous one")
+        generation = _Generation(kind, asyncio.ensure_future(coro))
+        current[kind] = generation
+        self.started += 1
+        return generation
+
+    def _finish(self, chat_id: Hashable, generation: _Generation) -> None:
+        current = self._current.get(chat_id)
+        if current is not None and current.get(generation.kind) is generation:
+            del current[generation.kind]
+            if not current:
+                del self._current[chat_id]
+            if not generation.cancelled:
+                self.completed += 1
+
+    @staticmethod
+    def _cancel(generation: _Generation) -> None:
+        generation.cancelled = True
+        generation.task.cancel()
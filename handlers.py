@@ -0,0 +1,602 @@
+"""
+AI-IdeaFactory: Обработчики диалога
+Общая логика бота для всех режимов запуска (polling, webhook, async): обработчики
+написаны как корутины, синхронные версии выполняют их в AsyncRuntime
+"""
+
+import asyncio
+import logging
+
+from telebot import types
+
+from admission import AdmissionRejected
+from config import STREAM_IDEAS, STREAM_POSTS
+from dedup import InFlightGuard
+from dispatcher import Dispatcher
+from generations import ChatGenerations, GenerationCancelled
+from streaming import EditThrottler, telegram_retry_after
+from views import (
+    MAX_IDEAS_SHOWN,
+    NEW_IDEAS_BUTTON,
+    NEW_IDEAS_BUTTON_LABEL,
+    OTHER_IDEA_BUTTON,
+    OTHER_IDEA_BUTTON_LABEL,
+    build_ideas_markup,
+    format_ideas_text,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class UserState:
+    """Класс для хранения состояния пользователя"""
+    WAITING_NICHE = 1
+    WAITING_GOAL = 2
+    WAITING_FORMAT = 3
+    WAITING_IDEA_SELECTION = 4
+
+
+class BotHandlers:
+    """
+    Обработчики сообщений и callback-запросов бота
+
+    bot - объект с async методами Bot API: AsyncTeleBot или синхронный
+    TeleBot в обертке runtime.AsyncBotAdapter. Все обработчики выполняются
+    в event loop клиента; чтение сессий с диска, журнал запросов и каталог
+    уходят в пул потоков, чтобы не блокировать loop.
+    """
+
+    def __init__(
+        self,
+        bot,
+        ai_client,
+        sessions,
+        admission=None,
+        speculator=None,
+        idea_catalog=None,
+        request_log=None
+    ):
+        self.bot = bot
+        self.ai_client = ai_client
+        self.sessions = sessions
+        self.admission = admission
+        self.speculator = speculator
+        self.idea_catalog = idea_catalog
+        self.request_log = request_log
+
+        # Идеи, пост для которых сейчас генерируется (защита от двойных нажатий)
+        self.post_generation_guard = InFlightGuard()
+
+        # Текущие генерации чата: новая отменяет прежнюю того же вида, /cancel - все
+        self.generations = ChatGenerations()
+
+        # Маршрутизация обновлений: один поиск в таблице вместо цепочки фильтров
+        self.dispatcher = Dispatcher(sessions.get_state, prepare=self.load_session)
+        self._register()
+
+    # Сессии
+
+    async def load_session(self, user_id):
+        """Подгрузить сессию с диска в пуле потоков, если ее еще нет в памяти"""
+        if self.sessions.backend is not None and user_id not in self.sessions:
+            await asyncio.to_thread(self.sessions.get_state, user_id)
+
+    async def get_user_state(self, user_id):
+        """Получить состояние пользователя"""
+        await self.load_session(user_id)
+        return self.sessions.get_state(user_id)
+
+    async def set_user_state(self, user_id, state):
+        """Установить состояние пользователя"""
+        await self.load_session(user_id)
+        self.sessions.set_state(user_id, state)
+
+    async def get_user_data(self, user_id):
+        """Получить данные пользователя"""
+        await self.load_session(user_id)
+        return self.sessions.get(user_id)
+
+    # Генерации
+
+    async def cancel_generations(self, user_id):
+        """Отменить текущую генерацию и фоновые генерации постов пользователя"""
+        await self.generations.cancel(user_id)
+        if self.speculator is not None:
+            await self.speculator.cancel(user_id)
+
+    async def cancel_all(self):
+        """Отменить все генерации (остановка бота)"""
+        await self.generations.cancel_all()
+        if self.speculator is not None:
+            await self.speculator.cancel_all()
+
+    def admitted(self, chat_id, call):
+        """Вызов клиента (корутина или поток) через очередь допуска, если она включена"""
+        if self.admission is None:
+            return call
+        if hasattr(call, "__anext__"):
+            return self.admission.iterate(chat_id, call)
+        return self.admission.run(chat_id, call)
+
+    def tracked(self, chat_id, kind, call):
+        """Вызов клиента как текущая генерация чата (отменяемая), через очередь допуска"""
+        call = self.admitted(chat_id, call)
+        if hasattr(call, "__anext__"):
+            return self.generations.iterate(chat_id, kind, call)
+        return self.generations.run(chat_id, kind, call)
+
+    async def stream_ideas_to_message(self, chat_id, message_id, data):
+        """Генерирует идеи потоком и показывает каждую вместе с кнопкой сразу после ее появления"""
+        # Список наполняется по ходу генерации: кнопки показанных идей уже работают
+        ideas = []
+        data.ideas = ideas
+        self.sessions.save(chat_id, data)
+        throttler = EditThrottler()
+        async for idea in self.tracked(chat_id, "ideas", self.ai_client.stream_ideas(
+            niche=data.niche,
+            goal=data.goal,
+            content_format=data.format,
+            refresh=data.refresh
+        )):
+            ideas.append(idea)
+            self.sessions.save(chat_id, data)
+            if len(ideas) > MAX_IDEAS_SHOWN or not throttler.allow():
+                continue
+            try:
+                await self.bot.edit_message_text(
+                    format_ideas_text(ideas, "⏳ <b>Генерирую идеи контента для вас...</b>"),
+                    chat_id,
+                    message_id,
+                    parse_mode='HTML',
+                    reply_markup=build_ideas_markup(ideas)
+                )
+            except Exception as e:
+                retry_after = telegram_retry_after(e)
+                if retry_after is not None:
+                    throttler.backoff(retry_after)
+                logger.debug(f"Stream edit skipped: {e}")
+
+        if not ideas:
+            data.ideas = None
+            self.sessions.save(chat_id, data)
+        return ideas
+
+    async def stream_post_to_message(self, chat_id, message_id, data, idea_title, idea_description):
+        """Генерирует пост потоком, обновляя сообщение о обработке по мере поступления текста"""
+        throttler = EditThrottler()
+        async for delta in self.tracked(chat_id, "post", self.ai_client.stream_post(
+            niche=data.niche,
+            goal=data.goal,
+            content_format=data.format,
+            idea_title=idea_title,
+            idea_description=idea_description
+        )):
+            preview = throttler.feed(delta)
+            if preview is None:
+                continue
+            try:
+                await self.bot.edit_message_text(preview, chat_id, message_id)
+            except Exception as e:
+                retry_after = telegram_retry_after(e)
+                if retry_after is not None:
+                    throttler.backoff(retry_after)
+                logger.debug(f"Stream edit skipped: {e}")
+        return throttler.text or None
+
+    # Сообщения
+
+    async def discard_processing_message(self, chat_id, message_id):
+        """Убрать сообщение о обработке отмененной генерации"""
+        try:
+            await self.bot.delete_message(chat_id, message_id)
+        except Exception:
+            pass
+
+    async def replace_processing_message(self, chat_id, message_id, text, edit_in_place, reply_markup=None):
+        """Показать готовый текст вместо сообщения о обработке"""
+        if edit_in_place:
+            try:
+                await self.bot.edit_message_text(
+                    text, chat_id, message_id, parse_mode='HTML', reply_markup=reply_markup
+                )
+                return
+            except Exception as e:
+                # Слишком длинный текст или некорректная разметка - отправляем новым сообщением
+                logger.warning(f"Failed to edit message in place: {e}")
+
+        # Удаляем сообщение о обработке
+        try:
+            await self.bot.delete_message(chat_id, message_id)
+        except Exception:
+            pass
+
+        await self.bot.send_message(chat_id, text, parse_mode='HTML', reply_markup=reply_markup)
+
+    # Обработчики
+
+    async def handle_start(self, message):
+        """Обработчик команды /start"""
+        user_id = message.chat.id
+        logger.info(f"User {user_id} started the bot")
+
+        welcome_text = (
+            "🎯 <b>Добро пожаловать в AI-IdeaFactory!</b>\n\n"
+            "Я помогу вам придумать крутые идеи для контента используя AI.\n\n"
+            "<b>Как это работает:</b>\n"
+            "1️⃣ Расскажите мне о вашей нише\n"
+            "2️⃣ Определите цель контента\n"
+            "3️⃣ Выберите формат контента\n"
+            "4️⃣ Получите 5 готовых идей\n"
+            "5️⃣ Выберите идею и получите полный пост\n\n"
+            "📌 Давайте начнем! Укажите вашу <b>нишу</b> "
+            "(например: фитнес, образование, бизнес, блоги и т.д.):"
+        )
+
+        await self.set_user_state(user_id, UserState.WAITING_NICHE)
+        await self.bot.send_message(user_id, welcome_text, parse_mode='HTML')
+
+    async def handle_niche(self, message):
+        """Обработчик ввода ниши"""
+        user_id = message.chat.id
+        niche = message.text.strip()
+
+        if not niche or len(niche) < 2:
+            await self.bot.send_message(user_id, "❌ Пожалуйста, укажите корректную нишу (минимум 2 символа)")
+            return
+
+        data = await self.get_user_data(user_id)
+        data.niche = niche
+        self.sessions.save(user_id, data)
+
+        logger.info(f"User {user_id} selected niche: {niche}")
+
+        goal_text = (
+            f"✅ <b>Ниша:</b> {niche}\n\n"
+            "Теперь укажите <b>цель контента</b>\n"
+            "(например: привлечь аудиторию, обучить, продать, развлечь)"
+        )
+
+        await self.set_user_state(user_id, UserState.WAITING_GOAL)
+        await self.bot.send_message(user_id, goal_text, parse_mode='HTML')
+
+    async def handle_goal(self, message):
+        """Обработчик ввода цели"""
+        user_id = message.chat.id
+        goal = message.text.strip()
+
+        if not goal or len(goal) < 2:
+            await self.bot.send_message(user_id, "❌ Пожалуйста, укажите корректную цель (минимум 2 символа)")
+            return
+
+        data = await self.get_user_data(user_id)
+        data.goal = goal
+        self.sessions.save(user_id, data)
+
+        logger.info(f"User {user_id} selected goal: {goal}")
+
+        format_text = (
+            f"✅ <b>Цель:</b> {goal}\n\n"
+            "Теперь выберите <b>формат контента</b>\n"
+            "(например: пост в соцсетях, статья, видео, рилс, карусель)"
+        )
+
+        await self.set_user_state(user_id, UserState.WAITING_FORMAT)
+        await self.bot.send_message(user_id, format_text, parse_mode='HTML')
+
+    async def handle_format(self, message):
+        """Обработчик ввода формата и генерация идей"""
+        user_id = message.chat.id
+        content_format = message.text.strip()
+
+        if not content_format or len(content_format) < 2:
+            await self.bot.send_message(user_id, "❌ Пожалуйста, укажите корректный формат (минимум 2 символа)")
+            return
+
+        data = await self.get_user_data(user_id)
+        data.format = content_format
+        self.sessions.save(user_id, data)
+
+        logger.info(f"User {user_id} selected format: {content_format}")
+
+        if self.request_log is not None:
+            await asyncio.to_thread(self.request_log.record, data.niche, data.goal, content_format)
+
+        # Популярный запрос - готовые идеи из каталога без ожидания генерации
+        # После «Создать новые идеи» - свежая генерация, без каталога и кэша
+        catalog_ideas = None
+        if self.idea_catalog is not None and not data.refresh:
+            catalog_ideas = await asyncio.to_thread(self.idea_catalog.lookup, data.niche, data.goal, content_format)
+
+        # Лимит чата исчерпан - отказываем сразу, не дожидаясь очереди
+        if not catalog_ideas and self.admission is not None:
+            try:
+                self.admission.admit(user_id)
+            except AdmissionRejected as e:
+                await self.bot.send_message(user_id, e.user_message(), parse_mode='HTML')
+                return
+
+        # Показываем сообщение о обработке
+        processing_msg = None
+        if not catalog_ideas:
+            processing_msg = await self.bot.send_message(
+                user_id,
+                "⏳ <b>Генерирую идеи контента для вас...</b>\n"
+                "Это может занять 30-60 секунд ⏱️",
+                parse_mode='HTML'
+            )
+
+        try:
+            # Генерируем идеи
+            if catalog_ideas:
+                ideas = catalog_ideas
+                logger.info(f"Ideas for user {user_id} served from catalog")
+            elif STREAM_IDEAS:
+                ideas = await self.stream_ideas_to_message(user_id, processing_msg.message_id, data)
+            else:
+                ideas = await self.tracked(user_id, "ideas", self.ai_client.generate_ideas(
+                    niche=data.niche,
+                    goal=data.goal,
+                    content_format=content_format,
+                    refresh=data.refresh
+                ))
+
+            if not ideas or not isinstance(ideas, list):
+                await self.bot.send_message(user_id, "❌ Ошибка при генерации идей. Попробуйте позже.")
+                logger.error(f"Failed to generate ideas for user {user_id}")
+                return
+
+            data.ideas = ideas
+            data.refresh = False
+            self.sessions.save(user_id, data)
+            logger.info(f"Generated {len(ideas)} ideas for user {user_id}")
+
+            # Форматируем идеи и кнопки выбора
+            ideas_text = format_ideas_text(ideas, "🎨 <b>Вот 5 идей для вашего контента:</b>")
+            markup = build_ideas_markup(ideas)
+
+            await self.set_user_state(user_id, UserState.WAITING_IDEA_SELECTION)
+            if processing_msg is None:
+                await self.bot.send_message(user_id, ideas_text, parse_mode='HTML', reply_markup=markup)
+            else:
+                await self.replace_processing_message(
+                    user_id, processing_msg.message_id, ideas_text,
+                    edit_in_place=STREAM_IDEAS, reply_markup=markup
+                )
+
+            # Пока пользователь выбирает, заранее генерируем посты для первых идей
+            if self.speculator is not None:
+                await self.speculator.start(user_id, ideas, data.niche, data.goal, data.format)
+
+        except GenerationCancelled:
+            logger.info(f"Ideas generation for user {user_id} cancelled")
+            await self.discard_processing_message(user_id, processing_msg.message_id)
+        except AdmissionRejected as e:
+            logger.warning(f"Ideas for user {user_id} not admitted: {e}")
+            data.ideas = None
+            self.sessions.save(user_id, data)
+            await self.replace_processing_message(
+                user_id, processing_msg.message_id, e.user_message(), edit_in_place=True
+            )
+        except Exception as e:
+            logger.error(f"Error generating ideas: {e}")
+            await self.bot.send_message(user_id, "❌ Ошибка при генерации идей. Попробуйте позже.")
+
+    async def handle_idea_selection(self, call):
+        """Обработчик выбора идеи"""
+        user_id = call.from_user.id
+
+        # Повторные нажатия той же идеи игнорируем, другая идея заменяет текущую генерацию
+        guard_key = (user_id, call.data)
+        if not self.post_generation_guard.try_acquire(guard_key):
+            await self.bot.answer_callback_query(call.id, "⏳ Пост уже генерируется, подождите...")
+            return
+
+        try:
+            idea_index = int(call.data.split('_')[1])
+            data = await self.get_user_data(user_id)
+
+            if not data.ideas or idea_index >= len(data.ideas):
+                await self.bot.answer_callback_query(call.id, "❌ Неверный выбор идеи")
+                return
+
+            await self.bot.answer_callback_query(call.id)
+
+            # Показываем сообщение о обработке
+            processing_msg = await self.bot.send_message(
+                user_id,
+                "⏳ <b>Генерирую пост на основе выбранной идеи...</b>\n"
+                "Это может занять 30-60 секунд ⏱️",
+                parse_mode='HTML'
+            )
+
+            selected_idea = data.ideas[idea_index]
+            idea_title = selected_idea.title
+            idea_description = selected_idea.description
+
+            # Пост мог уже сгенерироваться в фоне, пока пользователь выбирал идею
+            post = None
+            if self.speculator is not None:
+                post = await self.generations.run(user_id, "post", self.speculator.claim(user_id, idea_index))
+
+            # Генерируем пост
+            if not post:
+                if self.admission is not None:
+                    self.admission.admit(user_id)
+                if STREAM_POSTS:
+                    post = await self.stream_post_to_message(
+                        user_id, processing_msg.message_id, data, idea_title, idea_description
+                    )
+                else:
+                    post = await self.tracked(user_id, "post", self.ai_client.generate_post(
+                        niche=data.niche,
+                        goal=data.goal,
+                        content_format=data.format,
+                        idea_title=idea_title,
+                        idea_description=idea_description
+                    ))
+
+            if not post:
+                await self.bot.send_message(user_id, "❌ Ошибка при генерации поста. Попробуйте позже.")
+                logger.error(f"Failed to generate post for user {user_id}")
+                return
+
+            logger.info(f"Generated post for user {user_id}")
+
+            # Отправляем готовый пост
+            post_text = (
+                f"📝 <b>Готовый пост:</b>\n\n"
+                f"{post}\n\n"
+                f"<i>Идея основана на: {idea_title}</i>"
+            )
+
+            await self.replace_processing_message(
+                user_id, processing_msg.message_id, post_text, edit_in_place=STREAM_POSTS
+            )
+
+            # Предлагаем варианты дальнейшего действия с reply кнопками
+            reply_markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+            reply_markup.add(types.KeyboardButton(NEW_IDEAS_BUTTON))
+            reply_markup.add(types.KeyboardButton(OTHER_IDEA_BUTTON))
+
+            await self.bot.send_message(user_id, "Что дальше?", reply_markup=reply_markup)
+
+        except GenerationCancelled:
+            logger.info(f"Post generation for user {user_id} cancelled")
+            await self.discard_processing_message(user_id, processing_msg.message_id)
+        except AdmissionRejected as e:
+            logger.warning(f"Post for user {user_id} not admitted: {e}")
+            await self.replace_processing_message(
+                user_id, processing_msg.message_id, e.user_message(), edit_in_place=True
+            )
+        except Exception as e:
+            logger.error(f"Error selecting idea: {e}")
+            await self.bot.answer_callback_query(call.id, "❌ Произошла ошибка")
+        finally:
+            self.post_generation_guard.release(guard_key)
+
+    async def handle_restart(self, call):
+        """Обработчик перезагрузки"""
+        user_id = call.from_user.id
+        await self.bot.answer_callback_query(call.id)
+
+        # Очищаем данные пользователя
+        await self.cancel_generations(user_id)
+        self.sessions.drop(user_id)
+
+        await self.set_user_state(user_id, UserState.WAITING_NICHE)
+
+        restart_text = (
+            "🎯 <b>Новый раунд генерации идей!</b>\n\n"
+            "Укажите вашу <b>нишу</b>:"
+        )
+
+        await self.bot.send_message(user_id, restart_text, parse_mode='HTML')
+
+    async def handle_select_other(self, call):
+        """Обработчик выбора другой идеи"""
+        user_id = call.from_user.id
+        await self.bot.answer_callback_query(call.id)
+        await self.show_ideas_again(user_id)
+
+    async def handle_create_new_ideas(self, message):
+        """Обработчик reply кнопки 'Создать новые идеи'"""
+        user_id = message.chat.id
+        logger.info(f"User {user_id} pressed 'Создать новые идеи' button")
+
+        # Очищаем данные пользователя; следующие идеи генерируются заново, а не из кэша
+        await self.cancel_generations(user_id)
+        self.sessions.drop(user_id)
+        data = await self.get_user_data(user_id)
+        data.refresh = True
+        self.sessions.save(user_id, data)
+
+        await self.set_user_state(user_id, UserState.WAITING_NICHE)
+
+        restart_text = (
+            "🎯 <b>Новый раунд генерации идей!</b>\n\n"
+            "Укажите вашу <b>нишу</b>:"
+        )
+
+        # Удаляем reply клавиатуру
+        markup = types.ReplyKeyboardRemove()
+        await self.bot.send_message(user_id, restart_text, parse_mode='HTML', reply_markup=markup)
+
+    async def handle_select_another_idea(self, message):
+        """Обработчик reply кнопки 'Выбрать другую идею'"""
+        user_id = message.chat.id
+        logger.info(f"User {user_id} pressed 'Выбрать другую идею' button")
+        await self.show_ideas_again(user_id)
+
+    async def show_ideas_again(self, user_id):
+        """Показать сохраненный список идей для выбора другой"""
+        data = await self.get_user_data(user_id)
+
+        if not data.ideas:
+            await self.bot.send_message(user_id, "❌ Данные сессии потеряны. Начните заново /start")
+            return
+
+        ideas = data.ideas
+
+        # Форматируем идеи и кнопки выбора
+        ideas_text = format_ideas_text(ideas, "🎨 <b>Выберите другую идею:</b>")
+        markup = build_ideas_markup(ideas)
+
+        await self.set_user_state(user_id, UserState.WAITING_IDEA_SELECTION)
+        await self.bot.send_message(user_id, ideas_text, reply_markup=markup, parse_mode='HTML')
+
+    async def handle_help(self, message):
+        """Обработчик команды /help"""
+        user_id = message.chat.id
+
+        help_text = (
+            "<b>📖 Справка по использованию:</b>\n\n"
+            "<b>/start</b> - Начать новую сессию генерации идей\n"
+            "<b>/help</b> - Показать эту справку\n"
+            "<b>/cancel</b> - Отменить текущий диалог\n\n"
+            "<b>🎯 Как работает бот:</b>\n"
+            "1. Укажите нишу контента\n"
+            "2. Определите цель контента\n"
+            "3. Выберите формат контента\n"
+            "4. Получите 5 идей\n"
+            "5. Выберите идею и получите готовый пост\n\n"
+            "<b>💡 Примеры:</b>\n"
+            "• Ниша: фитнес\n"
+            "• Цель: привлечь аудиторию\n"
+            "• Формат: пост в Instagram"
+        )
+
+        await self.bot.send_message(user_id, help_text, parse_mode='HTML')
+
+    async def handle_cancel(self, message):
+        """Обработчик команды /cancel"""
+        user_id = message.chat.id
+
+        await self.cancel_generations(user_id)
+        self.sessions.drop(user_id)
+
+        await self.bot.send_message(user_id, "❌ Диалог отменен. Введите /start для начала.")
+
+    async def handle_default(self, message):
+        """Обработчик неизвестных сообщений"""
+        user_id = message.chat.id
+        state = await self.get_user_state(user_id)
+
+        if state is None:
+            await self.bot.send_message(user_id, "Привет! Введите /start для начала работы с ботом.")
+        else:
+            await self.bot.send_message(user_id, "Я не понял ваше сообщение. Пожалуйста, следуйте инструкциям выше.")
+
+    def _register(self) -> None:
+        dispatcher = self.dispatcher
+        dispatcher.command('start')(self.handle_start)
+        dispatcher.state(UserState.WAITING_NICHE)(self.handle_niche)
+        dispatcher.state(UserState.WAITING_GOAL)(self.handle_goal)
+        dispatcher.state(UserState.WAITING_FORMAT)(self.handle_format)
+        dispatcher.callback_prefix('idea_')(self.handle_idea_selection)
+        dispatcher.callback("restart")(self.handle_restart)
+        dispatcher.callback("select_other")(self.handle_select_other)
+        dispatcher.button(NEW_IDEAS_BUTTON, NEW_IDEAS_BUTTON_LABEL)(self.handle_create_new_ideas)
+        dispatcher.button(OTHER_IDEA_BUTTON, OTHER_IDEA_BUTTON_LABEL)(self.handle_select_another_idea)
+        dispatcher.command('help')(self.handle_help)
+        dispatcher.command('cancel')(self.handle_cancel)
+        dispatcher.default(self.handle_default)
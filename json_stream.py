@@ -0,0 +1,132 @@
+"""
+AI-IdeaFactory: Потоковый разбор JSON-массива идей
+Отдает каждую идею [{"title", "description"}] сразу после закрытия ее объекта
+и сохраняет уже полученные идеи, даже если хвост ответа оборван или испорчен
+"""
+
+import json
+import logging
+from typing import List, Optional
+
+from models import Idea
+
+logger = logging.getLogger(__name__)
+
+
+class IdeaStreamParser:
+    """
+    Инкрементальный разборщик массива объектов из текста ответа модели
+
+    Текст до начала массива (например, ```json) пропускается. Внутри массива
+    отслеживаются вложенность скобок и строки, и каждый объект верхнего
+    уровня разбирается json.loads, как только встречается его "}".
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._array_candidate = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start: Optional[int] = None
+        self.ideas: List[Idea] = []
+        self.skipped = 0
+
+    def feed(self, chunk: str) -> List[Idea]:
+        """
+        Добавить фрагмент текста
+
+        Returns:
+            Идеи, полностью завершившиеся в этом фрагменте
+        """
+        if self._finished or not chunk:
+            return []
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        pos = self._pos
+
+        while pos < len(buffer):
+            char = buffer[pos]
+            if not self._in_array:
+                # Массив идей начинается с "[", за которой (после пробелов) идет "{"
+                if char == "[":
+                    self._array_candidate = True
+                elif self._array_candidate and char == "{":
+                    self._in_array = True
+                    continue
+                elif not char.isspace():
+                    self._array_candidate = False
+                pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    if char == "]":
+                        # Конец массива идей - дальше ничего не разбираем
+                        self._finished = True
+                        pos += 1
+                        break
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._object_start is not None:
+                        idea = self._parse_object(buffer[self._object_start:pos + 1])
+                        if idea is not None:
+                            completed.append(idea)
+                        self._object_start = None
+            pos += 1
+
+        # Держим в буфере только незавершенный объект
+        cut = self._object_start if self._object_start is not None else pos
+        self._buffer = buffer[cut:]
+        self._pos = pos - cut
+        if self._object_start is not None:
+            self._object_start = 0
+
+        self.ideas.extend(completed)
+        return completed
+
+    @property
+    def finished(self) -> bool:
+        """Встречена закрывающая скобка массива"""
+        return self._finished
+
+    def _parse_object(self, text: str) -> Optional[Idea]:
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.skipped += 1
+            logger.warning(f"Skipping malformed idea object: {e}")
+            return None
+        idea = normalize_idea(obj)
+        if idea is None:
+            self.skipped += 1
+        return idea
+
+
+def normalize_idea(obj) -> Optional[Idea]:
+    """Проверить объект по схеме идеи и вернуть Idea или None"""
+    return Idea.from_obj(obj)
+
+
+def parse_ideas(content: str) -> List[Idea]:
+    """Разобрать весь ответ модели, сохранив все корректные идеи"""
+    parser = IdeaStreamParser()
+    parser.feed(content)
+    return parser.ideas
@@ -0,0 +1,141 @@
+"""
+AI-IdeaFactory: Компактные записи сессии и идеи
+Классы со __slots__ вместо словарей: без __dict__ на каждый объект, а
+повторяющиеся строки (ниша, цель, формат) интернируются и хранятся в одном экземпляре
+"""
+
+import sys
+from typing import Any, Dict, List, Optional
+
+# Ограничения схемы идеи
+IDEA_TITLE_MAX_LENGTH = 200
+IDEA_DESCRIPTION_MAX_LENGTH = 1000
+
+
+def intern_text(value: Optional[str]) -> Optional[str]:
+    """Интернировать строку, чтобы одинаковые значения у разных сессий не дублировались"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Idea:
+    """Идея контента: название и описание"""
+
+    __slots__ = ("title", "description")
+
+    def __init__(self, title: str, description: str = ""):
+        self.title = title
+        self.description = description
+
+    @classmethod
+    def from_obj(cls, obj: Any) -> Optional["Idea"]:
+        """
+        Проверить объект из ответа модели (или из кэша) по схеме идеи
+
+        Returns:
+            Idea или None, если объект не подходит: не словарь, нет непустого
+            строкового title или title длиннее IDEA_TITLE_MAX_LENGTH
+        """
+        if isinstance(obj, cls):
+            return obj
+        if not isinstance(obj, dict):
+            return None
+        title = obj.get("title")
+        if not isinstance(title, str):
+            return None
+        title = title.strip()
+        if not title or len(title) > IDEA_TITLE_MAX_LENGTH:
+            return None
+        description = obj.get("description")
+        if not isinstance(description, str):
+            description = ""
+        description = description.strip()
+        if len(description) > IDEA_DESCRIPTION_MAX_LENGTH:
+            description = description[:IDEA_DESCRIPTION_MAX_LENGTH - 1].rstrip() + "…"
+        return cls(title, description)
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"title": self.title, "description": self.description}
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Idea):
+            return NotImplemented
+        return self.title == other.title and self.description == other.description
+
+    def __repr__(self) -> str:
+        return f"Idea(title={self.title!r})"
+
+
+class Session:
+    """
+    Состояние диалога одного пользователя
+
+    refresh - пользователь попросил новые идеи: следующий набор генерируется
+    заново, мимо кэша и каталога
+    """
+
+    __slots__ = ("state", "_niche", "_goal", "_format", "ideas", "refresh")
+
+    def __init__(
+        self,
+        state: Optional[int] = None,
+        niche: Optional[str] = None,
+        goal: Optional[str] = None,
+        content_format: Optional[str] = None,
+        ideas: Optional[List[Idea]] = None,
+        refresh: bool = False
+    ):
+        self.state = state
+        self.niche = niche
+        self.goal = goal
+        self.format = content_format
+        self.ideas = ideas
+        self.refresh = refresh
+
+    @property
+    def niche(self) -> Optional[str]:
+        return self._niche
+
+    @niche.setter
+    def niche(self, value: Optional[str]) -> None:
+        self._niche = intern_text(value)
+
+    @property
+    def goal(self) -> Optional[str]:
+        return self._goal
+
+    @goal.setter
+    def goal(self, value: Optional[str]) -> None:
+        self._goal = intern_text(value)
+
+    @property
+    def format(self) -> Optional[str]:
+        return self._format
+
+    @format.setter
+    def format(self, value: Optional[str]) -> None:
+        self._format = intern_text(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Представление для JSON (постоянное хранилище сессий)"""
+        return {
+            "state": self.state,
+            "niche": self.niche,
+            "goal": self.goal,
+            "format": self.format,
+            "ideas": [idea.to_dict() for idea in self.ideas] if self.ideas is not None else None,
+            "refresh": self.refresh,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Session":
+        ideas = data.get("ideas")
+        if ideas is not None:
+            ideas = [idea for idea in map(Idea.from_obj, ideas) if idea is not None]
+        return cls(
+            state=data.get("state"),
+            niche=data.get("niche"),
+            goal=data.get("goal"),
+            content_format=data.get("format"),
+            ideas=ideas,
+            refresh=bool(data.get("refresh", False))
+        )
@@ -0,0 +1,346 @@
+"""
+AI-IdeaFactory: Нормализация ввода и поиск похожих запросов
+Приводит niche/goal/format к канонической форме (регистр, пунктуация,
+пробелы, синонимы) и находит ближайшую уже известную строку по сходству
+триграмм символов через MinHash/LSH, чтобы "Фитнес", "фитнес " и "фитнесс"
+попадали в одну запись кэша и каталога
+"""
+
+import json
+import logging
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import (
+    SIMILARITY_THRESHOLD,
+    SIMILARITY_INDEX_CAPACITY,
+    SYNONYMS_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+# Все, кроме букв и цифр, - разделитель
+_SEPARATORS = re.compile(r"[\W_]+")
+
+# Служебные слова не влияют на смысл запроса
+STOPWORDS = frozenset(("в", "во", "на", "для", "и", "по", "про", "с", "со", "о", "об", "к", "у", "the", "for", "in"))
+
+# Встроенные синонимы: каноническая форма -> варианты написания
+DEFAULT_SYNONYMS: Dict[str, List[str]] = {
+    "instagram": ["инста", "инсту", "инсте", "инстаграм", "инстаграмм", "инстаграме", "insta", "ig"],
+    "telegram": ["тг", "телега", "телеграм", "телеграмм", "телеграме", "tg"],
+    "vk": ["вк", "вконтакте", "в контакте"],
+    "youtube": ["ютуб", "ютюб", "ютубе", "yt"],
+    "tiktok": ["тикток", "тик ток", "тиктоке", "tik tok"],
+    "reels": ["рилс", "рилсы", "рилз", "reel"],
+    "stories": ["сторис", "стори", "story"],
+    "соцсети": ["соц сети", "соцсетях", "соц сетях", "социальные сети", "социальных сетях", "smm"],
+    "пост": ["посты", "поста", "постов", "post"],
+    "статья": ["статьи", "статью", "статей", "лонгрид", "article"],
+    "видео": ["видос", "ролик", "ролики", "video"],
+    "фитнес": ["фитнес и спорт", "спорт и фитнес", "фитнесс", "fitness"],
+    "продажи": ["продать", "продавать", "продажа", "увеличить продажи", "sales"],
+    "привлечь аудиторию": ["привлечение аудитории", "привлечь подписчиков", "набрать подписчиков"],
+    "обучение": ["обучить", "научить", "обучать"],
+    "развлечение": ["развлечь", "развлекать"],
+}
+
+
+def load_synonyms(path: str = SYNONYMS_PATH) -> Dict[str, List[str]]:
+    """Встроенные синонимы, дополненные файлом path (если задан)"""
+    synonyms = {canonical: list(variants) for canonical, variants in DEFAULT_SYNONYMS.items()}
+    if not path:
+        return synonyms
+    try:
+        with open(path, encoding="utf-8") as f:
+            extra = json.load(f)
+        for canonical, variants in extra.items():
+            synonyms.setdefault(canonical, []).extend(variants)
+    except (OSError, ValueError, AttributeError) as e:
+        logger.error(f"Failed to load synonyms from {path}: {e}")
+    return synonyms
+
+
+class Normalizer:
+    """
+    Каноническая форма строки ввода
+
+    casefold, ё -> е, пунктуация и лишние пробелы -> один пробел, замена
+    синонимов (фразы до нескольких слов, сначала самые длинные), затем
+    удаление служебных слов.
+    """
+
+    def __init__(self, synonyms: Optional[Dict[str, List[str]]] = None, stopwords: Iterable[str] = STOPWORDS):
+        if synonyms is None:
+            synonyms = load_synonyms()
+        self.stopwords = frozenset(stopwords)
+        self._phrases: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        for canonical, variants in synonyms.items():
+            target = tuple(self._tokenize(canonical))
+            for variant in variants:
+                phrase = tuple(self._tokenize(variant))
+                if phrase:
+                    self._phrases[phrase] = target
+        self._max_phrase = max((len(phrase) for phrase in self._phrases), default=1)
+
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        return _SEPARATORS.sub(" ", str(text).casefold().replace("ё", "е")).split()
+
+    def normalize(self, text: str) -> str:
+        tokens = self._tokenize(text)
+        result = []
+        i = 0
+        while i < len(tokens):
+            for length in range(min(self._max_phrase, len(tokens) - i), 0, -1):
+                target = self._phrases.get(tuple(tokens[i:i + length]))
+                if target is not None:
+                    result.extend(target)
+                    i += length
+                    break
+            else:
+                result.append(tokens[i])
+                i += 1
+        meaningful = [token for token in result if token not in self.stopwords]
+        # Строка только из служебных слов остается как есть
+        return " ".join(meaningful or result)
+
+
+_default_normalizer: Optional[Normalizer] = None
+
+
+def normalize_text(text: str) -> str:
+    """Каноническая форма строки с синонимами по умолчанию (SYNONYMS_PATH)"""
+    global _default_normalizer
+    if _default_normalizer is None:
+        _default_normalizer = Normalizer()
+    return _default_normalizer.normalize(text)
+
+
+def shingles(text: str) -> Set[str]:
+    """Триграммы символов строки с границами слов"""
+    padded = f" {text} "
+    if len(padded) <= 3:
+        return {padded}
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+_MASK64 = (1 << 64) - 1
+
+
+class SimilarityIndex:
+    """
+    Индекс строк для поиска ближайшей по сходству триграмм (Jaccard)
+
+    Для строки считается MinHash-подпись из bands * rows значений за один
+    проход по триграммам (one permutation hashing); подпись режется на
+    bands полос, строки с совпавшей полосой - кандидаты (LSH). Из каждой
+    корзины берутся не больше max_bucket_scan последних строк, точным
+    Jaccard проверяются max_candidates кандидатов, совпавших в наибольшем
+    числе полос, поэтому время поиска не зависит от размера индекса.
+    Сверх capacity вытесняются самые старые строки.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        capacity: int = SIMILARITY_INDEX_CAPACITY,
+        bands: int = 12,
+        rows: int = 3,
+        max_bucket_scan: int = 32,
+        max_candidates: int = 12
+    ):
+        self.threshold = threshold
+        self.capacity = max(1, capacity)
+        self.bands = bands
+        self.rows = rows
+        self.max_bucket_scan = max_bucket_scan
+        self.max_candidates = max_candidates
+        self._texts: Dict[int, str] = {}
+        self._ids: Dict[str, int] = {}
+        # Ключ полосы -> id строки или список id (экономит память на одиночных)
+        self._buckets: Dict[int, Any] = {}
+        self._next_id = 0
+        self._oldest = 0
+
+        # Метрики
+        self.lookups = 0
+        self.exact = 0
+        self.fuzzy = 0
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, text: str) -> bool:
+        return text in self._ids
+
+    def add(self, text: str) -> None:
+        """Добавить строку (повторное добавление ничего не меняет)"""
+        if text in self._ids:
+            return
+        if len(self._texts) >= self.capacity:
+            self._evict_oldest()
+        entry_id = self._next_id
+        self._next_id += 1
+        self._texts[entry_id] = text
+        self._ids[text] = entry_id
+        buckets = self._buckets
+        for key in self._band_keys(text):
+            current = buckets.get(key)
+            if current is None:
+                buckets[key] = entry_id
+            elif isinstance(current, list):
+                current.append(entry_id)
+            else:
+                buckets[key] = [current, entry_id]
+
+    def nearest(self, text: str) -> Optional[Tuple[str, float]]:
+        """Ближайшая строка индекса со сходством не ниже threshold и само сходство"""
+        self.lookups += 1
+        if text in self._ids:
+            self.exact += 1
+            return text, 1.0
+        # Число совпавших полос у кандидата - грубая оценка сходства
+        candidates: Counter = Counter()
+        for key in self._band_keys(text):
+            current = self._buckets.get(key)
+            if current is None:
+                continue
+            if isinstance(current, list):
+                candidates.update(current[-self.max_bucket_scan:])
+            else:
+                candidates[current] += 1
+        if not candidates:
+            return None
+        query = shingles(text)
+        best, best_score = None, self.threshold
+        for entry_id, _ in candidates.most_common(self.max_candidates):
+            candidate = self._texts[entry_id]
+            score = jaccard(query, shingles(candidate))
+            if score >= best_score:
+                best, best_score = candidate, score
+        if best is None:
+            return None
+        self.fuzzy += 1
+        return best, best_score
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._texts),
+            "lookups": self.lookups,
+            "exact": self.exact,
+            "fuzzy": self.fuzzy,
+        }
+
+    def _signature(self, text: str) -> List[int]:
+        size = self.bands * self.rows
+        bins: List[Optional[int]] = [None] * size
+        for shingle in shingles(text):
+            value = hash(shingle) & _MASK64
+            position, value = value % size, value // size
+            current = bins[position]
+            if current is None or value < current:
+                bins[position] = value
+        if None not in bins:
+            return bins
+        # Пустая ячейка берет значение ближайшей заполненной справа (по кругу)
+        signature = list(bins)
+        following = None
+        for position in range(2 * size - 1, -1, -1):
+            value = bins[position % size]
+            if value is not None:
+                following = (position, value)
+            elif position < size:
+                signature[position] = following[1] + ((following[0] - position) << 58)
+        return signature
+
+    def _band_keys(self, text: str) -> List[int]:
+        signature = self._signature(text)
+        rows = self.rows
+        return [hash((band, *signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def _evict_oldest(self) -> None:
+        while self._oldest < self._next_id and self._oldest not in self._texts:
+            self._oldest += 1
+        entry_id = self._oldest
+        text = self._texts.pop(entry_id)
+        del self._ids[text]
+        for key in self._band_keys(text):
+            current = self._buckets.get(key)
+            if isinstance(current, list):
+                current.remove(entry_id)
+                if len(current) == 1:
+                    self._buckets[key] = current[0]
+            elif current == entry_id:
+                del self._buckets[key]
+
+
+class InputMatcher:
+    """
+    Перенаправление niche/goal/format на уже известный ключ кэша или каталога
+
+    Ключ - нормализованные значения полей (normalize_text), он не зависит
+    от порядка запросов. В индексы попадают только ключи, для которых есть
+    ответ (add()); redirect() заменяет каждое поле ближайшим значением своего
+    индекса (отдельный индекс на поле, чтобы разные цели при одинаковой нише
+    не склеивались) и возвращает комбинацию, только если она сама известна.
+    """
+
+    FIELDS = ("niche", "goal", "format")
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        capacity: int = SIMILARITY_INDEX_CAPACITY
+    ):
+        self.capacity = max(1, capacity)
+        self.indexes = {field: SimilarityIndex(threshold, capacity) for field in self.FIELDS}
+        # Известные комбинации в порядке последнего добавления
+        self._keys: "OrderedDict[Tuple[str, str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.redirects = 0
+
+    def __contains__(self, key: Tuple[str, str, str]) -> bool:
+        return key in self._keys
+
+    def add(self, key: Tuple[str, str, str]) -> None:
+        """Запомнить ключ, для которого есть ответ"""
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return
+            self._keys[key] = None
+            if len(self._keys) > self.capacity:
+                self._keys.popitem(last=False)
+            for field, value in zip(self.FIELDS, key):
+                self.indexes[field].add(value)
+
+    def redirect(self, key: Tuple[str, str, str]) -> Optional[Tuple[str, str, str]]:
+        """Известная комбинация, похожая на key по каждому полю, или None"""
+        with self._lock:
+            result = []
+            for field, value in zip(self.FIELDS, key):
+                match = self.indexes[field].nearest(value)
+                if match is None:
+                    return None
+                result.append(match[0])
+            similar = tuple(result)
+            if similar == key or similar not in self._keys:
+                return None
+            self.redirects += 1
+            return similar
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result: Dict[str, Any] = {field: index.stats() for field, index in self.indexes.items()}
+            result["keys"] = len(self._keys)
+            result["redirects"] = self.redirects
+            return result
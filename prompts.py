@@ -1,50 +1,85 @@
 """
 AI-IdeaFactory: System prompts and templates
 Centralized location for all AI model prompts and instructions
-"""
-
-SYSTEM_PROMPT = """Ты - AI-система для генерации контента, состоящая из 4 агентов. ДЕЙСТВУЙ ПОШАГОВО:
 
-1. АНАЛИЗАТОР - анализирует задачу:
-   - Определяет нишу, цель, формат
-   - Выявляет ключевые требования к контенту
-   - Формулирует критерии успеха
+Prompts are kept per task (ideas, posts) in a registry. Every request starts
+with the same byte-for-byte prefix (SHARED_PREFIX), followed by the static task
+instructions, and only then the user's variable inputs, so the upstream
+provider's prompt cache can reuse the longest possible prefix.
+"""
 
-2. ГЕНЕРАТОР - создает 10 идей в формате:
-   [{"title": "Название", "description": "Описание"}]
+from typing import Dict, List
 
-3. КРИТИК - проверяет и улучшает:
-   - Соответствие цели и аудитории
-   - Уникальность и вовлекаемость
-   - Практическую ценность
-   - Выбирает 5 лучших идей
+# Общая для всех задач часть системного промпта - не меняется между запросами
+SHARED_PREFIX = """Ты - AI-система для генерации контента для соцсетей и блогов.
+ПИШИ КОНКРЕТНО, БЕЗ "ВОДЫ". Учитывай нишу, цель и формат контента."""
 
-4. ПОСТГЕНЕРАТОР - создает готовый пост:
-   - Заголовок + хук
-   - Структурированный текст
-   - Эмодзи и CTA
-   - Оптимизация под платформу
+IDEAS_SYSTEM_PROMPT = SHARED_PREFIX + """
 
-ПИШИ КОНКРЕТНО, БЕЗ "ВОДЫ". Используй markdown для структуры."""
+ЗАДАЧА: идеи контента. ДЕЙСТВУЙ ПОШАГОВО (про себя):
+1. Проанализируй нишу, цель, формат и критерии успеха.
+2. Придумай 10 идей.
+3. Оцени их: соответствие цели и аудитории, уникальность, вовлекаемость,
+   практическая ценность - и оставь лучшие.
+Выводи только итоговый JSON без пояснений."""
 
-IDEAS_GENERATION_PROMPT = """{context}
+POST_SYSTEM_PROMPT = SHARED_PREFIX + """
 
-НИША: {niche}
-ЦЕЛЬ: {goal} 
-ФОРМАТ: {content_format}
+ЗАДАЧА: готовый пост по выбранной идее:
+- Заголовок + хук
+- Структурированный текст
+- Эмодзи и CTA
+- Оптимизация под платформу
+Используй markdown для структуры."""
 
-Сгенерируй 3-5 идей. Ответ только JSON:
+# Шаблоны пользовательского сообщения: постоянные инструкции - в начале,
+# переменные значения - в конце
+IDEAS_GENERATION_PROMPT = """Сгенерируй 3-5 идей. Ответ только JSON:
 [{{"title": "...", "description": "..."}}]
-"""
 
-POST_GENERATION_PROMPT = """{context}
-
-ИДЕЯ: {idea_title}
-ОПИСАНИЕ: {idea_description}
+НИША: {niche}
+ЦЕЛЬ: {goal}
+ФОРМАТ: {content_format}"""
 
-Создай готовый пост (макс. 300 слов) с:
+POST_GENERATION_PROMPT = """Создай готовый пост (макс. 300 слов) с:
 - Привлекающим заголовком
 - Структурой (абзацы, списки)
 - Эмодзи
 - Четким CTA
-"""
+
+НИША: {niche}
+ЦЕЛЬ: {goal}
+ФОРМАТ: {content_format}
+ИДЕЯ: {idea_title}
+ОПИСАНИЕ: {idea_description}"""
+
+
+class PromptSpec:
+    """Системный промпт и шаблон пользовательского сообщения одной задачи"""
+
+    __slots__ = ("system", "template")
+
+    def __init__(self, system: str, template: str):
+        self.system = system
+        self.template = template
+
+    @property
+    def fingerprint(self) -> str:
+        """Текст, от которого зависит ответ (для ключей кэша)"""
+        return self.system + self.template
+
+    def messages(self, **inputs: str) -> List[Dict[str, str]]:
+        """Сообщения чата: system, затем user с подставленными значениями"""
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.template.format(**inputs)},
+        ]
+
+
+PROMPTS: Dict[str, PromptSpec] = {
+    "ideas": PromptSpec(IDEAS_SYSTEM_PROMPT, IDEAS_GENERATION_PROMPT),
+    "posts": PromptSpec(POST_SYSTEM_PROMPT, POST_GENERATION_PROMPT),
+}
+
+# Дозапрос ответа, обрезанного по max_tokens (finish_reason == "length")
+CONTINUE_PROMPT = """Ответ оборвался. Продолжи ровно с места остановки, без повторов и пояснений."""
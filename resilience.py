@@ -0,0 +1,353 @@
+"""
+AI-IdeaFactory: Устойчивость запросов к OpenRouter
+Повторы временных ошибок (429, 5xx, таймауты) с экспоненциальной задержкой,
+full jitter, учетом Retry-After и общим дедлайном на запрос пользователя,
+circuit breaker, который быстро отказывает, пока OpenRouter недоступен,
+и hedging - дублирующий запрос, если первый завис дольше обычного
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config import (
+    BREAKER_WINDOW,
+    BREAKER_MIN_REQUESTS,
+    BREAKER_ERROR_RATE,
+    BREAKER_SLOW_CALL,
+    BREAKER_SLOW_RATE,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_HALF_OPEN_PROBES,
+    HEDGE_PERCENTILE,
+    HEDGE_MAX_FRACTION,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_DEADLINE,
+)
+
+# Ошибки транспорта, после которых запрос имеет смысл повторить
+RETRYABLE_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+class CircuitOpenError(httpx.RequestError):
+    """Запрос не отправлен: circuit breaker открыт"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Значение заголовка Retry-After (секунды или HTTP-дата) в секундах"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Политика повторов и ее метрики
+
+    Задержка перед попыткой n (с 1) выбирается случайно в [0, min(max_delay,
+    base_delay * 2^(n-1))] (full jitter), а если сервер прислал Retry-After -
+    равна ему. Повтора нет, если попытки кончились или ожидание не укладывается
+    в оставшееся до дедлайна время.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        deadline: float = RETRY_DEADLINE
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+        # Метрики
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.recovered = 0
+        self.gave_up = 0
+        self.retry_wait_seconds = 0.0
+        self.failed_attempt_seconds = 0.0
+
+    @staticmethod
+    def retryable_status(status_code: int) -> bool:
+        """429 и 5xx - временные ошибки"""
+        return status_code == 429 or status_code >= 500
+
+    def next_delay(
+        self,
+        attempt: int,
+        remaining: float,
+        retry_after: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Задержка перед следующей попыткой
+
+        Args:
+            attempt: Номер неудавшейся попытки (с 1)
+            remaining: Сколько секунд осталось до дедлайна
+            retry_after: Значение Retry-After от сервера
+
+        Returns:
+            Секунды ожидания или None, если повторять не нужно
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if delay >= remaining:
+            return None
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попыток и времени, потраченного на повторы"""
+        return {
+            "requests": self.requests,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "recovered": self.recovered,
+            "gave_up": self.gave_up,
+            "retry_wait_seconds": round(self.retry_wait_seconds, 3),
+            "failed_attempt_seconds": round(self.failed_attempt_seconds, 3),
+        }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для вызовов OpenRouter
+
+    closed - запросы проходят, исходы копятся в скользящем окне window секунд.
+    Если в окне не меньше min_requests вызовов и доля ошибок (5xx, ошибки
+    соединения) или медленных ответов (дольше slow_call секунд) превышает порог,
+    breaker переходит в open: запросы сразу отклоняются. Через open_seconds -
+    half_open: пропускается до half_open_probes пробных запросов; успех
+    пробы закрывает breaker, ошибка снова открывает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window: float = BREAKER_WINDOW,
+        min_requests: int = BREAKER_MIN_REQUESTS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_call: float = BREAKER_SLOW_CALL,
+        slow_rate: float = BREAKER_SLOW_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES
+    ):
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._calls: deque = deque()
+        self._failures = 0
+        self._slow = 0
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def allow(self) -> bool:
+        """
+        Можно ли отправить запрос
+
+        В half_open занимает слот пробного запроса: после allow() == True
+        нужно вызвать record() или release().
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool, latency: float) -> None:
+        """Учесть исход вызова: success=False для 5xx и ошибок соединения"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if success and latency <= self.slow_call:
+                    self._close()
+                else:
+                    self._open(now)
+                return
+            if state == self.OPEN:
+                return
+
+            failed = not success
+            slow = latency > self.slow_call
+            self._calls.append((now, failed, slow))
+            self._failures += failed
+            self._slow += slow
+            self._trim(now)
+            total = len(self._calls)
+            if total >= self.min_requests and (
+                self._failures / total >= self.error_rate or self._slow / total >= self.slow_rate
+            ):
+                self._open(now)
+
+    def release(self) -> None:
+        """Освободить слот пробного запроса без исхода (запрос отменен)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние и частоты ошибок в текущем окне"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            self._trim(now)
+            total = len(self._calls)
+            return {
+                "state": state,
+                "window_calls": total,
+                "error_rate": round(self._failures / total, 3) if total else 0.0,
+                "slow_rate": round(self._slow / total, 3) if total else 0.0,
+                "retry_in": round(max(0.0, self._opened_at + self.open_seconds - now), 1)
+                if state == self.OPEN else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+    def _current_state(self, now: float) -> str:
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def _open(self, now: float) -> None:
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probes = 0
+        self.opened += 1
+        self._reset_window()
+
+    def _close(self) -> None:
+        self._state = self.CLOSED
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self._calls.clear()
+        self._failures = 0
+        self._slow = 0
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+
+class HedgePolicy:
+    """
+    Когда отправлять дублирующий (hedged) запрос
+
+    Порог - перцентиль percentile недавних успешных задержек (не меньше
+    min_delay); пока наблюдений меньше min_samples, hedging не включается.
+    Доля дублируемых запросов ограничена max_fraction: каждый запрос
+    добавляет max_fraction кредита, дубль расходует один. Кредит начинается
+    с нуля, поэтому доля не превышается и на первых запросах.
+    """
+
+    def __init__(
+        self,
+        percentile: float = HEDGE_PERCENTILE,
+        max_fraction: float = HEDGE_MAX_FRACTION,
+        min_delay: float = HEDGE_MIN_DELAY,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        window: int = 200
+    ):
+        self.percentile = percentile
+        self.max_fraction = max_fraction
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies: deque = deque(maxlen=window)
+        self._threshold: Optional[float] = None
+        self._credit = 0.0
+
+        # Метрики
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def threshold(self) -> Optional[float]:
+        """Сколько ждать первый ответ перед дублем (None - hedging пока не включен)"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        if self._threshold is None:
+            ordered = sorted(self._latencies)
+            index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+            self._threshold = max(self.min_delay, ordered[index])
+        return self._threshold
+
+    def start(self) -> None:
+        """Учесть новый запрос и пополнить бюджет дублей"""
+        self.requests += 1
+        self._credit = min(self._credit + self.max_fraction, max(1.0, 10 * self.max_fraction))
+
+    def try_hedge(self) -> bool:
+        """Израсходовать кредит на дубль, если он есть"""
+        if self._credit < 1.0:
+            self.budget_denied += 1
+            return False
+        self._credit -= 1.0
+        self.hedged += 1
+        return True
+
+    def observe(self, latency: float) -> None:
+        """Учесть задержку успешного запроса (от его начала, включая ожидание дубля)"""
+        self._latencies.append(latency)
+        self._threshold = None
+
+    def stats(self) -> Dict[str, Any]:
+        threshold = self.threshold()
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "budget_denied": self.budget_denied,
+            "hedged_fraction": round(self.hedged / self.requests, 3) if self.requests else 0.0,
+            "threshold_seconds": round(threshold, 3) if threshold is not None else None,
+        }
@@ -0,0 +1,221 @@
+"""
+AI-IdeaFactory: Выбор модели для запроса
+Для каждой задачи (идеи, посты) ведет EWMA задержки, доли ошибок и стоимости
+кандидатов и выбирает модель с наименьшим p95 в пределах потолка стоимости,
+изредка исследуя альтернативы
+"""
+
+import logging
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from config import (
+    MODEL,
+    MODEL_CANDIDATES_IDEAS,
+    MODEL_CANDIDATES_POSTS,
+    MODEL_PRICES,
+    ROUTER_COST_CEILING_IDEAS,
+    ROUTER_COST_CEILING_POSTS,
+    ROUTER_EXPLORE_RATE,
+    ROUTER_EWMA_ALPHA,
+    ROUTER_MIN_SAMPLES,
+    ROUTER_MAX_ERROR_RATE,
+)
+
+logger = logging.getLogger(__name__)
+
+TASK_IDEAS = "ideas"
+TASK_POSTS = "posts"
+
+# Сколько последних задержек хранить для p95
+_LATENCY_WINDOW = 200
+
+
+def parse_model_list(value: str) -> List[str]:
+    """"a/b, c/d" -> ["a/b", "c/d"]"""
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+def parse_model_prices(value: str) -> Dict[str, tuple]:
+    """
+    "model=0.15/0.60,..." -> {"model": (0.15, 0.60)}
+
+    Цены в долларах за 1M входных / выходных токенов.
+    """
+    prices = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        model, price = item.split("=", 1)
+        prompt_price, _, completion_price = price.partition("/")
+        try:
+            prices[model.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+        except ValueError:
+            logger.warning(f"Invalid model price ignored: {item!r}")
+    return prices
+
+
+class ModelStats:
+    """Скользящие показатели одной модели на одной задаче"""
+
+    __slots__ = ("latency", "error_rate", "cost", "samples", "chosen", "explored", "_latencies", "_p95")
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.cost: Optional[float] = None
+        self.samples = 0
+        self.chosen = 0
+        self.explored = 0
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self._p95: Optional[float] = None
+
+    @property
+    def p95(self) -> Optional[float]:
+        if self._p95 is None and self._latencies:
+            ordered = sorted(self._latencies)
+            self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return self._p95
+
+    def update(self, alpha: float, latency: float, success: bool, cost: Optional[float]) -> None:
+        self.samples += 1
+        self.error_rate += alpha * ((0.0 if success else 1.0) - self.error_rate)
+        if success:
+            # Задержки ошибок (мгновенный 5xx) не делают модель "быстрой"
+            self.latency = latency if self.latency is None else self.latency + alpha * (latency - self.latency)
+            self._latencies.append(latency)
+            self._p95 = None
+        if cost is not None:
+            self.cost = cost if self.cost is None else self.cost + alpha * (cost - self.cost)
+
+    def to_dict(self) -> Dict[str, Any]:
+        p95 = self.p95
+        return {
+            "chosen": self.chosen,
+            "explored": self.explored,
+            "samples": self.samples,
+            "ewma_latency": round(self.latency, 3) if self.latency is not None else None,
+            "p95_latency": round(p95, 3) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "ewma_cost_usd": round(self.cost, 6) if self.cost is not None else None,
+        }
+
+
+class ModelRouter:
+    """
+    Маршрутизатор моделей по задачам
+
+    Политика choose(): пока у кандидата меньше min_samples наблюдений, он
+    выбирается в первую очередь (прогрев). Затем с вероятностью explore_rate
+    берется случайный кандидат, иначе - модель с наименьшим p95 задержки среди
+    тех, чья EWMA стоимость вызова не выше потолка задачи и доля ошибок ниже
+    max_error_rate. Если под ограничения не подходит никто - самая дешевая,
+    а если у задачи нет кандидатов - основная модель MODEL.
+    """
+
+    def __init__(
+        self,
+        candidates: Optional[Dict[str, List[str]]] = None,
+        prices: Optional[Dict[str, tuple]] = None,
+        cost_ceilings: Optional[Dict[str, float]] = None,
+        explore_rate: float = ROUTER_EXPLORE_RATE,
+        alpha: float = ROUTER_EWMA_ALPHA,
+        min_samples: int = ROUTER_MIN_SAMPLES,
+        max_error_rate: float = ROUTER_MAX_ERROR_RATE
+    ):
+        if candidates is None:
+            candidates = {
+                TASK_IDEAS: parse_model_list(MODEL_CANDIDATES_IDEAS),
+                TASK_POSTS: parse_model_list(MODEL_CANDIDATES_POSTS),
+            }
+        self.candidates = candidates
+        self.prices = prices if prices is not None else parse_model_prices(MODEL_PRICES)
+        self.cost_ceilings = cost_ceilings if cost_ceilings is not None else {
+            TASK_IDEAS: ROUTER_COST_CEILING_IDEAS,
+            TASK_POSTS: ROUTER_COST_CEILING_POSTS,
+        }
+        self.explore_rate = explore_rate
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self._stats: Dict[str, Dict[str, ModelStats]] = {
+            task: {model: ModelStats() for model in models}
+            for task, models in candidates.items()
+        }
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def choose(self, task: str) -> str:
+        """Выбрать модель для очередного запроса задачи"""
+        with self._lock:
+            stats = self._stats.get(task)
+            if not stats:
+                logger.warning(f"No candidate models for {task}, using {MODEL}")
+                return MODEL
+            models = list(stats)
+            if len(models) == 1:
+                stats[models[0]].chosen += 1
+                return models[0]
+
+            warming = [model for model in models if stats[model].samples < self.min_samples]
+            if warming:
+                model = min(warming, key=lambda m: stats[m].chosen)
+            elif self._random.random() < self.explore_rate:
+                model = self._random.choice(models)
+                stats[model].explored += 1
+            else:
+                model = self._best(task, stats)
+            stats[model].chosen += 1
+        logger.debug(f"Router picked {model} for {task}")
+        return model
+
+    def record(
+        self,
+        task: str,
+        model: str,
+        latency: float,
+        success: bool,
+        usage: Optional[Dict] = None
+    ) -> None:
+        """Учесть исход вызова: задержку, успех и токены из usage"""
+        with self._lock:
+            stats = self._stats.get(task, {}).get(model)
+            if stats is None:
+                return
+            stats.update(self.alpha, latency, success, self.call_cost(model, usage))
+
+    def call_cost(self, model: str, usage: Optional[Dict]) -> Optional[float]:
+        """Стоимость вызова в долларах: поле usage.cost или цены из MODEL_PRICES"""
+        if not usage:
+            return None
+        if isinstance(usage.get("cost"), (int, float)):
+            return float(usage["cost"])
+        price = self.prices.get(model)
+        if price is None:
+            return None
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def stats(self) -> Dict[str, Any]:
+        """Показатели и число выборов каждой модели по задачам"""
+        with self._lock:
+            return {
+                task: {model: model_stats.to_dict() for model, model_stats in stats.items()}
+                for task, stats in self._stats.items()
+            }
+
+    def _best(self, task: str, stats: Dict[str, ModelStats]) -> str:
+        if not stats:
+            return MODEL
+        ceiling = self.cost_ceilings.get(task) or 0.0
+        eligible = [
+            model for model, model_stats in stats.items()
+            if model_stats.error_rate < self.max_error_rate
+            and (not ceiling or model_stats.cost is None or model_stats.cost <= ceiling)
+        ]
+        if not eligible:
+            return min(stats, key=lambda m: (stats[m].cost if stats[m].cost is not None else float("inf")))
+        return min(eligible, key=lambda m: stats[m].p95 if stats[m].p95 is not None else float("inf"))
@@ -0,0 +1,166 @@
+"""
+AI-IdeaFactory: Фоновый async runtime для синхронных обработчиков
+Один постоянный event loop в отдельном потоке, в который telebot-обработчики
+передают корутины и ждут результат через concurrent.futures.Future
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """
+    Постоянный event loop в фоновом потоке
+
+    Пулы соединений, кэши и семафоры, созданные внутри loop, живут между
+    запросами, а генерации разных пользователей выполняются на нем параллельно.
+    """
+
+    def __init__(self, name: str = "ai-runtime"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop runtime (запускается при первом обращении)"""
+        self.start()
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Запустить фоновый поток с event loop (идемпотентно)"""
+        with self._lock:
+            if self.running:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=run_loop, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            logger.info(f"Async runtime '{self.name}' запущен")
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Передать корутину в loop и вернуть concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        Выполнить корутину в runtime и дождаться результата
+
+        Args:
+            coro: Корутина для выполнения
+            timeout: Максимальное время ожидания в секундах
+
+        Returns:
+            Результат корутины (исключения пробрасываются вызывающему)
+        """
+        if self._loop is not None and self._is_loop_thread():
+            raise RuntimeError("AsyncRuntime.run() нельзя вызывать из потока самого loop")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator, timeout: Optional[float] = None) -> Iterator:
+        """
+        Перебрать асинхронный генератор из синхронного кода
+
+        Генератор выполняется в runtime, элементы передаются через очередь.
+        Если вызывающий прекратит перебор раньше, генератор будет отменен.
+
+        Args:
+            agen: Асинхронный генератор
+            timeout: Максимальное ожидание очередного элемента в секундах
+        """
+        items: "queue.Queue" = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(("item", item))
+            except BaseException as e:
+                items.put(("error", e))
+                raise
+            items.put(("done", None))
+
+        future = self.submit(pump())
+        try:
+            while True:
+                kind, item = items.get(timeout=timeout)
+                if kind == "item":
+                    yield item
+                elif kind == "error":
+                    raise item
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Отменить незавершенные задачи, остановить loop и дождаться потока"""
+        with self._lock:
+            if not self.running:
+                return
+            loop, thread = self._loop, self._thread
+
+            async def shutdown():
+                tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await loop.shutdown_asyncgens()
+
+            try:
+                asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout)
+            except Exception as e:
+                logger.warning(f"Ошибка при остановке async runtime: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            loop.close()
+            self._loop = None
+            self._thread = None
+            logger.info(f"Async runtime '{self.name}' остановлен")
+
+    def _is_loop_thread(self) -> bool:
+        return self._thread is threading.current_thread()
+
+
+class AsyncBotAdapter:
+    """
+    Async-интерфейс синхронного TeleBot для общих обработчиков (handlers.py)
+
+    Каждый метод Bot API становится корутиной, а сам HTTP-вызов выполняется
+    в пуле потоков loop, не блокируя остальные генерации.
+    """
+
+    def __init__(self, bot):
+        self._bot = bot
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable]:
+        method = getattr(self._bot, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        call.__name__ = name
+        return call
@@ -0,0 +1,410 @@
+"""
+AI-IdeaFactory: Хранилище пользовательских сессий
+Ограниченное по размеру (LRU) и по времени простоя хранилище состояния диалога
+с фоновой очисткой, метриками и подключаемым постоянным хранилищем (SQLite)
+"""
+
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from models import Session
+
+from config import (
+    SESSION_BACKEND,
+    SESSION_CAPACITY,
+    SESSION_DB_PATH,
+    SESSION_FLUSH_INTERVAL,
+    SESSION_IDLE_TTL,
+    SESSION_SWEEP_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Сколько сессий измерять для оценки занимаемой памяти
+_MEMORY_SAMPLE_SIZE = 100
+
+
+def _deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Приблизительный размер объекта вместе с вложенными контейнерами"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    else:
+        for cls in type(obj).__mro__:
+            for slot in getattr(cls, "__slots__", ()):
+                size += _deep_sizeof(getattr(obj, slot, None), seen)
+    return size
+
+
+class SessionBackend:
+    """Постоянное хранилище сессий (интерфейс)"""
+
+    def load(self, user_id: Hashable) -> Optional[Dict]:
+        """Загрузить сессию или вернуть None"""
+        raise NotImplementedError
+
+    def save_many(self, sessions: Dict[Hashable, str]) -> None:
+        """Сохранить пачку сессий (значения - сериализованный JSON)"""
+        raise NotImplementedError
+
+    def delete_many(self, user_ids: Iterable[Hashable]) -> None:
+        """Удалить пачку сессий"""
+        raise NotImplementedError
+
+    def delete_idle(self, older_than: float) -> int:
+        """Удалить сессии, не обновлявшиеся с момента older_than (unix time)"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Освободить ресурсы"""
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Сессии в SQLite (WAL): переживают перезапуски и падения бота"""
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+        self._db.commit()
+
+    def load(self, user_id: Hashable) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM sessions WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save_many(self, sessions: Dict[Hashable, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)",
+                [(str(user_id), data, now) for user_id, data in sessions.items()]
+            )
+            self._db.commit()
+
+    def delete_many(self, user_ids: Iterable[Hashable]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM sessions WHERE user_id = ?",
+                [(str(user_id),) for user_id in user_ids]
+            )
+            self._db.commit()
+
+    def delete_idle(self, older_than: float) -> int:
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (older_than,)
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class SessionStore:
+    """
+    Сессии пользователей: запись Session с данными диалога на каждый чат
+
+    Порядок OrderedDict совпадает с порядком последнего обращения, поэтому
+    при превышении capacity вытесняется самая давняя сессия, а очистка по
+    idle_ttl просматривает только начало словаря.
+
+    С backend сессия подгружается с диска при первом обращении к ней, а
+    изменения копятся в памяти и записываются пачками фоновым потоком
+    (write-behind), поэтому чтение в обработчиках не ходит на диск.
+    Изменивший сессию вызывающий сообщает об этом через save(): запись,
+    полученная get() до сброса, после него уже не считается измененной.
+    """
+
+    def __init__(
+        self,
+        capacity: int = SESSION_CAPACITY,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        sweep_interval: float = SESSION_SWEEP_INTERVAL,
+        backend: Optional[SessionBackend] = None,
+        flush_interval: float = SESSION_FLUSH_INTERVAL
+    ):
+        self.capacity = capacity
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._sessions: "OrderedDict[Hashable, Session]" = OrderedDict()
+        self._last_access: Dict[Hashable, float] = {}
+        # Пользователи, которых точно нет в backend (чтобы не искать их повторно)
+        self._absent: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._dirty: set = set()
+        self._deleted: set = set()
+        # Вытесненные из памяти сессии, еще не записанные в backend
+        self._pending_evicted: Dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+        # Метрики
+        self.created = 0
+        self.loaded = 0
+        self.evicted = 0
+        self.expired = 0
+        self.flushes = 0
+        self.flushed_sessions = 0
+
+    def get(self, user_id: Hashable) -> Session:
+        """Данные сессии пользователя (создаются при первом обращении)"""
+        data = self._lookup(user_id)
+        with self._lock:
+            if data is None:
+                data = self._touch(user_id)
+            if data is None:
+                data = self._insert(user_id, Session())
+                self._absent.pop(user_id, None)
+                self.created += 1
+            # Вызывающий может изменить сессию - сохраняем при следующем сбросе
+            self._mark_dirty(user_id)
+            return data
+
+    def save(self, user_id: Hashable, data: Optional[Session] = None) -> None:
+        """
+        Отметить сессию измененной: она будет записана при следующем сбросе
+
+        data - измененная запись на случай, если ее уже вытеснили из памяти
+        """
+        with self._lock:
+            if user_id in self._sessions:
+                self._mark_dirty(user_id)
+            elif data is not None and self.backend is not None and user_id not in self._deleted:
+                self._pending_evicted[user_id] = json.dumps(data.to_dict(), ensure_ascii=False)
+
+    def get_state(self, user_id: Hashable) -> Optional[int]:
+        """Состояние диалога или None, если сессии нет"""
+        data = self._lookup(user_id)
+        return data.state if data is not None else None
+
+    def set_state(self, user_id: Hashable, state: int) -> None:
+        """Установить состояние диалога"""
+        self.get(user_id).state = state
+
+    def drop(self, user_id: Hashable) -> None:
+        """Удалить сессию пользователя целиком"""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+            self._last_access.pop(user_id, None)
+            if self.backend is not None:
+                self._dirty.discard(user_id)
+                self._pending_evicted.pop(user_id, None)
+                self._deleted.add(user_id)
+                self._remember_absent(user_id)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Удалить сессии, простаивающие дольше idle_ttl; возвращает их число"""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        with self._lock:
+            while self._sessions:
+                user_id = next(iter(self._sessions))
+                if now - self._last_access[user_id] <= self.idle_ttl:
+                    break
+                data = self._sessions.pop(user_id)
+                del self._last_access[user_id]
+                self._stash_unsaved(user_id, data)
+                removed += 1
+            self.expired += removed
+        if self.backend is not None:
+            # Несохраненные изменения истекших сессий пишем до очистки диска
+            self.flush()
+            # На диске удаляем по времени последнего сохранения
+            removed_on_disk = self.backend.delete_idle(time.time() - self.idle_ttl)
+            if removed_on_disk:
+                logger.info(f"Removed {removed_on_disk} idle sessions from storage")
+        if removed:
+            logger.info(f"Expired {removed} idle sessions")
+        return removed
+
+    def flush(self) -> int:
+        """Записать измененные и удаленные сессии в backend одной пачкой"""
+        if self.backend is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                deleted, self._deleted = self._deleted, set()
+                snapshot, self._pending_evicted = self._pending_evicted, {}
+                snapshot.update(
+                    (user_id, json.dumps(self._sessions[user_id].to_dict(), ensure_ascii=False))
+                    for user_id in dirty if user_id in self._sessions
+                )
+            try:
+                if deleted:
+                    self.backend.delete_many(deleted)
+                if snapshot:
+                    self.backend.save_many(snapshot)
+            except Exception as e:
+                logger.error(f"Session flush failed: {e}")
+                with self._lock:
+                    # Повторим при следующем сбросе
+                    for user_id, data in snapshot.items():
+                        if user_id in self._sessions:
+                            self._dirty.add(user_id)
+                        else:
+                            self._pending_evicted.setdefault(user_id, data)
+                    self._deleted |= deleted
+                return 0
+            self.flushes += 1
+            self.flushed_sessions += len(snapshot)
+            return len(snapshot) + len(deleted)
+
+    def start(self) -> None:
+        """Запустить фоновый поток очистки и записи сессий"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._background_loop, name="session-store", daemon=True)
+        self._worker.start()
+
+    def close(self) -> None:
+        """Остановить фоновый поток, сохранить изменения и закрыть backend"""
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+        if self.backend is not None:
+            self.flush()
+            self.backend.close()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: Hashable) -> bool:
+        return user_id in self._sessions
+
+    def stats(self) -> Dict[str, Any]:
+        """Число живых сессий, вытеснений и оценка занимаемой памяти"""
+        with self._lock:
+            live = len(self._sessions)
+            sample = [data for _, data in zip(range(_MEMORY_SAMPLE_SIZE), reversed(self._sessions.values()))]
+            # Общий seen: интернированные строки учитываются один раз
+            seen: set = set()
+            per_session = sum(_deep_sizeof(data, seen) for data in sample) / len(sample) if sample else 0
+            return {
+                "live": live,
+                "capacity": self.capacity,
+                "created": self.created,
+                "loaded": self.loaded,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "approx_bytes": int(per_session * live),
+                "pending_writes": len(self._dirty) + len(self._deleted) + len(self._pending_evicted),
+                "flushes": self.flushes,
+                "flushed_sessions": self.flushed_sessions,
+            }
+
+    def _lookup(self, user_id: Hashable) -> Optional[Session]:
+        """Найти сессию в памяти, при первом обращении - в backend"""
+        with self._lock:
+            data = self._touch(user_id)
+            if data is not None or self.backend is None or user_id in self._absent:
+                return data
+            if user_id in self._deleted:
+                return None
+            pending = self._pending_evicted.pop(user_id, None)
+            if pending is not None:
+                # Вытесненная сессия еще не записана на диск - возвращаем ее в память
+                self._dirty.add(user_id)
+                return self._insert(user_id, Session.from_dict(json.loads(pending)))
+
+        loaded = self.backend.load(user_id)
+
+        with self._lock:
+            # Пока читали диск, сессию мог создать другой поток
+            data = self._touch(user_id)
+            if data is not None:
+                return data
+            if loaded is None:
+                self._remember_absent(user_id)
+                return None
+            self.loaded += 1
+            return self._insert(user_id, Session.from_dict(loaded))
+
+    def _insert(self, user_id: Hashable, data: Session) -> Session:
+        self._sessions[user_id] = data
+        self._last_access[user_id] = time.monotonic()
+        self._evict_overflow()
+        return data
+
+    def _touch(self, user_id: Hashable) -> Optional[Session]:
+        data = self._sessions.get(user_id)
+        if data is not None:
+            self._sessions.move_to_end(user_id)
+            self._last_access[user_id] = time.monotonic()
+        return data
+
+    def _mark_dirty(self, user_id: Hashable) -> None:
+        if self.backend is not None:
+            self._deleted.discard(user_id)
+            self._dirty.add(user_id)
+
+    def _remember_absent(self, user_id: Hashable) -> None:
+        self._absent[user_id] = None
+        self._absent.move_to_end(user_id)
+        while len(self._absent) > self.capacity:
+            self._absent.popitem(last=False)
+
+    def _evict_overflow(self) -> None:
+        while len(self._sessions) > self.capacity:
+            user_id, data = self._sessions.popitem(last=False)
+            del self._last_access[user_id]
+            self._stash_unsaved(user_id, data)
+            self.evicted += 1
+
+    def _stash_unsaved(self, user_id: Hashable, data: Session) -> None:
+        if user_id in self._dirty:
+            # Несохраненные изменения удаленной из памяти сессии пишем при следующем сбросе
+            self._dirty.discard(user_id)
+            self._pending_evicted[user_id] = json.dumps(data.to_dict(), ensure_ascii=False)
+
+    def _background_loop(self) -> None:
+        interval = min(self.sweep_interval, self.flush_interval) if self.backend is not None else self.sweep_interval
+        next_sweep = time.monotonic() + self.sweep_interval
+        while not self._stop.wait(interval):
+            try:
+                if self.backend is not None:
+                    self.flush()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.sweep_interval
+                    self.sweep()
+            except Exception as e:
+                logger.error(f"Session maintenance failed: {e}")
+
+
+def create_session_store() -> SessionStore:
+    """Создать хранилище сессий согласно SESSION_BACKEND (memory или sqlite)"""
+    if SESSION_BACKEND == "sqlite":
+        logger.info(f"Sessions are persisted to SQLite: {SESSION_DB_PATH}")
+        return SessionStore(backend=SQLiteSessionBackend(SESSION_DB_PATH))
+    return SessionStore()
@@ -0,0 +1,227 @@
+"""
+AI-IdeaFactory: Спекулятивная генерация постов
+Пока пользователь читает идеи, посты для первых top-k из них уже генерируются
+в фоне; выбор идеи забирает готовый (или почти готовый) результат
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Set
+
+from ai_client import usage_scope
+from config import (
+    SPECULATIVE_TOP_K,
+    SPECULATIVE_TOKEN_BUDGET,
+    SPECULATIVE_BUDGET_WINDOW,
+    SPECULATIVE_POST_TOKENS,
+)
+from models import Idea
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBudget:
+    """Скользящее окно расхода токенов: не больше limit токенов за window секунд"""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._spent: deque = deque()
+        self._total = 0
+
+    def try_spend(self, tokens: int, now: Optional[float] = None) -> Optional[list]:
+        """
+        Зарезервировать токены, если они укладываются в бюджет окна
+
+        Returns:
+            Резерв (передается в settle()) или None, если бюджета не хватает
+        """
+        now = time.monotonic() if now is None else now
+        while self._spent and now - self._spent[0][0] > self.window:
+            self._total -= self._spent.popleft()[1]
+        if self._total + tokens > self.limit:
+            return None
+        reservation = [now, tokens]
+        self._spent.append(reservation)
+        self._total += tokens
+        return reservation
+
+    def settle(self, reservation: list, tokens: int) -> None:
+        """Заменить зарезервированное число токенов фактическим расходом"""
+        if self._spent and reservation[0] >= self._spent[0][0]:
+            # Резерв еще в окне
+            self._total += tokens - reservation[1]
+        reservation[1] = tokens
+
+    @property
+    def spent(self) -> int:
+        return self._total
+
+
+class SpeculativePosts:
+    """
+    Фоновые генерации постов для идей, показанных пользователю
+
+    С admission генерации идут через общий лимит с низшим приоритетом
+    (корзину чата не тратят). Если к выбору идеи ее генерация еще ждет
+    слота, она отменяется и пост генерируется обычным запросом пользователя.
+
+    Все методы вызываются внутри event loop клиента (напрямую в async боте
+    или через AsyncRuntime в синхронных версиях).
+    """
+
+    def __init__(
+        self,
+        client,
+        admission=None,
+        top_k: int = SPECULATIVE_TOP_K,
+        token_budget: int = SPECULATIVE_TOKEN_BUDGET,
+        budget_window: float = SPECULATIVE_BUDGET_WINDOW,
+        post_tokens: int = SPECULATIVE_POST_TOKENS
+    ):
+        self.client = client
+        self.admission = admission
+        self.top_k = top_k
+        self.post_tokens = post_tokens
+        self.budget = TokenBudget(token_budget, budget_window)
+        self._jobs: Dict[Any, Dict[int, asyncio.Task]] = {}
+        # Генерации, еще ждущие слота в admission
+        self._queued: Set[asyncio.Task] = set()
+
+        # Метрики
+        self.started = 0
+        self.used = 0
+        self.cancelled = 0
+        self.over_budget = 0
+
+    async def start(
+        self,
+        chat_id: Any,
+        ideas: List[Idea],
+        niche: str,
+        goal: str,
+        content_format: str
+    ) -> int:
+        """
+        Запустить генерацию постов для первых top_k идей чата
+
+        Returns:
+            Сколько фоновых генераций запущено
+        """
+        await self.cancel(chat_id)
+        jobs = {}
+        for idx, idea in enumerate(ideas[:self.top_k]):
+            reservation = self.budget.try_spend(self.post_tokens)
+            if reservation is None:
+                self.over_budget += 1
+                logger.info(f"Speculative budget exhausted, skipping idea {idx} for chat {chat_id}")
+                break
+            task = asyncio.ensure_future(self._generate(chat_id, reservation, niche, goal, content_format, idea))
+            if self.admission is not None:
+                self._queued.add(task)
+                task.add_done_callback(self._queued.discard)
+            jobs[idx] = task
+        if jobs:
+            self._jobs[chat_id] = jobs
+            self.started += len(jobs)
+            logger.info(f"Started {len(jobs)} speculative posts for chat {chat_id}")
+        return len(jobs)
+
+    async def claim(self, chat_id: Any, idea_index: int) -> Optional[str]:
+        """
+        Забрать результат для выбранной идеи и отменить остальные генерации чата
+
+        Returns:
+            Готовый пост или None, если спекулятивной генерации не было
+            (или она завершилась ошибкой) - тогда нужно генерировать как обычно
+        """
+        jobs = self._jobs.pop(chat_id, {})
+        task = jobs.pop(idea_index, None)
+        self._cancel_tasks(jobs.values())
+        if task is None:
+            return None
+        if task in self._queued:
+            # Генерация не началась - обычный запрос пользователя получит слот раньше
+            self._cancel_tasks([task])
+            return None
+        try:
+            post = await task
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return None
+            raise
+        if post:
+            self.used += 1
+        return post
+
+    async def cancel(self, chat_id: Any) -> None:
+        """Отменить фоновые генерации чата (/cancel, новые идеи)"""
+        self._cancel_tasks(self._jobs.pop(chat_id, {}).values())
+
+    async def cancel_all(self) -> None:
+        """Отменить все фоновые генерации (остановка бота)"""
+        for chat_id in list(self._jobs):
+            await self.cancel(chat_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики спекулятивной генерации"""
+        return {
+            "active_chats": len(self._jobs),
+            "started": self.started,
+            "used": self.used,
+            "cancelled": self.cancelled,
+            "over_budget": self.over_budget,
+            "budget_tokens_spent": self.budget.spent,
+            "budget_tokens_limit": self.budget.limit,
+        }
+
+    async def _generate(
+        self,
+        chat_id: Any,
+        reservation: list,
+        niche: str,
+        goal: str,
+        content_format: str,
+        idea: Idea
+    ) -> Optional[str]:
+        """Фоновая генерация поста с низшим приоритетом в admission"""
+        call = self._generate_post(reservation, niche, goal, content_format, idea)
+        if self.admission is None:
+            return await call
+        try:
+            return await self.admission.run(chat_id, call, background=True)
+        except asyncio.CancelledError:
+            if asyncio.current_task() in self._queued:
+                # Отменена до получения слота - токены не тратились
+                self.budget.settle(reservation, 0)
+            raise
+
+    async def _generate_post(
+        self,
+        reservation: list,
+        niche: str,
+        goal: str,
+        content_format: str,
+        idea: Idea
+    ) -> Optional[str]:
+        """Генерация поста; резерв бюджета заменяется фактическими completion_tokens"""
+        self._queued.discard(asyncio.current_task())
+        with usage_scope() as usage:
+            post = await self.client.generate_post(
+                niche=niche,
+                goal=goal,
+                content_format=content_format,
+                idea_title=idea.title,
+                idea_description=idea.description
+            )
+        # Отмененная генерация сюда не доходит: ее резерв остается (часть токенов могла быть потрачена)
+        self.budget.settle(reservation, usage["completion_tokens"])
+        return post
+
+    def _cancel_tasks(self, tasks) -> None:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
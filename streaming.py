@@ -0,0 +1,85 @@
+"""
+AI-IdeaFactory: Потоковый вывод генерации в Telegram
+Склеивает фрагменты ответа модели и решает, когда редактировать сообщение,
+чтобы не превышать лимиты Telegram на частоту edit_message_text
+"""
+
+import time
+from typing import Any, Optional
+
+from config import STREAM_EDIT_INTERVAL
+
+# Лимит длины текста сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Курсор в конце промежуточного текста: показывает, что генерация продолжается
+STREAM_CURSOR = " ▌"
+
+
+class EditThrottler:
+    """
+    Накопитель текста с ограничением частоты обновлений сообщения
+
+    feed() принимает очередной фрагмент и возвращает текст для edit_message_text,
+    только если с прошлого обновления прошло не меньше interval секунд.
+    Первый фрагмент показывается сразу.
+    """
+
+    def __init__(self, interval: float = STREAM_EDIT_INTERVAL, limit: int = TELEGRAM_MESSAGE_LIMIT):
+        self.interval = interval
+        self.limit = limit
+        self._parts = []
+        self._length = 0
+        self._shown_length = 0
+        self._last_edit = None
+        self.edits = 0
+
+    @property
+    def text(self) -> str:
+        """Весь накопленный текст"""
+        return "".join(self._parts)
+
+    def feed(self, delta: str, now: Optional[float] = None) -> Optional[str]:
+        """
+        Добавить фрагмент
+
+        Returns:
+            Текст промежуточного сообщения или None, если обновлять рано
+        """
+        if delta:
+            self._parts.append(delta)
+            self._length += len(delta)
+        if self._length == self._shown_length or not self.allow(now):
+            return None
+        self._shown_length = self._length
+        return self.preview()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """Можно ли обновить сообщение сейчас; при True момент обновления запоминается"""
+        now = time.monotonic() if now is None else now
+        if self._last_edit is not None and now - self._last_edit < self.interval:
+            return False
+        self._last_edit = now
+        self.edits += 1
+        return True
+
+    def backoff(self, seconds: float, now: Optional[float] = None) -> None:
+        """Отложить следующее обновление (например, после 429 от Telegram)"""
+        now = time.monotonic() if now is None else now
+        self._last_edit = now + max(0.0, seconds) - self.interval
+
+    def preview(self) -> str:
+        """Промежуточный текст с курсором, обрезанный до лимита Telegram"""
+        text = self.text
+        max_length = self.limit - len(STREAM_CURSOR) - 1
+        if len(text) > max_length:
+            text = text[:max_length] + "…"
+        return text + STREAM_CURSOR
+
+
+def telegram_retry_after(error: Any) -> Optional[float]:
+    """Вернуть retry_after из ошибки Telegram 429 (Too Many Requests) или None"""
+    if getattr(error, "error_code", None) != 429:
+        return None
+    result = getattr(error, "result_json", None) or {}
+    return float((result.get("parameters") or {}).get("retry_after", 1))
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from admission import REASON_BUSY, REASON_CHAT_LIMIT, AdmissionController, AdmissionRejected
+
+
+def _controller(**overrides):
+    options = dict(
+        max_concurrent=4,
+        chat_concurrency=1,
+        chat_per_minute=0,
+        chat_burst=5,
+        global_per_second=0,
+        global_burst=1,
+        max_wait=5.0,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def test_admit_rejects_after_chat_burst():
+    admission = _controller(chat_per_minute=6, chat_burst=2)
+    admission.admit(1)
+    admission.admit(1)
+    with pytest.raises(AdmissionRejected) as info:
+        admission.admit(1)
+    assert info.value.reason == REASON_CHAT_LIMIT
+    assert info.value.retry_after > 0
+    # Корзина другого чата не тронута
+    admission.admit(2)
+
+
+def test_chat_concurrency_queues_second_request():
+    async def main():
+        admission = _controller(chat_concurrency=1)
+        await admission.acquire(1)
+        second = asyncio.ensure_future(admission.acquire(1))
+        await asyncio.sleep(0)
+        assert not second.done()
+        admission.release(1)
+        await asyncio.wait_for(second, 1)
+        admission.release(1)
+        return admission.stats()
+
+    stats = asyncio.run(main())
+    assert stats["running"] == 0
+    assert stats["queued"] == 1
+
+
+def test_queue_serves_chats_round_robin():
+    async def main():
+        admission = _controller(max_concurrent=1, chat_concurrency=2)
+        await admission.acquire("busy")
+        order = []
+
+        async def request(chat_id):
+            await admission.acquire(chat_id)
+            order.append(chat_id)
+
+        async def next_admitted(count):
+            while len(order) < count:
+                await asyncio.sleep(0)
+            return order[-1]
+
+        tasks = [asyncio.ensure_future(request(chat_id)) for chat_id in ("a", "a", "b")]
+        await asyncio.sleep(0)
+        admission.release("busy")
+        for count in range(1, 4):
+            admission.release(await asyncio.wait_for(next_admitted(count), 1))
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["a", "b", "a"]
+
+
+def test_waiting_too_long_is_rejected_and_refunded():
+    async def main():
+        admission = _controller(max_concurrent=1, chat_per_minute=6, chat_burst=1, max_wait=0.05)
+        await admission.acquire(1)
+        admission.admit(2)
+        with pytest.raises(AdmissionRejected) as info:
+            await admission.acquire(2)
+        # Токен чата вернулся - можно повторить сразу
+        admission.admit(2)
+        return info.value.reason
+
+    assert asyncio.run(main()) == REASON_BUSY
+
+
+def test_background_runs_while_chat_waits_at_its_limit():
+    async def main():
+        admission = _controller(max_concurrent=4, chat_concurrency=1)
+        await admission.acquire(1)
+        waiting = asyncio.ensure_future(admission.acquire(1))
+        await asyncio.sleep(0)
+        background = asyncio.ensure_future(admission.acquire(None, background=True))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        assert background.done()
+        waiting.cancel()
+        return admission.stats()
+
+    stats = asyncio.run(main())
+    assert stats["background_running"] == 1
+    assert stats["background_admitted"] == 1
+
+
+def test_background_leaves_last_slot_to_users():
+    async def main():
+        admission = _controller(max_concurrent=2)
+        await admission.acquire(None, background=True)
+        second = asyncio.ensure_future(admission.acquire(None, background=True))
+        await asyncio.sleep(0)
+        assert not second.done()
+        # Последний слот получает пользователь
+        await asyncio.wait_for(admission.acquire(1), 1)
+        second.cancel()
+        return admission.stats()
+
+    stats = asyncio.run(main())
+    assert stats["running"] == 2
+    assert stats["background_running"] == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+from ai_client import OpenRouterClient
+from cache import ResponseCache
+from models import Idea
+from normalize import InputMatcher
+
+IDEAS = [Idea("A", "a"), Idea("B", "b")]
+
+
+def _client(tmp_path, ideas=None, matcher=None):
+    client = OpenRouterClient(
+        api_key="test",
+        cache=ResponseCache(path=str(tmp_path / "cache.sqlite3")),
+        matcher=matcher if matcher is not None else InputMatcher()
+    )
+    client.requests = 0
+
+    async def request_ideas(*args):
+        client.requests += 1
+        return list(ideas) if ideas else None
+
+    async def stream_completion(payload, task):
+        client.requests += 1
+        yield '[{"title": "Fresh", "description": "fresh"}]'
+
+    client._request_ideas = request_ideas
+    client._stream_with_continuation = stream_completion
+    return client
+
+
+def test_unavailable_api_counts_one_miss(tmp_path):
+    client = _client(tmp_path)
+    # Промах по точному ключу, потом устаревшая запись для деградированного режима
+    assert asyncio.run(client.generate_ideas("кофе", "продать", "пост")) is None
+    assert client.cache.stats()["misses"] == 1
+
+
+def test_similar_request_lookup_counts_one_miss(tmp_path):
+    matcher = InputMatcher()
+    client = _client(tmp_path, ideas=IDEAS, matcher=matcher)
+    # Похожий запрос известен, но его ответа в кэше уже нет
+    matcher.add(client._key_inputs("фотография", "продать", "пост"))
+    asyncio.run(client.generate_ideas("фотографи", "продать", "пост"))
+    assert client.cache.stats()["misses"] == 1
+
+
+def test_refresh_skips_cached_ideas(tmp_path):
+    client = _client(tmp_path, ideas=IDEAS)
+
+    async def main():
+        await client.generate_ideas("кофе", "продать", "пост")
+        cached = await client.generate_ideas("кофе", "продать", "пост")
+        fresh = [idea async for idea in client.stream_ideas("кофе", "продать", "пост", refresh=True)]
+        # Свежий ответ заменил прежний в кэше
+        replaced = [idea async for idea in client.stream_ideas("кофе", "продать", "пост")]
+        return cached, fresh, replaced
+
+    cached, fresh, replaced = asyncio.run(main())
+    assert cached == IDEAS
+    assert [idea.title for idea in fresh] == ["Fresh"]
+    assert replaced == fresh
+    assert client.requests == 2
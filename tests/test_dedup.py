@@ -0,0 +1,46 @@
+import time
+
+from dedup import InFlightGuard, RecentIds
+
+
+def test_repeated_id_is_a_duplicate():
+    recent = RecentIds(capacity=10, ttl=60)
+    assert not recent.seen(1)
+    assert recent.seen(1)
+    assert not recent.seen(2)
+    assert recent.duplicates == 1
+
+
+def test_forgotten_id_is_processed_again():
+    recent = RecentIds(capacity=10, ttl=60)
+    recent.seen(1)
+    recent.forget(1)
+    assert not recent.seen(1)
+
+
+def test_oldest_id_is_evicted_when_full():
+    recent = RecentIds(capacity=2, ttl=60)
+    for item_id in (1, 2, 3):
+        recent.seen(item_id)
+    assert len(recent) == 2
+    assert not recent.seen(1)
+
+
+def test_id_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    recent = RecentIds(capacity=10, ttl=60)
+    recent.seen(1)
+    now[0] += 61
+    assert not recent.seen(1)
+
+
+def test_guard_allows_one_operation_per_key():
+    guard = InFlightGuard()
+    assert guard.try_acquire(7)
+    assert not guard.try_acquire(7)
+    assert guard.try_acquire(8)
+    guard.release(7)
+    assert guard.try_acquire(7)
+    assert guard.rejected == 1
+    assert len(guard) == 2
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from generations import ChatGenerations, GenerationCancelled
+
+
+async def _wait_forever():
+    await asyncio.Event().wait()
+
+
+async def _stream(items, gate=None):
+    for item in items:
+        if gate is not None:
+            await gate.wait()
+        yield item
+
+
+def test_run_returns_result():
+    async def main():
+        generations = ChatGenerations()
+        result = await generations.run(1, "post", asyncio.sleep(0, result="post"))
+        return result, generations.stats()
+
+    result, stats = asyncio.run(main())
+    assert result == "post"
+    assert stats["completed"] == 1
+    assert stats["active"] == 0
+
+
+def test_same_kind_supersedes_previous():
+    async def main():
+        generations = ChatGenerations()
+        first = asyncio.ensure_future(generations.run(1, "post", _wait_forever()))
+        await asyncio.sleep(0)
+        second = await generations.run(1, "post", asyncio.sleep(0, result="second"))
+        with pytest.raises(GenerationCancelled):
+            await first
+        return second, generations.stats()
+
+    second, stats = asyncio.run(main())
+    assert second == "second"
+    assert stats["superseded"] == 1
+
+
+def test_post_does_not_cancel_ideas_stream():
+    async def main():
+        generations = ChatGenerations()
+        gate = asyncio.Event()
+        received = []
+
+        async def consume():
+            async for idea in generations.iterate(1, "ideas", _stream(["a", "b", "c"], gate)):
+                received.append(idea)
+
+        ideas = asyncio.ensure_future(consume())
+        await asyncio.sleep(0)
+        assert generations.kinds(1) == ["ideas"]
+        post = await generations.run(1, "post", asyncio.sleep(0, result="post"))
+        gate.set()
+        await ideas
+        return post, received, generations.stats()
+
+    post, received, stats = asyncio.run(main())
+    assert post == "post"
+    assert received == ["a", "b", "c"]
+    assert stats["superseded"] == 0
+    assert stats["cancelled"] == 0
+
+
+def test_cancel_stops_every_kind():
+    async def main():
+        generations = ChatGenerations()
+        ideas = asyncio.ensure_future(generations.run(1, "ideas", _wait_forever()))
+        post = asyncio.ensure_future(generations.run(1, "post", _wait_forever()))
+        other_chat = asyncio.ensure_future(generations.run(2, "post", asyncio.sleep(0.01, result="ok")))
+        await asyncio.sleep(0)
+        assert await generations.cancel(1)
+        for task in (ideas, post):
+            with pytest.raises(GenerationCancelled):
+                await task
+        return await other_chat, await generations.cancel(1), generations.stats()
+
+    other, cancelled_again, stats = asyncio.run(main())
+    assert other == "ok"
+    assert cancelled_again is False
+    assert stats["cancelled"] == 2
+    assert stats["active"] == 0
@@ -0,0 +1,105 @@
+import asyncio
+import types
+
+from handlers import BotHandlers, UserState
+from models import Idea
+from sessions import SessionStore
+
+
+class FakeBot:
+    """Async Bot API, запоминающий вызовы"""
+
+    def __init__(self):
+        self.calls = []
+        self._message_id = 100
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            self._message_id += 1
+            return types.SimpleNamespace(message_id=self._message_id)
+        return call
+
+    def names(self):
+        return [name for name, _, _ in self.calls]
+
+
+class FakeClient:
+    """Идеи приходят потоком по одной после gate, пост готов сразу"""
+
+    def __init__(self, ideas):
+        self.ideas = ideas
+        self.first_sent = asyncio.Event()
+        self.gate = asyncio.Event()
+        self.requests = []
+
+    async def stream_ideas(self, **kwargs):
+        self.requests.append(kwargs)
+        for idx, idea in enumerate(self.ideas):
+            if idx == 1:
+                self.first_sent.set()
+                await self.gate.wait()
+            yield idea
+
+    async def stream_post(self, **kwargs):
+        yield f"Post about {kwargs['idea_title']}"
+
+
+def _message(chat_id, text):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(id=chat_id), text=text)
+
+
+def _callback(chat_id, data):
+    return types.SimpleNamespace(id="cb", data=data, from_user=types.SimpleNamespace(id=chat_id))
+
+
+def test_idea_tap_during_ideas_stream_keeps_the_stream():
+    ideas = [Idea("A", "a"), Idea("B", "b"), Idea("C", "c")]
+
+    async def main():
+        bot = FakeBot()
+        client = FakeClient(ideas)
+        handlers = BotHandlers(bot, client, SessionStore())
+        data = handlers.sessions.get(7)
+        data.niche, data.goal = "кофе", "продать"
+        handlers.sessions.set_state(7, UserState.WAITING_FORMAT)
+
+        format_task = asyncio.ensure_future(handlers.handle_format(_message(7, "пост")))
+        await client.first_sent.wait()
+        # Первая идея уже показана с кнопкой - пользователь выбирает ее, не дожидаясь остальных
+        await handlers.handle_idea_selection(_callback(7, "idea_0"))
+        client.gate.set()
+        await format_task
+        return bot, handlers
+
+    bot, handlers = asyncio.run(main())
+    data = handlers.sessions.get(7)
+    assert [idea.title for idea in data.ideas] == ["A", "B", "C"]
+    assert handlers.sessions.get_state(7) == UserState.WAITING_IDEA_SELECTION
+    assert handlers.generations.stats()["superseded"] == 0
+    # Сообщение со списком идей не удалено, а дописано до конца
+    assert "delete_message" not in bot.names()
+    texts = [args[0] for name, args, _ in bot.calls if name == "edit_message_text"]
+    assert any("Post about A" in text for text in texts)
+    assert any("<i>C</i>" in text for text in texts)
+
+
+def test_new_ideas_request_bypasses_cache_once():
+    async def main():
+        bot = FakeBot()
+        client = FakeClient([Idea("A", "a")])
+        handlers = BotHandlers(bot, client, SessionStore())
+        for _ in range(2):
+            await handlers.handle_create_new_ideas(_message(7, "🔄 Создать новые идеи"))
+            await handlers.handle_niche(_message(7, "кофе"))
+            await handlers.handle_goal(_message(7, "продать"))
+            await handlers.handle_format(_message(7, "пост"))
+        await handlers.handle_start(_message(7, "/start"))
+        await handlers.handle_niche(_message(7, "кофе"))
+        await handlers.handle_goal(_message(7, "продать"))
+        await handlers.handle_format(_message(7, "пост"))
+        return client, handlers
+
+    client, handlers = asyncio.run(main())
+    assert [request.get("refresh") for request in client.requests] == [True, True, False]
+    assert handlers.sessions.get(7).refresh is False
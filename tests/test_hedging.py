@@ -0,0 +1,37 @@
+import asyncio
+
+from ai_client import OpenRouterClient
+from models import Idea
+from resilience import HedgePolicy
+
+
+def test_credit_starts_empty():
+    hedge = HedgePolicy(max_fraction=0.25, min_samples=1)
+    for _ in range(3):
+        hedge.start()
+        assert not hedge.try_hedge()
+    hedge.start()
+    assert hedge.try_hedge()
+    assert hedge.stats()["budget_denied"] == 3
+
+
+def test_hedge_win_latency_is_measured_from_request_start():
+    hedge = HedgePolicy(percentile=0.5, max_fraction=0.5, min_delay=0.0, min_samples=1)
+    hedge.observe(0.1)
+    hedge.start()
+    client = OpenRouterClient(api_key="test", hedge=hedge)
+    calls = []
+
+    async def request_ideas(*args):
+        calls.append(args)
+        # Первый запрос завис, дубль отвечает быстро
+        await asyncio.sleep(5 if len(calls) == 1 else 0.01)
+        return [Idea("A", "a")]
+
+    client._request_ideas = request_ideas
+    ideas = asyncio.run(client._hedged_request_ideas("кофе", "продать", "пост", 0.7))
+
+    assert [idea.title for idea in ideas] == ["A"]
+    assert hedge.hedge_wins == 1
+    # Пользователь ждал порог и ответ дубля, а не только ответ дубля
+    assert hedge._latencies[-1] >= 0.1
@@ -0,0 +1,53 @@
+from normalize import DEFAULT_SYNONYMS, InputMatcher, Normalizer, SimilarityIndex, jaccard, shingles
+
+
+def test_case_punctuation_and_stopwords_are_ignored():
+    normalizer = Normalizer(synonyms=DEFAULT_SYNONYMS)
+    assert normalizer.normalize("  Фитнес, для МАМ!") == "фитнес мам"
+    assert normalizer.normalize("ёлки") == "елки"
+
+
+def test_synonyms_map_to_canonical_form():
+    normalizer = Normalizer(synonyms=DEFAULT_SYNONYMS)
+    assert normalizer.normalize("Пост в Инсту") == normalizer.normalize("посты в инстаграм") == "пост instagram"
+    # Самая длинная фраза заменяется целиком
+    assert normalizer.normalize("Спорт и фитнес") == "фитнес"
+
+
+def test_only_stopwords_are_kept():
+    assert Normalizer(synonyms={}).normalize("в на") == "в на"
+
+
+def test_jaccard_of_shingles():
+    assert jaccard(shingles("кофе"), shingles("кофе")) == 1.0
+    assert jaccard(shingles("кофе"), shingles("чай")) == 0.0
+
+
+def test_nearest_finds_typo_and_rejects_unrelated():
+    index = SimilarityIndex(threshold=0.5)
+    index.add("фотография")
+    index.add("кулинария")
+    match = index.nearest("фотографи")
+    assert match is not None and match[0] == "фотография"
+    assert index.nearest("астрономия") is None
+    assert index.nearest("кулинария") == ("кулинария", 1.0)
+
+
+def test_index_evicts_oldest_over_capacity():
+    index = SimilarityIndex(threshold=0.5, capacity=2)
+    for text in ("фотография", "кулинария", "астрономия"):
+        index.add(text)
+    assert len(index) == 2
+    assert "фотография" not in index
+    assert index.nearest("фотографи") is None
+
+
+def test_matcher_redirects_only_to_known_combinations():
+    matcher = InputMatcher(threshold=0.5)
+    matcher.add(("фитнес", "продажи", "пост"))
+    assert matcher.redirect(("фитнесы", "продажи", "пост")) == ("фитнес", "продажи", "пост")
+    # Каждое поле похоже, но такой комбинации нет
+    assert matcher.redirect(("фитнес", "обучение", "пост")) is None
+    # Сам известный ключ не перенаправляется
+    assert matcher.redirect(("фитнес", "продажи", "пост")) is None
+    assert matcher.stats()["redirects"] == 1
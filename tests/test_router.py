@@ -0,0 +1,23 @@
+from config import MODEL
+from router import TASK_IDEAS, TASK_POSTS, ModelRouter, parse_model_list
+
+
+def test_empty_candidates_fall_back_to_primary_model():
+    router = ModelRouter(candidates={TASK_IDEAS: parse_model_list(""), TASK_POSTS: []})
+    assert router.choose(TASK_IDEAS) == MODEL
+    assert router.choose(TASK_POSTS) == MODEL
+    assert router._best(TASK_IDEAS, {}) == MODEL
+    # Исход вызова запасной модели просто не учитывается
+    router.record(TASK_IDEAS, MODEL, 1.0, True)
+
+
+def test_unknown_task_falls_back_to_primary_model():
+    router = ModelRouter(candidates={TASK_IDEAS: ["a/b"]})
+    assert router.choose(TASK_POSTS) == MODEL
+
+
+def test_fastest_eligible_model_is_chosen():
+    router = ModelRouter(candidates={TASK_IDEAS: ["fast", "slow"]}, explore_rate=0.0, min_samples=1)
+    router.record(TASK_IDEAS, "fast", 1.0, True)
+    router.record(TASK_IDEAS, "slow", 5.0, True)
+    assert router.choose(TASK_IDEAS) == "fast"
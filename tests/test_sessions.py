@@ -0,0 +1,84 @@
+from models import Idea, Session
+from sessions import SessionStore, SQLiteSessionBackend
+
+
+def _store(path, **overrides):
+    options = dict(capacity=100, idle_ttl=60, backend=SQLiteSessionBackend(str(path)))
+    options.update(overrides)
+    return SessionStore(**options)
+
+
+def _reload(path, user_id):
+    store = _store(path)
+    try:
+        return store.get_state(user_id), store.get(user_id)
+    finally:
+        store.close()
+
+
+def test_change_after_flush_is_saved(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    store = _store(path)
+    data = store.get(1)
+    data.niche = "фитнес"
+    data.ideas = [Idea("Идея", "Описание")]
+    store.flush()
+
+    # Запись получена до сброса - изменение отмечается явно
+    data.ideas = None
+    store.save(1, data)
+    store.close()
+
+    _, reloaded = _reload(path, 1)
+    assert reloaded.niche == "фитнес"
+    assert reloaded.ideas is None
+
+
+def test_expired_session_keeps_unsaved_changes(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    store = _store(path)
+    store.set_state(1, 3)
+    store.get(1).goal = "продать"
+    store.sweep(now=float("inf"))
+    assert len(store) == 0
+    store.close()
+
+    state, reloaded = _reload(path, 1)
+    assert state == 3
+    assert reloaded.goal == "продать"
+
+
+def test_save_after_eviction_writes_the_record(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    store = _store(path, capacity=1)
+    data = store.get(1)
+    store.flush()
+    store.get(2)
+    assert 1 not in store
+
+    data.format = "рилс"
+    store.save(1, data)
+    store.close()
+
+    _, reloaded = _reload(path, 1)
+    assert reloaded.format == "рилс"
+
+
+def test_dropped_session_is_not_resurrected(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    store = _store(path)
+    data = store.get(1)
+    data.niche = "фитнес"
+    store.drop(1)
+    store.save(1, data)
+    store.close()
+
+    state, _ = _reload(path, 1)
+    assert state is None
+
+
+def test_memory_store_save_is_noop():
+    store = SessionStore(capacity=10, idle_ttl=60)
+    store.save(1, Session())
+    assert len(store) == 0
+    assert store.flush() == 0
@@ -0,0 +1,104 @@
+import asyncio
+
+from admission import AdmissionController
+from ai_client import _usage_scope
+from models import Idea
+from speculation import SpeculativePosts, TokenBudget
+
+IDEAS = [Idea("A", "a"), Idea("B", "b"), Idea("C", "c")]
+
+
+class FakeClient:
+    """Пост готов после gate, расход - completion_tokens на вызов"""
+
+    def __init__(self, completion_tokens=50):
+        self.completion_tokens = completion_tokens
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.calls = []
+
+    async def generate_post(self, **kwargs):
+        self.calls.append(kwargs["idea_title"])
+        await self.gate.wait()
+        _usage_scope.get()["completion_tokens"] += self.completion_tokens
+        return f"Post about {kwargs['idea_title']}"
+
+
+def test_budget_rejects_over_limit_and_frees_after_window():
+    budget = TokenBudget(limit=100, window=10)
+    assert budget.try_spend(60, now=0) is not None
+    assert budget.try_spend(60, now=1) is None
+    assert budget.try_spend(60, now=11) is not None
+    assert budget.spent == 60
+
+
+def test_settle_replaces_reservation_with_actual_usage():
+    budget = TokenBudget(limit=100, window=10)
+    reservation = budget.try_spend(80, now=0)
+    budget.settle(reservation, 20)
+    assert budget.spent == 20
+    assert budget.try_spend(80, now=1) is not None
+
+
+def test_claim_returns_post_and_cancels_the_rest():
+    async def main():
+        client = FakeClient()
+        client.gate.clear()
+        speculator = SpeculativePosts(client, top_k=2, token_budget=1000, post_tokens=100)
+        started = await speculator.start(7, IDEAS, "кофе", "продать", "пост")
+        await asyncio.sleep(0)
+        client.gate.set()
+        post = await speculator.claim(7, 0)
+        await asyncio.sleep(0)
+        return started, post, speculator.stats()
+
+    started, post, stats = asyncio.run(main())
+    assert started == 2
+    assert post == "Post about A"
+    assert stats["used"] == 1
+    assert stats["cancelled"] == 1
+    assert stats["active_chats"] == 0
+
+
+def test_idea_beyond_top_k_is_not_speculated():
+    async def main():
+        speculator = SpeculativePosts(FakeClient(), top_k=2, token_budget=1000, post_tokens=100)
+        await speculator.start(7, IDEAS, "кофе", "продать", "пост")
+        return await speculator.claim(7, 2)
+
+    assert asyncio.run(main()) is None
+
+
+def test_budget_settles_with_completion_tokens():
+    async def main():
+        speculator = SpeculativePosts(FakeClient(completion_tokens=30), top_k=3, token_budget=250, post_tokens=100)
+        started = await speculator.start(7, IDEAS, "кофе", "продать", "пост")
+        await asyncio.gather(*speculator._jobs[7].values())
+        return started, speculator.stats()
+
+    started, stats = asyncio.run(main())
+    # Третья идея не влезла в резерв, потраченное - фактический расход
+    assert started == 2
+    assert stats["over_budget"] == 1
+    assert stats["budget_tokens_spent"] == 60
+
+
+def test_post_waiting_for_admission_slot_is_left_to_the_user():
+    async def main():
+        client = FakeClient()
+        admission = AdmissionController(max_concurrent=2, chat_per_minute=0, global_per_second=0)
+        # Единственный слот, доступный фону, занят
+        await admission.acquire(None, background=True)
+        speculator = SpeculativePosts(client, admission, top_k=1, token_budget=1000, post_tokens=100)
+        await speculator.start(7, IDEAS, "кофе", "продать", "пост")
+        await asyncio.sleep(0)
+        post = await speculator.claim(7, 0)
+        await asyncio.sleep(0)
+        return post, client.calls, speculator.stats(), admission.stats()
+
+    post, calls, stats, admission_stats = asyncio.run(main())
+    assert post is None
+    assert calls == []
+    # Резерв не потраченной генерации возвращен в бюджет
+    assert stats["budget_tokens_spent"] == 0
+    assert admission_stats["background_waiting"] == 0
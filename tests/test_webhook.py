@@ -0,0 +1,34 @@
+import importlib
+import json
+
+import pytest
+
+
+@pytest.fixture
+def webhook(tmp_path, monkeypatch):
+    # Модуль при импорте создает бота и открывает кэш в текущем каталоге
+    monkeypatch.setenv("TELEGRAM_TOKEN", "1:test")
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("bot_webhook")
+    submitted = []
+    monkeypatch.setattr(module.update_queue, "submit", lambda update: submitted.append(update) or True)
+    return module, module.app.test_client(), submitted
+
+
+def _post(client, module, body):
+    return client.post(module.WEBHOOK_URL_PATH, data=body, content_type="application/json")
+
+
+def test_unparsable_update_is_dropped_with_200(webhook):
+    module, client, submitted = webhook
+    assert _post(client, module, "{not json").status_code == 200
+    assert _post(client, module, "null").status_code == 200
+    assert submitted == []
+
+
+def test_update_is_queued_once(webhook):
+    module, client, submitted = webhook
+    body = json.dumps({"update_id": 424242})
+    assert _post(client, module, body).status_code == 200
+    assert _post(client, module, body).status_code == 200
+    assert [update.update_id for update in submitted] == [424242]
@@ -0,0 +1,139 @@
+"""
+AI-IdeaFactory: Лимит max_tokens по наблюдаемой длине ответов
+Для каждой задачи хранит распределение completion_tokens из usage и выдает
+max_tokens = перцентиль * (1 + запас), ограниченный потолком задачи;
+ведет счетчики обрезанных (finish_reason == "length") ответов
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+from config import (
+    MAX_TOKENS_IDEAS,
+    MAX_TOKENS_POSTS,
+    TOKEN_BUDGET_PERCENTILE,
+    TOKEN_BUDGET_MARGIN,
+    TOKEN_BUDGET_MIN_TOKENS,
+    TOKEN_BUDGET_MIN_SAMPLES,
+    TOKEN_BUDGET_MAX_CONTINUATIONS,
+)
+from router import TASK_IDEAS, TASK_POSTS
+
+# Сколько последних ответов учитывать
+_SIZE_WINDOW = 500
+
+
+class _TaskBudget:
+    """Наблюдения и счетчики одной задачи"""
+
+    __slots__ = ("ceiling", "sizes", "limit", "requests", "truncated", "continued", "retried", "accepted_truncated")
+
+    def __init__(self, ceiling: int):
+        self.ceiling = ceiling
+        self.sizes: deque = deque(maxlen=_SIZE_WINDOW)
+        self.limit: Optional[int] = None
+        self.requests = 0
+        self.truncated = 0
+        self.continued = 0
+        self.retried = 0
+        self.accepted_truncated = 0
+
+
+class MaxTokensEstimator:
+    """
+    Адаптивный max_tokens по задачам
+
+    Пока наблюдений меньше min_samples, limit() возвращает потолок задачи.
+    Потом - перцентиль percentile последних completion_tokens, умноженный на
+    (1 + margin), но не меньше min_tokens и не больше потолка. Наблюдается
+    полный размер ответа (с продолжениями), поэтому обрезанные ответы
+    поднимают лимит, а не закрепляют его.
+    """
+
+    def __init__(
+        self,
+        ceilings: Optional[Dict[str, int]] = None,
+        percentile: float = TOKEN_BUDGET_PERCENTILE,
+        margin: float = TOKEN_BUDGET_MARGIN,
+        min_tokens: int = TOKEN_BUDGET_MIN_TOKENS,
+        min_samples: int = TOKEN_BUDGET_MIN_SAMPLES,
+        max_continuations: int = TOKEN_BUDGET_MAX_CONTINUATIONS
+    ):
+        if ceilings is None:
+            ceilings = {TASK_IDEAS: MAX_TOKENS_IDEAS, TASK_POSTS: MAX_TOKENS_POSTS}
+        self.percentile = percentile
+        self.margin = margin
+        self.min_tokens = min_tokens
+        self.min_samples = min_samples
+        self.max_continuations = max(0, max_continuations)
+        self._tasks = {task: _TaskBudget(ceiling) for task, ceiling in ceilings.items()}
+        self._lock = threading.Lock()
+
+    def ceiling(self, task: str) -> int:
+        """Потолок max_tokens задачи"""
+        return self._tasks[task].ceiling
+
+    def limit(self, task: str) -> int:
+        """max_tokens для очередного запроса задачи"""
+        with self._lock:
+            budget = self._tasks[task]
+            budget.requests += 1
+            return self._limit(budget)
+
+    def observe(self, task: str, completion_tokens: Optional[int]) -> None:
+        """Учесть полный размер ответа в токенах"""
+        if not completion_tokens:
+            return
+        with self._lock:
+            budget = self._tasks[task]
+            budget.sizes.append(completion_tokens)
+            budget.limit = None
+
+    def count(self, task: str, outcome: str) -> None:
+        """
+        Учесть исход обрезанного ответа
+
+        outcome: "truncated" (ответ обрезан), "continued" (дозапрошено
+        продолжение), "retried" (повтор с потолком), "accepted_truncated"
+        (отдан обрезанный ответ)
+        """
+        with self._lock:
+            budget = self._tasks[task]
+            setattr(budget, outcome, getattr(budget, outcome) + 1)
+
+    def typical(self, task: str) -> Optional[int]:
+        """Медианный размер ответа задачи в токенах (None, пока нет наблюдений)"""
+        with self._lock:
+            ordered = sorted(self._tasks[task].sizes)
+        return ordered[len(ordered) // 2] if ordered else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Текущий лимит, перцентиль и счетчики обрезаний по задачам"""
+        with self._lock:
+            result = {}
+            for task, budget in self._tasks.items():
+                ordered = sorted(budget.sizes)
+                result[task] = {
+                    "samples": len(ordered),
+                    "max_tokens": self._limit(budget),
+                    "ceiling": budget.ceiling,
+                    "p50_tokens": ordered[len(ordered) // 2] if ordered else None,
+                    "p99_tokens": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] if ordered else None,
+                    "requests": budget.requests,
+                    "truncated": budget.truncated,
+                    "continued": budget.continued,
+                    "retried": budget.retried,
+                    "accepted_truncated": budget.accepted_truncated,
+                }
+            return result
+
+    def _limit(self, budget: _TaskBudget) -> int:
+        if len(budget.sizes) < self.min_samples:
+            return budget.ceiling
+        if budget.limit is None:
+            ordered = sorted(budget.sizes)
+            size = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+            budget.limit = min(budget.ceiling, max(self.min_tokens, math.ceil(size * (1 + self.margin))))
+        return budget.limit
@@ -0,0 +1,142 @@
+"""
+AI-IdeaFactory: Ограниченная очередь фоновой обработки обновлений
+Webhook сразу кладет update в очередь и отвечает Telegram, а пул потоков
+выполняет обработчики (включая долгие генерации AI) в фоне
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class UpdateQueue:
+    """
+    Ограниченная очередь задач с фиксированным пулом рабочих потоков
+
+    Если очередь заполнена, submit() ждет не дольше put_timeout и возвращает
+    False - вызывающий код должен отказать (backpressure), а не копить задачи.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], None],
+        workers: int = 8,
+        maxsize: int = 1000,
+        put_timeout: float = 0.05,
+        name: str = "update-worker"
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.put_timeout = put_timeout
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0
+        self.last_wait = 0.0
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+
+    def start(self) -> None:
+        """Запустить рабочие потоки (идемпотентно)"""
+        with self._lock:
+            if self._threads:
+                return
+            for idx in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f"{self.name}-{idx + 1}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Очередь обновлений запущена: {self.workers} потоков, емкость {self.maxsize}")
+
+    def submit(self, item: Any) -> bool:
+        """
+        Поставить задачу в очередь
+
+        Returns:
+            True, если задача принята; False, если очередь переполнена
+        """
+        try:
+            self._queue.put((time.monotonic(), item), timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            logger.warning(f"Очередь обновлений переполнена ({self.maxsize}), задача отклонена")
+            return False
+        with self._lock:
+            self.accepted += 1
+        return True
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Дождаться обработки принятых задач и остановить потоки"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put((time.monotonic(), _STOP))
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        logger.info("Очередь обновлений остановлена")
+
+    def stats(self) -> Dict[str, Any]:
+        """Текущее состояние очереди для мониторинга"""
+        with self._lock:
+            return {
+                "depth": self._queue.qsize(),
+                "capacity": self.maxsize,
+                "workers": self.workers,
+                "busy_workers": self.busy,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "failed": self.failed,
+                "wait_last_ms": round(self.last_wait * 1000, 1),
+                "wait_avg_ms": round(self.avg_wait * 1000, 1),
+                "wait_max_ms": round(self.max_wait * 1000, 1),
+            }
+
+    def _worker(self) -> None:
+        while True:
+            enqueued_at, item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+
+            wait = time.monotonic() - enqueued_at
+            with self._lock:
+                self.busy += 1
+                self.last_wait = wait
+                self.max_wait = max(self.max_wait, wait)
+                # Экспоненциальное скользящее среднее времени ожидания
+                self.avg_wait = wait if self.processed == 0 else 0.9 * self.avg_wait + 0.1 * wait
+
+            try:
+                self.handler(item)
+                failed = False
+            except Exception as e:
+                logger.error(f"Ошибка при обработке задачи из очереди: {e}")
+                failed = True
+            finally:
+                self._queue.task_done()
+
+            with self._lock:
+                self.busy -= 1
+                self.processed += 1
+                if failed:
+                    self.failed += 1
@@ -0,0 +1,41 @@
+"""
+AI-IdeaFactory: Отображение идей в Telegram
+Общие для всех версий бота текст списка идей и inline кнопки выбора
+"""
+
+from typing import List
+
+from telebot import types
+
+from models import Idea
+
+# Сколько идей показываем пользователю
+MAX_IDEAS_SHOWN = 5
+
+# Reply кнопки после готового поста (и их текст без эмодзи, если его ввели вручную)
+NEW_IDEAS_BUTTON = "🔄 Создать новые идеи"
+NEW_IDEAS_BUTTON_LABEL = "Создать новые идеи"
+OTHER_IDEA_BUTTON = "⬅️ Выбрать другую идею"
+OTHER_IDEA_BUTTON_LABEL = "Выбрать другую идею"
+
+
+def format_ideas_text(ideas: List[Idea], header: str) -> str:
+    """Текст со списком идей в HTML-разметке"""
+    ideas_text = f"{header}\n\n"
+    for idx, idea in enumerate(ideas[:MAX_IDEAS_SHOWN], 1):
+        title = idea.title
+        description = idea.description or 'Нет описания'
+        ideas_text += f"<b>💡 Идея {idx}:</b>\n<i>{title}</i>\n{description}\n\n"
+    return ideas_text
+
+
+def build_ideas_markup(ideas: List[Idea]) -> types.InlineKeyboardMarkup:
+    """Inline кнопки idea_N для выбора идеи"""
+    markup = types.InlineKeyboardMarkup()
+    for idx in range(min(MAX_IDEAS_SHOWN, len(ideas))):
+        button = types.InlineKeyboardButton(
+            f"💡 Идея {idx + 1}",
+            callback_data=f"idea_{idx}"
+        )
+        markup.add(button)
+    return markup